@@ -3,10 +3,9 @@ FILE: actions.py
 Custom actions để truy vấn knowledge base về các tỉnh thành Việt Nam
 """
 
-import json
 import os
 import logging
-from typing import Any, Text, Dict, List
+from typing import Any, Text, Dict, List, Mapping, Optional, Tuple
 from rasa_sdk import Action, Tracker
 from rasa_sdk.executor import CollectingDispatcher
 from rasa_sdk.events import SlotSet
@@ -28,12 +27,27 @@ except ImportError:
 except Exception as e:
     logging.warning(f"[Actions] Failed to load .env: {e}")
 
+from actions.knowledge_base import KnowledgeBaseStore, get_store
+from actions.executors import LLM_POOL, RETRIEVAL_POOL, run_blocking
+from actions import metrics
+from actions.intent_keywords import correct_intent, detect_kb_fields, detect_quick_intent
+from actions.metrics import record_path, stage_timer
+from actions.rendering import format_province_response
+from actions.text_normalize import fold
+
 # RAG imports
 try:
-    from rag.retriever import RAGRetriever
+    from rag.providers import provider_status
+    from rag.retriever import RAGRetriever, dense_score
 except Exception:
     RAGRetriever = None
 
+# Không phụ thuộc faiss / torch nên import riêng, ngoài khối RAG ở trên
+from rag.singleflight import AsyncSingleFlight
+
+RAG_SINGLE_FLIGHT = AsyncSingleFlight()
+
+
 class ActionQueryKnowledgeBase(Action):
     """
     Action tùy chỉnh để truy vấn knowledge base về du lịch Việt Nam
@@ -41,205 +55,52 @@ class ActionQueryKnowledgeBase(Action):
     
     def __init__(self):
         super().__init__()
-        self.knowledge_base = self._load_knowledge_base()
-        # load raw mapping and build a lowercase-key mapping for case-insensitive lookup
-        self.location_map_raw = self._load_location_map()
-        self.location_map = {k.strip().lower(): v for k, v in self.location_map_raw.items()}
-
-    def _load_location_map(self) -> Dict[str, str]:
-        """Load location alias mapping from data/location_map.json"""
-        map_path = os.path.join("data", "location_map.json")
-        if not os.path.exists(map_path):
-            print(f"Warning: Location map file {map_path} not found!")
-            return {}
-        try:
-            with open(map_path, "r", encoding="utf-8") as f:
-                location_map = json.load(f)
-            return location_map
-        except Exception as e:
-            print(f"Error loading location map: {e}")
-            return {}
-    
-    def _load_knowledge_base(self) -> Dict:
-        """Load tất cả các file JSON từ thư mục data/knowledge_base/provinces"""
-        knowledge_base = {}
-        kb_dir = "data/knowledge_base/provinces"
-        
-        if not os.path.exists(kb_dir):
-            print(f"Warning: Directory {kb_dir} not found!")
-            return knowledge_base
-        
-        # Đọc tất cả file .json trong thư mục
-        for filename in os.listdir(kb_dir):
-            if filename.endswith('.json'):
-                file_path = os.path.join(kb_dir, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        knowledge_base.update(data)
-                    print(f"Loaded: {filename}")
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
-        
-        print(f"Total provinces loaded: {len(knowledge_base)}")
-        return knowledge_base
-    
+        # Load KB ngay khi đăng ký action để request đầu tiên không phải chờ đọc file
+        get_store()
+
+    @property
+    def store(self) -> KnowledgeBaseStore:
+        # Luôn lấy store dùng chung để thấy ngay bản KB mới sau khi reload
+        return get_store()
+
+    @property
+    def knowledge_base(self) -> Mapping[str, Dict]:
+        return self.store.knowledge_base
+
+    @property
+    def location_map_raw(self) -> Mapping[str, str]:
+        return self.store.location_map_raw
+
+    @property
+    def location_map(self) -> Mapping[str, str]:
+        return self.store.location_map
+
     def name(self) -> Text:
         return "action_query_knowledge_base"
     
     def _normalize_location(self, location: str) -> str:
         """Chuẩn hóa tên địa điểm theo 34 tỉnh thành mới (Nghị quyết 12/6/2025)"""
-        # Loại bỏ dấu phẩy cuối nếu có
-        location_clean = location.strip().rstrip(', ')
-        
-        # Thử exact match trước (case-sensitive)
-        if location_clean in self.location_map_raw:
-            return self.location_map_raw[location_clean]
-        
-        # Thử case-insensitive match với location đã clean
-        key = location_clean.lower()
-        if key in self.location_map:
-            return self.location_map[key]
-        
-        # Thử với location gốc (có thể có dấu phẩy) - case-insensitive
-        key_original = location.strip().lower()
-        if key_original in self.location_map:
-            return self.location_map[key_original]
-        
-        # Thử với location gốc - exact match (case-sensitive)
-        if location.strip() in self.location_map_raw:
-            return self.location_map_raw[location.strip()]
-        
-        # Nếu không tìm thấy, giữ nguyên location đã clean
-        return location_clean
+        return self.store.normalize_location(location)
     
     def _format_response(self, province_data: Dict, intent: str) -> str:
         """Format phản hồi dựa trên intent"""
         province_name = list(province_data.keys())[0]
         data = province_data[province_name]
-        
-        if intent == "ask_culture":
-            response = f"📍 **{province_name}**\n\n"
-            response += f"{data.get('culture_details', 'Không có thông tin văn hóa.')}\n\n"
-            
-            if 'sub_regions' in data and data['sub_regions']:
-                response += "**Các khu vực đặc trưng:**\n"
-                for region in data['sub_regions']:
-                    response += f"• {region['name']}: {region['highlights']}\n"
-            
-            return response
-        
-        elif intent == "ask_attractions":
-            response = f"📍 **Địa điểm tham quan tại {province_name}**\n\n"
-            
-            if 'places_to_visit' in data and data['places_to_visit']:
-                for i, place in enumerate(data['places_to_visit'][:6], 1):
-                    category = place.get('category', 'du lịch')
-                    response += f"{i}. **{place['name']}** ({category})\n"
-                    response += f"   {place['details']}\n\n"
-            else:
-                response += "Hiện chưa có thông tin địa điểm tham quan cụ thể.\n"
-                response += f"💡 *Gợi ý: Bạn có thể hỏi về văn hóa, ẩm thực hoặc lễ hội của {province_name}.*\n"
-            
-            return response
-        
-        elif intent == "ask_cuisine":
-            response = f"🍜 **Ẩm thực {province_name}**\n\n"
-            
-            if 'what_to_eat' in data and data['what_to_eat']:
-                for i, food in enumerate(data['what_to_eat'], 1):
-                    response += f"{i}. **{food['name']}**\n"
-                    response += f"   {food['details']}\n\n"
-            else:
-                response += "Không có thông tin ẩm thực."
-            
-            if 'specialties_as_gifts' in data and data['specialties_as_gifts']:
-                response += "\n**Đặc sản mua về:**\n"
-                for gift in data['specialties_as_gifts']:
-                    response += f"• {gift}\n"
-            
-            return response
-        
-        elif intent == "ask_festival":
-            response = f"🎊 **Lễ hội tại {province_name}**\n\n"
-            
-            if 'festivals' in data and data['festivals']:
-                for fest in data['festivals']:
-                    response += f"**{fest['name']}**\n"
-                    response += f"⏰ Thời gian: {fest['time']}\n"
-                    response += f"{fest['details']}\n\n"
-            else:
-                response += "Hiện chưa có thông tin lễ hội cụ thể.\n"
-                response += f"💡 *Gợi ý: Bạn có thể hỏi về văn hóa, địa điểm tham quan hoặc ẩm thực của {province_name}.*\n"
-            
-            return response
-        
-        elif intent == "ask_travel_tips":
-            response = f"💡 **Mẹo du lịch {province_name}**\n\n"
-            
-            # Ưu tiên travel_tips, không phải best_time_to_visit
-            if 'travel_tips' in data and data['travel_tips']:
-                response += f"**Lưu ý và mẹo:**\n{data['travel_tips']}\n\n"
-                # Vẫn hiển thị best_time_to_visit nếu có, nhưng ở cuối
-                if 'best_time_to_visit' in data and data['best_time_to_visit']:
-                    response += f"**Thời điểm đẹp nhất:**\n{data['best_time_to_visit']}\n"
-            elif 'best_time_to_visit' in data and data['best_time_to_visit']:
-                # Chỉ hiển thị best_time_to_visit nếu không có travel_tips
-                response += f"**Thời điểm đẹp nhất:**\n{data['best_time_to_visit']}\n\n"
-                response += "💡 *Lưu ý: Để biết thêm mẹo du lịch cụ thể, vui lòng hỏi về địa điểm, ẩm thực hoặc phương tiện di chuyển.*\n"
-            else:
-                response += "Không có thông tin mẹo du lịch cụ thể.\n"
-                response += f"💡 *Gợi ý: Bạn có thể hỏi về địa điểm tham quan, ẩm thực hoặc phương tiện di chuyển của {province_name}.*\n"
-            
-            return response
-        
-        elif intent == "ask_new_province":
-            response = f"📋 **Cấu trúc tỉnh {province_name} sau sáp nhập (Nghị quyết 12/6/2025)**\n\n"
-            
-            if 'sub_regions' in data and data['sub_regions']:
-                response += f"**{province_name} mới** bao gồm các khu vực sau:\n\n"
-                for region in data['sub_regions']:
-                    # Extract tên tỉnh cũ từ tên khu vực
-                    region_name = region['name']
-                    if 'cũ' in region_name.lower():
-                        # Khu vực tỉnh cũ
-                        old_province = region_name.replace('Khu vực', '').replace('(cũ)', '').strip()
-                        response += f"• **{old_province}** (tỉnh cũ)\n"
-                    else:
-                        # Tỉnh được sáp nhập vào
-                        merged_province = region_name.replace('Khu vực', '').strip()
-                        response += f"• **{merged_province}** (sáp nhập vào {province_name})\n"
-                    response += f"  {region['highlights']}\n\n"
-                
-                if data.get('culture_details'):
-                    response += f"\n**Tổng quan:**\n{data['culture_details']}"
-            else:
-                response += "Không có thông tin sáp nhập.\n"
-                response += "💡 *Lưu ý: Thông tin sáp nhập dựa trên Nghị quyết 12/6/2025.*\n"
-            
-            return response
-        
-        elif intent == "ask_transportation":
-            response = f"🚗 **Phương tiện di chuyển đến {province_name}**\n\n"
-            
-            if 'transportation' in data:
-                response += data['transportation']
-            else:
-                response += "Không có thông tin phương tiện di chuyển."
-            
-            return response
-        
-        else:
-            # Trả về thông tin tổng quan
-            response = f"📍 **{province_name}**\n\n"
-            response += f"{data.get('culture_details', '')}\n\n"
-            
-            if 'best_time_to_visit' in data:
-                response += f"**Thời điểm đẹp:** {data['best_time_to_visit']}"
-            
-            return response
+        # Dữ liệu lấy từ store -> dùng bản render đã cache (key: tỉnh + intent)
+        if self.knowledge_base.get(province_name) is data:
+            return self.store.render_cache.render(province_name, intent)
+        return format_province_response(province_name, data, intent)
     
-    def run(
+    async def run(
+        self,
+        dispatcher: CollectingDispatcher,
+        tracker: Tracker,
+        domain: Dict[Text, Any],
+    ) -> List[Dict[Text, Any]]:
+        with stage_timer(self.name(), metrics.TOTAL):
+            return await self._run(dispatcher, tracker, domain)
+
+    async def _run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
@@ -259,55 +120,39 @@ class ActionQueryKnowledgeBase(Action):
                 text="Bạn muốn biết thông tin về tỉnh/thành phố nào? "
                      "Ví dụ: Bắc Ninh, An Giang, Hà Nội..."
             )
+            record_path(self.name(), "missing_location")
             return []
         
-        # Chuẩn hóa tên địa điểm
-        location = self._normalize_location(location)
+        # Chuẩn hóa tên địa điểm: tên tỉnh / alias (có dấu hoặc không) -> tỉnh, một lần tra index
+        with stage_timer(self.name(), metrics.LOCATION_NORMALIZATION):
+            canonical = self.store.resolve(location)
+            location = canonical or self._normalize_location(location)
         
         # Tìm trong knowledge base
         province_data = None
-        for province_name, data in self.knowledge_base.items():
-            if province_name.lower() == location.lower():
-                province_data = {province_name: data}
-                break
+        if canonical:
+            with stage_timer(self.name(), metrics.KB_LOOKUP):
+                province_data = {canonical: self.knowledge_base[canonical]}
         
         if not province_data:
-            # Kiểm tra xem có phải là alias của tỉnh khác không
-            normalized = self._normalize_location(location)
-            if normalized != location:
-                # Đã được normalize, thử tìm lại với tên đã normalize
-                for province_name, data in self.knowledge_base.items():
-                    if province_name.lower() == normalized.lower():
-                        province_data = {province_name: data}
-                        break
+            # Tạo danh sách các tỉnh gần giống (fuzzy match qua index build sẵn)
+            similar_provinces = self.store.suggest(location, limit=3)
             
-            if not province_data:
-                # Tạo danh sách các tỉnh gần giống (fuzzy match)
-                similar_provinces = []
-                location_lower = location.lower()
-                for province_name in self.knowledge_base.keys():
-                    if location_lower in province_name.lower() or province_name.lower() in location_lower:
-                        similar_provinces.append(province_name)
-                    # Kiểm tra alias trong location_map
-                    for alias, mapped_province in self.location_map.items():
-                        if location_lower == alias.lower() and mapped_province in self.knowledge_base:
-                            if mapped_province not in similar_provinces:
-                                similar_provinces.append(mapped_province)
-                
-                if similar_provinces:
-                    dispatcher.utter_message(
-                        text=f"Xin lỗi, tôi chưa có thông tin trực tiếp về '{location}'. "
-                             f"Bạn có muốn hỏi về: {', '.join(similar_provinces[:3])} không? "
-                             f"Hoặc bạn có thể hỏi về một trong {len(self.knowledge_base)} tỉnh thành mà tôi có dữ liệu."
-                    )
-                else:
-                    dispatcher.utter_message(
-                        text=f"Xin lỗi, tôi chưa có thông tin về '{location}'. "
-                             f"Hiện tôi có dữ liệu về {len(self.knowledge_base)} tỉnh thành theo Nghị quyết sáp nhập 12/6/2025. "
-                             f"Bạn có thể hỏi về: {', '.join(list(self.knowledge_base.keys())[:5])}... "
-                             f"Hoặc hỏi cụ thể hơn, ví dụ: 'Địa điểm du lịch Hải Phòng', 'Ẩm thực Bắc Ninh', 'Lễ hội ở Huế'..."
-                    )
-                return []
+            if similar_provinces:
+                dispatcher.utter_message(
+                    text=f"Xin lỗi, tôi chưa có thông tin trực tiếp về '{location}'. "
+                         f"Bạn có muốn hỏi về: {', '.join(similar_provinces[:3])} không? "
+                         f"Hoặc bạn có thể hỏi về một trong {len(self.knowledge_base)} tỉnh thành mà tôi có dữ liệu."
+                )
+            else:
+                dispatcher.utter_message(
+                    text=f"Xin lỗi, tôi chưa có thông tin về '{location}'. "
+                         f"Hiện tôi có dữ liệu về {len(self.knowledge_base)} tỉnh thành theo Nghị quyết sáp nhập 12/6/2025. "
+                         f"Bạn có thể hỏi về: {', '.join(list(self.knowledge_base.keys())[:5])}... "
+                         f"Hoặc hỏi cụ thể hơn, ví dụ: 'Địa điểm du lịch Hải Phòng', 'Ẩm thực Bắc Ninh', 'Lễ hội ở Huế'..."
+                )
+            record_path(self.name(), "not_found")
+            return []
         
         # Lấy intent
         intent = tracker.latest_message.get('intent', {}).get('name', 'ask_culture')
@@ -315,45 +160,14 @@ class ActionQueryKnowledgeBase(Action):
         # Fallback: Detect intent từ message text nếu intent bị nhầm
         user_msg = (tracker.latest_message.get("text", "") or "").lower()
         
-        # Sửa ask_culture nếu nhầm với ask_travel_tips
-        if intent == "ask_travel_tips" and any(keyword in user_msg for keyword in ["văn hóa", "văn hoá", "di sản", "phong tục", "truyền thống", "bản sắc", "đặc trưng"]):
-            intent = "ask_culture"
-        
-        # Sửa ask_travel_tips nếu nhầm với ask_culture
-        if intent == "ask_culture" and any(keyword in user_msg for keyword in ["mẹo", "lưu ý", "chuẩn bị", "kinh nghiệm", "tip", "gợi ý"]):
-            intent = "ask_travel_tips"
-        
-        # Sửa ask_festival nếu nhầm với ask_culture
-        if intent == "ask_culture" and any(keyword in user_msg for keyword in ["lễ hội", "festival", "sự kiện", "lễ"]):
-            intent = "ask_festival"
-        
-        # Sửa ask_culture nếu nhầm với ask_festival
-        if intent == "ask_festival" and not any(keyword in user_msg for keyword in ["lễ hội", "festival", "sự kiện", "lễ"]) and any(keyword in user_msg for keyword in ["văn hóa", "văn hoá", "di sản", "phong tục"]):
-            intent = "ask_culture"
-        
-        # Sửa ask_attractions nếu nhầm với ask_culture
-        if intent == "ask_culture" and any(keyword in user_msg for keyword in ["địa điểm", "điểm", "tham quan", "du lịch", "đi đâu", "check in", "nơi", "chỗ"]):
-            intent = "ask_attractions"
-        
-        # Sửa ask_transportation nếu nhầm với ask_cuisine
-        if intent == "ask_transportation" and any(keyword in user_msg for keyword in ["ẩm thực", "ăn", "món", "đặc sản", "quán", "nhà hàng"]):
-            intent = "ask_cuisine"
-        
-        # Sửa ask_cuisine nếu nhầm với ask_transportation
-        if intent == "ask_cuisine" and any(keyword in user_msg for keyword in ["phương tiện", "đi bằng", "xe", "máy bay", "tàu", "di chuyển"]):
-            intent = "ask_transportation"
-        
-        # Sửa ask_transportation nếu nhầm với ask_attractions
-        if intent == "ask_transportation" and any(keyword in user_msg for keyword in ["địa điểm", "tham quan", "du lịch", "đi đâu", "check in"]):
-            intent = "ask_attractions"
-        
-        # Sửa ask_attractions nếu nhầm với ask_transportation
-        if intent == "ask_attractions" and any(keyword in user_msg for keyword in ["phương tiện", "đi bằng", "xe", "máy bay", "tàu", "di chuyển"]):
-            intent = "ask_transportation"
+        # Bảng luật sửa intent, dò từ khóa một lần cho cả câu
+        intent = correct_intent(intent, user_msg)
         
         # Format và gửi phản hồi
-        response = self._format_response(province_data, intent)
+        with stage_timer(self.name(), metrics.RESPONSE_FORMATTING):
+            response = self._format_response(province_data, intent)
         dispatcher.utter_message(text=response)
+        record_path(self.name(), "kb")
         
         return [SlotSet("location", location)]
 
@@ -361,10 +175,24 @@ class ActionQueryKnowledgeBase(Action):
 class ActionDefaultFallback(Action):
     """Action fallback khi bot không hiểu"""
     
+    def __init__(self):
+        super().__init__()
+        # Dùng chung KB store của process, không load lại file cho mỗi message
+        self.normalizer = ActionQueryKnowledgeBase()
+
     def name(self) -> Text:
         return "action_default_fallback"
     
-    def run(
+    async def run(
+        self,
+        dispatcher: CollectingDispatcher,
+        tracker: Tracker,
+        domain: Dict[Text, Any],
+    ) -> List[Dict[Text, Any]]:
+        with stage_timer(self.name(), metrics.TOTAL):
+            return await self._run(dispatcher, tracker, domain)
+
+    async def _run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
@@ -373,22 +201,20 @@ class ActionDefaultFallback(Action):
         # First: quick attempt to detect a location alias in the raw message and answer from KB
         user_msg = (tracker.latest_message.get("text", "") or "").strip()
         try:
-            normalizer = ActionQueryKnowledgeBase()
-            low_msg = user_msg.lower()
-            for alias in sorted(normalizer.location_map_raw.keys(), key=lambda x: -len(x)):
-                if alias.lower() in low_msg:
-                    canon = normalizer.location_map_raw.get(alias)
-                    # find province data
-                    province_data = None
-                    for pname, data in normalizer.knowledge_base.items():
-                        if pname.lower() == (canon or '').lower():
-                            province_data = {pname: data}
-                            break
-                    if province_data:
-                        # default to culture intent
+            normalizer = self.normalizer
+            with stage_timer(self.name(), metrics.ALIAS_DETECTION):
+                match = normalizer.store.alias_matcher.find_longest(user_msg)
+            if match:
+                canon = match.province
+                with stage_timer(self.name(), metrics.KB_LOOKUP):
+                    province_data = normalizer.store.get_province(canon)
+                if province_data:
+                    # default to culture intent
+                    with stage_timer(self.name(), metrics.RESPONSE_FORMATTING):
                         response = normalizer._format_response(province_data, 'ask_culture')
-                        dispatcher.utter_message(text=response)
-                        return [SlotSet('location', canon)]
+                    dispatcher.utter_message(text=response)
+                    record_path(self.name(), "kb_quick")
+                    return [SlotSet('location', canon)]
         except Exception as e:
             logging.getLogger(__name__).debug("DefaultFallback quick KB lookup failed: %s", e)
 
@@ -406,6 +232,7 @@ class ActionDefaultFallback(Action):
         )
 
         dispatcher.utter_message(text=message)
+        record_path(self.name(), "clarification")
         return []
 
 class ActionRAGFallback(Action):
@@ -415,6 +242,7 @@ class ActionRAGFallback(Action):
     - Only run when intent is explicitly 'out_of_scope' or 'nlu_fallback'
     - Short/greeting queries are ignored (ask user to clarify)
     - Use a confidence threshold (env RAG_CONFIDENCE_THRESHOLD or 0.55)
+    - KB quick path answers inline; search/synthesis run on the retrieval/LLM executors
     """
 
     def __init__(self):
@@ -423,28 +251,31 @@ class ActionRAGFallback(Action):
         kb_dir = os.path.join(os.getcwd(), "data/knowledge_base/provinces")
         self.retriever = None
         self.confidence_threshold = float(os.getenv("RAG_CONFIDENCE_THRESHOLD", "0.55"))
-        # Load location_map from JSON for normalization
-        map_path = os.path.join("data", "location_map.json")
-        if os.path.exists(map_path):
-            try:
-                with open(map_path, "r", encoding="utf-8") as f:
-                    self.location_map = json.load(f)
-            except Exception as e:
-                self.logger.warning(f"Error loading location map: {e}")
-                self.location_map = {}
-        else:
-            self.logger.warning(f"Location map file {map_path} not found!")
-            self.location_map = {}
+        # KB + location_map dùng chung của process (load một lần)
+        self.normalizer = ActionQueryKnowledgeBase()
         if RAGRetriever is not None:
             try:
                 self.retriever = RAGRetriever(kb_dir=kb_dir)
             except Exception as e:
                 self.logger.exception("[RAG] Could not initialize retriever: %s", e)
 
+    @property
+    def location_map(self) -> Mapping[str, str]:
+        return self.normalizer.location_map_raw
+
     def name(self) -> Text:
         return "action_rag_fallback"
 
-    def run(
+    async def run(
+        self,
+        dispatcher: CollectingDispatcher,
+        tracker: Tracker,
+        domain: Dict[Text, Any],
+    ) -> List[Dict[Text, Any]]:
+        with stage_timer(self.name(), metrics.TOTAL):
+            return await self._run(dispatcher, tracker, domain)
+
+    async def _run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
@@ -465,48 +296,40 @@ class ActionRAGFallback(Action):
         if any(keyword in user_msg_lower for keyword in greet_keywords) and len(user_msg.split()) <= 3:
             # Likely a greeting that was misclassified
             dispatcher.utter_message(text="Xin chào! Tôi là Ciesta, bot giới thiệu văn hóa và du lịch các tỉnh thành Việt Nam. Bạn muốn biết gì hôm nay?")
+            record_path(self.name(), "smalltalk")
             return []
         
         if any(keyword in user_msg_lower for keyword in goodbye_keywords) and len(user_msg.split()) <= 4:
             # Likely a goodbye that was misclassified
             dispatcher.utter_message(text="Tạm biệt! Hẹn gặp lại bạn trong hành trình khám phá Việt Nam.")
+            record_path(self.name(), "smalltalk")
             return []
         
         if any(keyword in user_msg_lower for keyword in bot_challenge_keywords):
             # Likely a bot challenge that was misclassified
             dispatcher.utter_message(text="Tôi là Ciesta, bot du lịch được xây dựng bằng Rasa để giúp bạn khám phá văn hóa và du lịch các tỉnh thành Việt Nam!")
+            record_path(self.name(), "smalltalk")
             return []
 
         # Quick path: if the raw message contains a known location alias, prefer the KB
         try:
-            normalizer = ActionQueryKnowledgeBase()
+            normalizer = self.normalizer
             low_msg = (user_msg or "").lower()
-            for alias in sorted(self.location_map.keys(), key=lambda x: -len(x)):
-                if alias.lower() in low_msg:
-                    canon = self.location_map.get(alias)
-                    # find province data
-                    province_data = None
-                    for pname, data in normalizer.knowledge_base.items():
-                        if pname.lower() == (canon or '').lower():
-                            province_data = {pname: data}
-                            break
-                    if province_data:
-                        # simple intent heuristics from text
-                        t = low_msg
-                        if 'ẩm thực' in t or 'ăn' in t:
-                            intent_req = 'ask_cuisine'
-                        elif 'địa điểm' in t or 'điểm' in t or 'tham quan' in t or 'đi ' in t:
-                            intent_req = 'ask_attractions'
-                        elif 'lễ hội' in t or 'lễ' in t:
-                            intent_req = 'ask_festival'
-                        elif 'mẹo' in t or 'lưu ý' in t:
-                            intent_req = 'ask_travel_tips'
-                        else:
-                            intent_req = 'ask_culture'
+            with stage_timer(self.name(), metrics.ALIAS_DETECTION):
+                match = normalizer.store.alias_matcher.find_longest(user_msg)
+            if match:
+                canon = match.province
+                with stage_timer(self.name(), metrics.KB_LOOKUP):
+                    province_data = normalizer.store.get_province(canon)
+                if province_data:
+                    # simple intent heuristics from text
+                    intent_req = detect_quick_intent(low_msg)
 
+                    with stage_timer(self.name(), metrics.RESPONSE_FORMATTING):
                         response = normalizer._format_response(province_data, intent_req)
-                        dispatcher.utter_message(text=response)
-                        return [SlotSet('location', canon)]
+                    dispatcher.utter_message(text=response)
+                    record_path(self.name(), "kb_quick")
+                    return [SlotSet('location', canon)]
         except Exception as e:
             self.logger.debug('KB quick-detect failed: %s', e)
 
@@ -514,6 +337,7 @@ class ActionRAGFallback(Action):
         allowed_intents = {"out_of_scope", "nlu_fallback"}
         if intent not in allowed_intents:
             self.logger.debug("ActionRAGFallback called for intent '%s' — skipping RAG", intent)
+            record_path(self.name(), "skipped")
             return []
 
 
@@ -533,20 +357,32 @@ class ActionRAGFallback(Action):
                 if found:
                     return text
                 # 2. Nếu không có entity, thử match alias trong mapping (ưu tiên cụm dài)
-                for alias in sorted(self.location_map.keys(), key=lambda x: -len(x)):
-                    if alias in text:
-                        text = text.replace(alias, self.location_map[alias])
-                        break
+                match = self.normalizer.store.alias_matcher.find_longest(text)
+                if match:
+                    text = text[:match.start] + match.province + text[match.end:]
                 return text
             except Exception as e:
                 self.logger.warning(f"Location normalization failed: {e}")
                 return text
 
-        norm_msg = normalize_location_in_text(user_msg, tracker)
+        def resolve_query_province(text, tracker):
+            # Tỉnh của câu hỏi hiện tại (entity trước, sau đó alias trong câu), dùng làm key cho answer cache
+            for entity in tracker.latest_message.get('entities', []):
+                if entity.get('entity') == 'location' and entity.get('value'):
+                    canonical = self.normalizer.store.resolve(entity['value'])
+                    if canonical:
+                        return canonical
+            match = self.normalizer.store.alias_matcher.find_longest(text)
+            return match.province if match else None
+
+        with stage_timer(self.name(), metrics.LOCATION_NORMALIZATION):
+            norm_msg = normalize_location_in_text(user_msg, tracker)
+            query_province = resolve_query_province(norm_msg, tracker)
 
         # Short/greeting queries should ask user to clarify instead of calling RAG
         if not norm_msg or len(norm_msg.split()) < 2:
             dispatcher.utter_message(text="Bạn có thể hỏi rõ hơn, ví dụ: 'Địa điểm du lịch Hồ Chí Minh', 'Ẩm thực Bắc Ninh', 'Lễ hội ở Huế'...")
+            record_path(self.name(), "clarification")
             return []
 
         if not self.retriever:
@@ -555,41 +391,64 @@ class ActionRAGFallback(Action):
                     "Xin lỗi, hiện chưa kích hoạt RAG. Vui lòng hỏi về văn hóa, địa điểm, ẩm thực, lễ hội, mẹo du lịch hoặc tỉnh sau sáp nhập."
                 )
             )
+            record_path(self.name(), "rag_disabled")
             return []
 
-        results = self.retriever.search(norm_msg, top_k=5)
+        # Câu hỏi giống nhau (cùng câu đã chuẩn hóa + cùng tỉnh) đang chạy đồng thời chỉ tìm kiếm
+        # và gọi LLM một lần, các request còn lại chờ kết quả đó
+        path, answer = await RAG_SINGLE_FLIGHT.do(
+            (fold(norm_msg), query_province),
+            lambda: self._answer_with_rag(norm_msg, query_province),
+        )
+        dispatcher.utter_message(text=answer)
+        record_path(self.name(), path)
+        return []
+
+    async def _answer_with_rag(self, norm_msg: Text, query_province: Optional[Text]) -> Tuple[Text, Text]:
+        """Retrieval + tổng hợp cho một câu hỏi đã chuẩn hóa, trả về (path cho metrics, câu trả lời)"""
+        # Retrieval (CPU-bound) chạy trên pool riêng, không chặn event loop
+        # Tỉnh / chủ đề đã biết thì chỉ tìm trong phân vùng tương ứng của index
+        try:
+            with stage_timer(self.name(), metrics.RETRIEVAL):
+                results = await run_blocking(
+                    RETRIEVAL_POOL,
+                    self.retriever.search,
+                    norm_msg,
+                    top_k=5,
+                    province=query_province,
+                    field=detect_kb_fields(norm_msg.lower()),
+                )
+        except Exception as e:
+            # Vd embedding service (RAG_EMBEDDING_SERVICE_URL) ngừng sau khi action server đã khởi động
+            self.logger.exception("RAG retrieval failed: %s", e)
+            return "error", "Xin lỗi, hệ thống tìm kiếm đang gặp sự cố. Bạn thử lại sau ít phút nhé."
         if not results:
-            dispatcher.utter_message(text="Xin lỗi, tôi chưa có dữ liệu phù hợp để trả lời.")
-            return []
+            return "no_results", "Xin lỗi, tôi chưa có dữ liệu phù hợp để trả lời."
 
-        top_score = results[0][0]
-        self.logger.debug("RAG top score: %s for query: %s", top_score, norm_msg)
+        # Ngưỡng được chỉnh cho cosine nên xét trên điểm dense, không phải điểm fused của hybrid
+        top_score = max(dense_score(result) for result in results)
+        self.logger.debug("RAG top dense score: %s for query: %s", top_score, norm_msg)
 
         if top_score < self.confidence_threshold:
-            dispatcher.utter_message(
-                text=(
-                    "Xin lỗi, tôi chưa chắc chắn câu trả lời. Bạn có thể hỏi cụ thể hơn về tỉnh/thành nào hoặc chủ đề nào không? Ví dụ: 'Ẩm thực Đà Nẵng', 'Lễ hội ở Huế', 'Địa điểm du lịch Vĩnh Long'..."
-                )
+            return "low_confidence", (
+                "Xin lỗi, tôi chưa chắc chắn câu trả lời. Bạn có thể hỏi cụ thể hơn về tỉnh/thành nào hoặc chủ đề nào không? Ví dụ: 'Ẩm thực Đà Nẵng', 'Lễ hội ở Huế', 'Địa điểm du lịch Vĩnh Long'..."
             )
-            return []
 
         # Nếu đủ confidence, tổng hợp (LLM optional) và trả về
         try:
-            # Debug: log LLM provider và API key status
-            provider = os.getenv("LLM_PROVIDER", "openai")
-            api_key_set = bool(os.getenv("GROQ_API_KEY") or os.getenv("OPENAI_API_KEY") or 
-                              os.getenv("HUGGINGFACE_API_KEY") or os.getenv("TOGETHER_API_KEY") or
-                              os.getenv("GOOGLE_API_KEY"))
-            self.logger.info(f"[RAG] Provider: {provider}, API key set: {api_key_set}")
-            
-            answer = self.retriever.synthesize(norm_msg, results)
-            dispatcher.utter_message(text=answer)
+            # Debug: log LLM provider và các provider đã có cấu hình
+            self.logger.info(f"[RAG] Provider: {provider_status()}")
+
+            # Gọi LLM (blocking I/O) trên pool riêng cho LLM
+            with stage_timer(self.name(), metrics.LLM_SYNTHESIS):
+                answer = await run_blocking(
+                    LLM_POOL, self.retriever.synthesize, norm_msg, results, province=query_province
+                )
+            return "rag", answer
         except Exception as e:
             self.logger.exception("RAG synthesis failed: %s", e)
             # Fallback message với thông tin debug
             error_msg = "Xin lỗi, xảy ra lỗi khi tổng hợp câu trả lời."
             if "API" in str(e) or "key" in str(e).lower():
                 error_msg += "\n\n💡 Kiểm tra:\n• API key có đúng trong .env?\n• LLM_PROVIDER có đúng không?\n• Đã restart action server sau khi thêm .env?"
-            dispatcher.utter_message(text=error_msg)
-
-        return []
\ No newline at end of file
+            return "error", error_msg
@@ -0,0 +1,133 @@
+"""
+FILE: alias_matcher.py
+Aho-Corasick automaton để tìm alias địa danh trong câu chỉ với một lần duyệt
+"""
+
+from collections import deque
+from typing import Dict, Generic, Iterable, Iterator, List, NamedTuple, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class AhoCorasick(Generic[T]):
+    """Automaton Aho-Corasick tối giản: pattern (chuỗi) -> payload."""
+
+    def __init__(self, patterns: Iterable[Tuple[str, T]]):
+        # Node i: _goto[i] là dict ký tự -> node, _fail[i] là failure link,
+        # _out[i] là danh sách (độ dài pattern, payload) kết thúc tại node i
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, T]]] = [[]]
+        self._size = 0
+
+        for pattern, payload in patterns:
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((len(pattern), payload))
+            self._size += 1
+
+        self._build_failure_links()
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                # Gộp output của failure link để không phải đi lại chuỗi fail khi match
+                self._out[nxt].extend(self._out[self._fail[nxt]])
+
+    def __len__(self) -> int:
+        return self._size
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, T]]:
+        """Yield mọi match (start, end, payload), kể cả các match chồng lấn nhau"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, payload in out[node]:
+                yield i + 1 - length, i + 1, payload
+
+
+class AliasMatch(NamedTuple):
+    """Một alias tìm thấy: span trong text gốc, chuỗi đã match và tỉnh chính thức"""
+
+    start: int
+    end: int
+    alias: str
+    province: str
+
+
+def _lower_same_length(text: str) -> str:
+    """lower() nhưng giữ nguyên độ dài chuỗi để span khớp với text gốc"""
+    low = text.lower()
+    if len(low) == len(text):
+        return low
+    return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+class LocationAliasMatcher:
+    """
+    Tìm alias tỉnh/thành trong câu người dùng.
+
+    Alias được so khớp không phân biệt hoa thường và phải đứng trọn vẹn giữa
+    ranh giới từ (ký tự trước/sau không phải chữ/số), nên "huế" không match
+    trong "thuế".
+    """
+
+    def __init__(self, location_map: Dict[str, str]):
+        patterns: Dict[str, str] = {}
+        for alias, province in location_map.items():
+            # "An Giang," / "AN GIANG" / "an giang" là cùng một pattern
+            key = _lower_same_length(alias.strip().rstrip(', '))
+            if key and key not in patterns:
+                patterns[key] = province
+        self._automaton = AhoCorasick(patterns.items())
+
+    def __len__(self) -> int:
+        return len(self._automaton)
+
+    @staticmethod
+    def _is_boundary(text: str, start: int, end: int) -> bool:
+        if start > 0 and text[start - 1].isalnum():
+            return False
+        if end < len(text) and text[end].isalnum():
+            return False
+        return True
+
+    def find_all(self, text: str) -> List[AliasMatch]:
+        """Mọi alias xuất hiện trong text (có thể chồng lấn), theo thứ tự vị trí"""
+        if not text:
+            return []
+        low = _lower_same_length(text)
+        matches = []
+        for start, end, province in self._automaton.iter_matches(low):
+            if self._is_boundary(low, start, end):
+                matches.append(AliasMatch(start, end, text[start:end], province))
+        matches.sort(key=lambda m: (m.start, -(m.end - m.start)))
+        return matches
+
+    def find_longest(self, text: str) -> Optional[AliasMatch]:
+        """Alias dài nhất trong text (hòa thì lấy alias xuất hiện trước)"""
+        best = None
+        for match in self.find_all(text):
+            if best is None or (match.end - match.start) > (best.end - best.start):
+                best = match
+        return best
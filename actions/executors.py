@@ -0,0 +1,58 @@
+"""
+FILE: executors.py
+Thread pool riêng cho các việc blocking của action server (retrieval CPU-bound, gọi LLM qua mạng)
+
+Event loop của rasa_sdk chỉ chạy phần việc rẻ (tra KB, format câu trả lời); mọi việc
+nặng được đẩy sang pool tương ứng để một request RAG chậm không chặn các hội thoại khác.
+Hai pool tách biệt nên các lời gọi LLM chậm không chiếm chỗ của retrieval và ngược lại.
+"""
+
+import asyncio
+import functools
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_POOL = "retrieval"
+LLM_POOL = "llm"
+
+# Số worker mặc định: retrieval là CPU-bound (torch tự dùng nhiều thread), LLM là I/O-bound
+_POOL_SIZES = {
+    RETRIEVAL_POOL: ("RAG_RETRIEVAL_WORKERS", 2),
+    LLM_POOL: ("RAG_LLM_WORKERS", 8),
+}
+
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def get_executor(kind: str) -> ThreadPoolExecutor:
+    """Pool dùng chung của process cho loại việc `kind`, tạo lần đầu khi cần"""
+    pool = _pools.get(kind)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(kind)
+            if pool is None:
+                env_name, default = _POOL_SIZES[kind]
+                workers = max(1, int(os.getenv(env_name, str(default))))
+                pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"ciesta-{kind}")
+                _pools[kind] = pool
+                logger.info(f"Started {kind} executor with {workers} workers")
+    return pool
+
+
+async def run_blocking(kind: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Chạy func(*args, **kwargs) trên pool `kind` và await kết quả từ event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(kind), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executors(wait: bool = False) -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=wait)
+        _pools.clear()
@@ -0,0 +1,138 @@
+"""
+FILE: fuzzy_index.py
+Gợi ý tỉnh gần đúng cho địa danh không tìm thấy (trigram index + edit distance có giới hạn)
+"""
+
+import heapq
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from actions.text_normalize import index_keys
+
+
+def _trigrams(term: str) -> List[str]:
+    padded = f"  {term} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> Optional[int]:
+    """Edit distance giữa a và b, hoặc None nếu lớn hơn max_distance (dừng sớm)"""
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    if len(a) > len(b):
+        a, b = b, a
+    previous = list(range(len(a) + 1))
+    for j, cb in enumerate(b, 1):
+        current = [j] + [0] * len(a)
+        row_min = j
+        for i, ca in enumerate(a, 1):
+            # min() của ba giá trị, viết tay vì đây là vòng lặp trong cùng
+            cost = previous[i - 1] + (ca != cb)
+            if previous[i] + 1 < cost:
+                cost = previous[i] + 1
+            if current[i - 1] + 1 < cost:
+                cost = current[i - 1] + 1
+            current[i] = cost
+            if cost < row_min:
+                row_min = cost
+        if row_min > max_distance:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+class FuzzyProvinceIndex:
+    """
+    Index gần đúng trên tên tỉnh + alias (dạng có dấu và không dấu).
+
+    Ứng viên lấy từ trigram chung, sau đó xếp hạng theo khớp đúng / chứa trọn cụm
+    từ / edit distance (bị chặn bởi max_distance), rồi tới độ tương đồng trigram.
+    Posting list được build lúc load nên mỗi truy vấn chỉ chạm vào các term có
+    chung trigram. Edit distance (phần tốn nhất) chỉ tính cho edit_candidates term
+    có Dice cao nhất và còn đủ trigram chung để nằm trong max_distance.
+    """
+
+    def __init__(
+        self,
+        term_to_province: Mapping[str, str],
+        max_distance: int = 2,
+        min_similarity: float = 0.45,
+        max_candidates: int = 24,
+        edit_candidates: int = 8,
+    ):
+        self.max_distance = max_distance
+        self.min_similarity = min_similarity
+        self.max_candidates = max_candidates
+        self.edit_candidates = edit_candidates
+        self._terms: List[str] = []
+        self._provinces: List[str] = []
+        self._term_sizes: List[int] = []
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for term, province in term_to_province.items():
+            if not term:
+                continue
+            term_id = len(self._terms)
+            grams = set(_trigrams(term))
+            self._terms.append(term)
+            self._provinces.append(province)
+            self._term_sizes.append(len(grams))
+            for gram in grams:
+                postings[gram].append(term_id)
+        self._postings = {gram: tuple(ids) for gram, ids in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def _score_terms(self, query: str) -> Dict[int, Tuple[int, float]]:
+        """term_id -> (hạng, similarity) cho các term đủ gần query"""
+        grams = set(_trigrams(query))
+        # term_id -> số trigram chung (đếm bằng Counter cho nhanh: trigram như "ng " có vài trăm term)
+        shared = Counter(chain.from_iterable(self._postings.get(gram, ()) for gram in grams))
+
+        # Dice coefficient trên tập trigram, chỉ giữ max_candidates term tốt nhất
+        n_grams = len(grams)
+        sizes = self._term_sizes
+        scored = heapq.nlargest(
+            self.max_candidates,
+            ((2.0 * count / (n_grams + sizes[term_id]), term_id) for term_id, count in shared.items()),
+        )
+
+        query_words = f" {query} "
+        # Mỗi phép sửa làm mất tối đa 3 trigram của query: thiếu nhiều hơn thì chắc chắn quá max_distance
+        max_missing = 3 * self.max_distance
+        results = {}
+        for position, (similarity, term_id) in enumerate(scored):
+            term = self._terms[term_id]
+            distance = None
+            if position < self.edit_candidates and n_grams - shared[term_id] <= max_missing:
+                distance = bounded_levenshtein(query, term, self.max_distance)
+            # Một bên là cụm từ trọn vẹn của bên kia: "ninh" ~ "bắc ninh", "đà" ~ "đà nẵng"
+            contained = f" {query} " in f" {term} " or f" {term} " in query_words
+            if distance is None and not contained and similarity < self.min_similarity:
+                continue
+            # Hạng: khớp đúng < chứa trọn cụm từ < sai khác vài ký tự < chỉ giống trigram
+            if distance == 0:
+                rank = 0
+            elif contained:
+                rank = 1
+            elif distance is not None:
+                rank = 1 + distance
+            else:
+                rank = 2 + self.max_distance
+            results[term_id] = (rank, similarity)
+        return results
+
+    def suggest(self, location: str, limit: int = 3) -> List[str]:
+        """Danh sách tỉnh gần giống location, tốt nhất trước"""
+        best: Dict[str, Tuple[int, float]] = {}
+        for query in set(index_keys(location)):
+            if not query:
+                continue
+            for term_id, (rank, similarity) in self._score_terms(query).items():
+                province = self._provinces[term_id]
+                key = (rank, -similarity)
+                if province not in best or key < best[province]:
+                    best[province] = key
+        ranked = sorted(best.items(), key=lambda item: (item[1], item[0]))
+        return [province for province, _ in ranked[:limit]]
@@ -0,0 +1,147 @@
+"""
+FILE: intent_keywords.py
+Bảng từ khóa + luật sửa intent, dò từ khóa bằng một lần duyệt câu (Aho-Corasick)
+"""
+
+from typing import Dict, FrozenSet, Iterable, NamedTuple, Optional, Tuple
+
+from actions.alias_matcher import AhoCorasick
+
+# Topic flags
+CULTURE = "culture"
+HERITAGE = "heritage"          # nhóm hẹp của culture, dùng cho luật festival -> culture
+TIPS = "tips"
+FESTIVAL = "festival"
+ATTRACTIONS = "attractions"
+SIGHTSEEING = "sightseeing"    # nhóm hẹp của attractions, dùng cho luật transportation -> attractions
+CUISINE = "cuisine"
+TRANSPORT = "transport"
+
+TOPIC_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    CULTURE: ("văn hóa", "văn hoá", "di sản", "phong tục", "truyền thống", "bản sắc", "đặc trưng"),
+    HERITAGE: ("văn hóa", "văn hoá", "di sản", "phong tục"),
+    TIPS: ("mẹo", "lưu ý", "chuẩn bị", "kinh nghiệm", "tip", "gợi ý"),
+    FESTIVAL: ("lễ hội", "festival", "sự kiện", "lễ"),
+    ATTRACTIONS: ("địa điểm", "điểm", "tham quan", "du lịch", "đi đâu", "check in", "nơi", "chỗ"),
+    SIGHTSEEING: ("địa điểm", "tham quan", "du lịch", "đi đâu", "check in"),
+    CUISINE: ("ẩm thực", "ăn", "món", "đặc sản", "quán", "nhà hàng"),
+    TRANSPORT: ("phương tiện", "đi bằng", "xe", "máy bay", "tàu", "di chuyển"),
+}
+
+
+class KeywordEngine:
+    """
+    Dò toàn bộ từ khóa của mọi topic trong một lần duyệt câu.
+
+    So khớp theo substring (giống `keyword in text` trước đây, kể cả chồng lấn),
+    text cần được lowercase trước khi scan.
+    """
+
+    def __init__(self, topic_keywords: Dict[str, Iterable[str]]):
+        keyword_topics: Dict[str, set] = {}
+        for topic, keywords in topic_keywords.items():
+            for keyword in keywords:
+                keyword_topics.setdefault(keyword, set()).add(topic)
+        self._automaton = AhoCorasick(
+            (keyword, frozenset(topics)) for keyword, topics in keyword_topics.items()
+        )
+
+    def scan(self, text: str) -> FrozenSet[str]:
+        """Tập topic flag có ít nhất một từ khóa xuất hiện trong text"""
+        flags = set()
+        for _, _, topics in self._automaton.iter_matches(text or ""):
+            flags |= topics
+        return frozenset(flags)
+
+
+class IntentRule(NamedTuple):
+    """Nếu intent hiện tại là `source`, có một trong `requires` và không có flag nào trong `excludes` -> `target`"""
+
+    source: str
+    target: str
+    requires: FrozenSet[str]
+    excludes: FrozenSet[str] = frozenset()
+
+
+# Luật được áp dụng tuần tự theo thứ tự dưới đây (luật sau thấy intent đã sửa bởi luật trước)
+INTENT_CORRECTION_RULES: Tuple[IntentRule, ...] = (
+    # Sửa ask_culture nếu nhầm với ask_travel_tips
+    IntentRule("ask_travel_tips", "ask_culture", frozenset({CULTURE})),
+    # Sửa ask_travel_tips nếu nhầm với ask_culture
+    IntentRule("ask_culture", "ask_travel_tips", frozenset({TIPS})),
+    # Sửa ask_festival nếu nhầm với ask_culture
+    IntentRule("ask_culture", "ask_festival", frozenset({FESTIVAL})),
+    # Sửa ask_culture nếu nhầm với ask_festival
+    IntentRule("ask_festival", "ask_culture", frozenset({HERITAGE}), frozenset({FESTIVAL})),
+    # Sửa ask_attractions nếu nhầm với ask_culture
+    IntentRule("ask_culture", "ask_attractions", frozenset({ATTRACTIONS})),
+    # Sửa ask_transportation nếu nhầm với ask_cuisine
+    IntentRule("ask_transportation", "ask_cuisine", frozenset({CUISINE})),
+    # Sửa ask_cuisine nếu nhầm với ask_transportation
+    IntentRule("ask_cuisine", "ask_transportation", frozenset({TRANSPORT})),
+    # Sửa ask_transportation nếu nhầm với ask_attractions
+    IntentRule("ask_transportation", "ask_attractions", frozenset({SIGHTSEEING})),
+    # Sửa ask_attractions nếu nhầm với ask_transportation
+    IntentRule("ask_attractions", "ask_transportation", frozenset({TRANSPORT})),
+)
+
+# Heuristic chọn intent cho quick path của fallback (chưa có intent đáng tin cậy):
+# topic đầu tiên có mặt trong câu thắng
+QUICK_PATH_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "ask_cuisine": ("ẩm thực", "ăn"),
+    "ask_attractions": ("địa điểm", "điểm", "tham quan", "đi "),
+    "ask_festival": ("lễ hội", "lễ"),
+    "ask_travel_tips": ("mẹo", "lưu ý"),
+}
+QUICK_PATH_PRIORITY: Tuple[str, ...] = tuple(QUICK_PATH_KEYWORDS)
+
+# Trường KB tương ứng với mỗi intent, dùng để RAG chỉ tìm trong phân vùng trường đó
+INTENT_KB_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "ask_culture": ("culture_details",),
+    "ask_attractions": ("places_to_visit", "sub_regions"),
+    "ask_cuisine": ("what_to_eat", "specialties_as_gifts"),
+    "ask_festival": ("festivals",),
+    "ask_travel_tips": ("travel_tips", "best_time_to_visit"),
+    "ask_transportation": ("transportation",),
+}
+
+# Từ khóa chặt hơn QUICK_PATH_KEYWORDS (vd "ăn" khớp cả "văn hóa"): lọc sai trường làm mất
+# chunk đúng, nên chỉ lọc khi câu nhắc rõ đúng một chủ đề
+RAG_FIELD_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "ask_culture": ("văn hóa", "văn hoá", "phong tục", "di sản", "truyền thống"),
+    "ask_attractions": ("địa điểm", "tham quan", "đi đâu", "check in", "danh lam", "thắng cảnh"),
+    "ask_cuisine": ("ẩm thực", "món ăn", "ăn gì", "đặc sản", "quán ăn", "nhà hàng"),
+    "ask_festival": ("lễ hội", "festival"),
+    "ask_travel_tips": ("mẹo", "lưu ý", "kinh nghiệm", "thời điểm", "mùa nào", "tháng nào"),
+    "ask_transportation": ("phương tiện", "di chuyển", "đi bằng", "máy bay", "xe khách"),
+}
+
+INTENT_KEYWORDS = KeywordEngine(TOPIC_KEYWORDS)
+QUICK_PATH_ENGINE = KeywordEngine(QUICK_PATH_KEYWORDS)
+RAG_FIELD_ENGINE = KeywordEngine(RAG_FIELD_KEYWORDS)
+
+
+def correct_intent(intent: str, text: str, rules: Iterable[IntentRule] = INTENT_CORRECTION_RULES) -> str:
+    """Sửa intent bị NLU nhầm dựa trên từ khóa trong câu (text đã lowercase)"""
+    flags = INTENT_KEYWORDS.scan(text)
+    for rule in rules:
+        if intent == rule.source and flags & rule.requires and not flags & rule.excludes:
+            intent = rule.target
+    return intent
+
+
+def detect_quick_intent(text: str, default: str = "ask_culture") -> str:
+    """Intent cho câu trả lời nhanh từ KB khi fallback bắt được tên tỉnh (text đã lowercase)"""
+    flags = QUICK_PATH_ENGINE.scan(text)
+    for intent in QUICK_PATH_PRIORITY:
+        if intent in flags:
+            return intent
+    return default
+
+
+def detect_kb_fields(text: str) -> Optional[Tuple[str, ...]]:
+    """Trường KB cho bộ lọc RAG (text đã lowercase); None nếu câu không nhắc hoặc nhắc nhiều chủ đề"""
+    intents = RAG_FIELD_ENGINE.scan(text)
+    if len(intents) != 1:
+        return None
+    return INTENT_KB_FIELDS[next(iter(intents))]
@@ -0,0 +1,193 @@
+"""
+FILE: kb_snapshot.py
+Snapshot nhị phân của knowledge base: một file, bảng offset, mmap và decode từng tỉnh khi cần
+
+Layout file (little-endian):
+    MAGIC (8 bytes) | VERSION (u32) | HEADER_LEN (u64) | HEADER (JSON utf-8) | DATA
+HEADER chứa offset/độ dài (tính từ đầu DATA) của từng tỉnh và của location map,
+cùng (size, mtime) của các file nguồn để phát hiện snapshot cũ.
+"""
+
+import json
+import mmap
+import os
+import logging
+import struct
+import threading
+import time
+from typing import Dict, Iterator, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"CIESTAKB"
+SNAPSHOT_VERSION = 1
+_PREAMBLE = struct.Struct("<8sIQ")
+
+DEFAULT_SNAPSHOT_PATH = os.path.join("data", "knowledge_base", "kb.snapshot")
+
+
+def source_stats(kb_dir: str, map_path: str) -> Dict[str, Tuple[int, int]]:
+    """(size, mtime_ns) của mọi file nguồn, key là đường dẫn tương đối với kb_dir"""
+    stats = {}
+    if os.path.isdir(kb_dir):
+        for filename in sorted(os.listdir(kb_dir)):
+            if filename.endswith(".json"):
+                st = os.stat(os.path.join(kb_dir, filename))
+                stats[filename] = (st.st_size, st.st_mtime_ns)
+    if os.path.exists(map_path):
+        st = os.stat(map_path)
+        stats["@location_map"] = (st.st_size, st.st_mtime_ns)
+    return stats
+
+
+def build_snapshot(kb_dir: str, map_path: str, out_path: str = DEFAULT_SNAPSHOT_PATH) -> Dict:
+    """Compile province JSON + location map thành một file snapshot, trả về header"""
+    blobs = []
+    provinces = []
+    offset = 0
+
+    def add_blob(payload) -> Tuple[int, int]:
+        nonlocal offset
+        blob = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        blobs.append(blob)
+        entry = (offset, len(blob))
+        offset += len(blob)
+        return entry
+
+    for filename in sorted(os.listdir(kb_dir)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(kb_dir, filename), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for name, record in data.items():
+            provinces.append([name, *add_blob(record)])
+
+    location_map = {}
+    if os.path.exists(map_path):
+        with open(map_path, "r", encoding="utf-8") as f:
+            location_map = json.load(f)
+
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "built_at": int(time.time()),
+        "provinces": provinces,
+        "location_map": list(add_blob(location_map)),
+        "sources": source_stats(kb_dir, map_path),
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+    # Ghi ra file tạm rồi rename để process đang mmap bản cũ không đọc phải file dở dang
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, out_path)
+    return header
+
+
+class LazyProvinceMapping(Mapping):
+    """Mapping tên tỉnh -> data, chỉ decode JSON của một tỉnh khi được truy cập lần đầu"""
+
+    def __init__(self, snapshot: "KBSnapshot", entries: Dict[str, Tuple[int, int]]):
+        self._snapshot = snapshot
+        self._entries = entries
+        self._decoded: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> Dict:
+        record = self._decoded.get(name)
+        if record is None:
+            offset, length = self._entries[name]
+            with self._lock:
+                record = self._decoded.get(name)
+                if record is None:
+                    record = self._snapshot.read_json(offset, length)
+                    self._decoded[name] = record
+        return record
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, name) -> bool:
+        return name in self._entries
+
+    @property
+    def decoded_count(self) -> int:
+        """Số tỉnh đã thực sự được decode (để theo dõi bộ nhớ)"""
+        return len(self._decoded)
+
+
+class KBSnapshot:
+    """File snapshot đã mmap (read-only)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, header_len = _PREAMBLE.unpack_from(self._mm, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not a KB snapshot")
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported KB snapshot version {version} (expected {SNAPSHOT_VERSION})")
+            header_start = _PREAMBLE.size
+            self.header = json.loads(self._mm[header_start:header_start + header_len].decode("utf-8"))
+            self._data_start = header_start + header_len
+        except Exception:
+            self._file.close()
+            raise
+
+    def read_json(self, offset: int, length: int):
+        start = self._data_start + offset
+        return json.loads(self._mm[start:start + length].decode("utf-8"))
+
+    def is_stale(self, kb_dir: str, map_path: str) -> bool:
+        """True nếu file nguồn đã đổi (size/mtime) kể từ khi build snapshot"""
+        current = {k: list(v) for k, v in source_stats(kb_dir, map_path).items()}
+        return current != self.header.get("sources", {})
+
+    def provinces(self) -> LazyProvinceMapping:
+        return LazyProvinceMapping(
+            self, {name: (offset, length) for name, offset, length in self.header["provinces"]}
+        )
+
+    def location_map(self) -> Dict[str, str]:
+        return self.read_json(*self.header["location_map"])
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+
+def open_snapshot(
+    kb_dir: str,
+    map_path: str,
+    snapshot_path: Optional[str] = None,
+) -> Optional[KBSnapshot]:
+    """
+    Mở snapshot nếu có và còn khớp với file nguồn, ngược lại trả về None để
+    caller load thẳng từ JSON. Đường dẫn lấy từ env KB_SNAPSHOT_PATH nếu không truyền vào;
+    KB_SNAPSHOT_PATH="" để tắt snapshot.
+    """
+    if snapshot_path is None:
+        snapshot_path = os.getenv("KB_SNAPSHOT_PATH", DEFAULT_SNAPSHOT_PATH)
+    if not snapshot_path or not os.path.exists(snapshot_path):
+        return None
+    try:
+        snapshot = KBSnapshot(snapshot_path)
+    except Exception as e:
+        logger.warning(f"Could not open KB snapshot {snapshot_path}: {e}")
+        return None
+    if snapshot.is_stale(kb_dir, map_path):
+        logger.warning(
+            f"KB snapshot {snapshot_path} is older than the JSON sources, loading JSON instead. "
+            f"Rebuild with: python scripts/build_kb_snapshot.py"
+        )
+        snapshot.close()
+        return None
+    return snapshot
@@ -0,0 +1,318 @@
+"""
+FILE: knowledge_base.py
+Knowledge base dùng chung cho toàn bộ action server (load một lần cho cả process).
+get_store() kiểm tra (size, mtime) của file nguồn / snapshot mỗi KB_RELOAD_INTERVAL giây
+(mặc định 5, 0 để tắt). Việc kiểm tra và load lại chạy trên thread nền: request vẫn dùng store cũ
+tới khi store mới build xong rồi mới đổi tham chiếu, không chặn event loop của action server.
+"""
+
+import json
+import os
+import logging
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from actions.alias_matcher import LocationAliasMatcher
+from actions.fuzzy_index import FuzzyProvinceIndex
+from actions.kb_snapshot import DEFAULT_SNAPSHOT_PATH, open_snapshot, source_stats
+from actions.rendering import RenderCache
+from actions.text_normalize import fold, index_keys
+
+logger = logging.getLogger(__name__)
+
+KB_DIR = os.path.join("data", "knowledge_base", "provinces")
+LOCATION_MAP_PATH = os.path.join("data", "location_map.json")
+DEFAULT_RELOAD_INTERVAL = 5.0
+# Store cũ có thể vẫn đang được request dở dang dùng: chờ chừng này giây rồi mới đóng snapshot của nó
+RETIRED_STORE_GRACE = 60.0
+
+
+def load_location_map(map_path: str = LOCATION_MAP_PATH) -> Dict[str, str]:
+    """Load location alias mapping from data/location_map.json"""
+    if not os.path.exists(map_path):
+        logger.warning(f"Location map file {map_path} not found!")
+        return {}
+    try:
+        with open(map_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading location map: {e}")
+        return {}
+
+
+def load_provinces(kb_dir: str = KB_DIR) -> Dict[str, Dict]:
+    """Load tất cả các file JSON từ thư mục data/knowledge_base/provinces"""
+    knowledge_base = {}
+
+    if not os.path.exists(kb_dir):
+        logger.warning(f"Directory {kb_dir} not found!")
+        return knowledge_base
+
+    # Đọc tất cả file .json trong thư mục (sắp xếp để thứ tự ổn định giữa các lần load)
+    for filename in sorted(os.listdir(kb_dir)):
+        if filename.endswith('.json'):
+            file_path = os.path.join(kb_dir, filename)
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    knowledge_base.update(json.load(f))
+                logger.debug(f"Loaded: {filename}")
+            except Exception as e:
+                logger.error(f"Error loading {filename}: {e}")
+
+    logger.info(f"Total provinces loaded: {len(knowledge_base)}")
+    return knowledge_base
+
+
+def source_signature(
+    kb_dir: str = KB_DIR,
+    map_path: str = LOCATION_MAP_PATH,
+    snapshot_path: Optional[str] = None,
+) -> Dict[str, Tuple[int, int]]:
+    """(size, mtime_ns) của file JSON nguồn, location map và snapshot (nếu có)"""
+    stats = source_stats(kb_dir, map_path)
+    if snapshot_path is None:
+        snapshot_path = os.getenv("KB_SNAPSHOT_PATH", DEFAULT_SNAPSHOT_PATH)
+    if snapshot_path and os.path.exists(snapshot_path):
+        st = os.stat(snapshot_path)
+        stats["@snapshot"] = (st.st_size, st.st_mtime_ns)
+    return stats
+
+
+def build_province_index(knowledge_base: Mapping[str, Dict], location_map_raw: Mapping[str, str]) -> Dict[str, str]:
+    """
+    Index key chuẩn hóa -> tên tỉnh chính thức.
+
+    Key gồm tên tỉnh và mọi alias, ở dạng NFC + casefold có dấu và không dấu.
+    Alias trỏ tới một alias khác (vd "Sai Gon" -> "Sài Gòn") được dò tiếp tới tỉnh.
+    Key không dấu trùng nhau giữa hai tỉnh khác nhau bị bỏ (không đoán bừa).
+    """
+    names: Dict[str, str] = {}
+    for name in knowledge_base:
+        for key in index_keys(name):
+            names.setdefault(key, name)
+
+    alias_targets = {fold(alias): target for alias, target in location_map_raw.items()}
+
+    def resolve(target: str) -> Optional[str]:
+        # alias -> alias -> tỉnh, giới hạn số bước để tránh vòng lặp trong data
+        for _ in range(4):
+            key = fold(target)
+            if key in names:
+                return names[key]
+            if key not in alias_targets:
+                return None
+            target = alias_targets[key]
+        return None
+
+    index = dict(names)
+    resolved = [(alias, resolve(target)) for alias, target in location_map_raw.items()]
+    # Key có dấu trước: chính xác hơn nên được ưu tiên
+    for alias, province in resolved:
+        if province:
+            index.setdefault(fold(alias), province)
+    ambiguous = set()
+    for alias, province in resolved:
+        if not province:
+            continue
+        stripped = index_keys(alias)[1]
+        current = index.setdefault(stripped, province)
+        if current != province and stripped not in names:
+            ambiguous.add(stripped)
+    for key in ambiguous:
+        index.pop(key, None)
+    return index
+
+
+class KnowledgeBaseStore:
+    """
+    Snapshot bất biến của knowledge base + location map.
+
+    Các bảng tra cứu (alias map lowercase, index tên tỉnh, alias matcher) được build đúng một lần
+    khi load, sau đó mọi action dùng chung qua get_store(). Dữ liệu từng tỉnh là
+    dict gốc từ JSON: coi là read-only, không sửa trực tiếp.
+    """
+
+    def __init__(self, knowledge_base: Mapping[str, Dict], location_map_raw: Dict[str, str]):
+        if isinstance(knowledge_base, dict):
+            knowledge_base = MappingProxyType(dict(knowledge_base))
+        # Mapping khác (vd LazyProvinceMapping từ snapshot) vốn đã read-only, giữ nguyên
+        # để không decode toàn bộ tỉnh ngay lúc khởi tạo
+        self._knowledge_base = knowledge_base
+        self._location_map_raw = MappingProxyType(dict(location_map_raw))
+        # lowercase-key mapping for case-insensitive lookup
+        self._location_map = MappingProxyType(
+            {k.strip().lower(): v for k, v in location_map_raw.items()}
+        )
+        # folded / accent-stripped key -> canonical province name
+        self._province_index = MappingProxyType(
+            build_province_index(self._knowledge_base, location_map_raw)
+        )
+        # Automaton over every alias, dùng cho việc dò địa danh trong câu tự do
+        self._alias_matcher = LocationAliasMatcher(
+            {alias: self._province_index.get(fold(alias), target)
+             for alias, target in location_map_raw.items()}
+        )
+        # Gợi ý tỉnh gần đúng khi không resolve được địa danh
+        self._fuzzy_index = FuzzyProvinceIndex(
+            self._province_index,
+            max_distance=int(os.getenv("KB_FUZZY_MAX_DISTANCE", "2")),
+        )
+        # Câu trả lời đã render theo (tỉnh, intent), sống cùng vòng đời với store
+        self._render_cache = RenderCache(self._knowledge_base)
+        # Nguồn đã load (chỉ có khi tạo qua load()), dùng để phát hiện file trên đĩa đã đổi
+        self._sources: Optional[tuple] = None
+        self._snapshot = None
+
+    @classmethod
+    def load(
+        cls,
+        kb_dir: str = KB_DIR,
+        map_path: str = LOCATION_MAP_PATH,
+        snapshot_path: Optional[str] = None,
+    ) -> "KnowledgeBaseStore":
+        """Load từ snapshot nhị phân nếu có và còn mới, ngược lại đọc các file JSON"""
+        # Lấy signature trước khi đọc: file đổi trong lúc load thì lần kiểm tra sau sẽ load lại
+        signature = source_signature(kb_dir, map_path, snapshot_path)
+        snapshot = open_snapshot(kb_dir, map_path, snapshot_path)
+        if snapshot is not None:
+            logger.info(f"Loaded KB snapshot {snapshot.path} ({len(snapshot.header['provinces'])} provinces, lazy)")
+            store = cls(snapshot.provinces(), snapshot.location_map())
+            store._snapshot = snapshot
+        else:
+            store = cls(load_provinces(kb_dir), load_location_map(map_path))
+        store._sources = ((kb_dir, map_path, snapshot_path), signature)
+        return store
+
+    def close(self) -> None:
+        """Đóng mmap của snapshot (nếu load từ snapshot); chỉ gọi khi không còn request nào dùng store"""
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+
+    def is_stale(self) -> bool:
+        """True nếu file nguồn / snapshot đã đổi kể từ lúc load (store tạo trực tiếp thì luôn False)"""
+        if self._sources is None:
+            return False
+        args, signature = self._sources
+        return source_signature(*args) != signature
+
+    @property
+    def knowledge_base(self) -> Mapping[str, Dict]:
+        return self._knowledge_base
+
+    @property
+    def location_map_raw(self) -> Mapping[str, str]:
+        return self._location_map_raw
+
+    @property
+    def location_map(self) -> Mapping[str, str]:
+        return self._location_map
+
+    @property
+    def alias_matcher(self) -> LocationAliasMatcher:
+        return self._alias_matcher
+
+    @property
+    def render_cache(self) -> RenderCache:
+        return self._render_cache
+
+    def resolve(self, location: Optional[str]) -> Optional[str]:
+        """Tên tỉnh chính thức cho một tên/alias bất kỳ (có dấu hoặc không), hoặc None"""
+        key, stripped = index_keys(location or "")
+        province = self._province_index.get(key)
+        if province is None:
+            province = self._province_index.get(stripped)
+        return province
+
+    def normalize_location(self, location: str) -> str:
+        """Chuẩn hóa tên địa điểm theo 34 tỉnh thành mới (Nghị quyết 12/6/2025)"""
+        province = self.resolve(location)
+        if province is not None:
+            return province
+        # Nếu không tìm thấy, giữ nguyên location đã clean (bỏ dấu phẩy cuối)
+        return location.strip().rstrip(', ')
+
+    def suggest(self, location: str, limit: int = 3) -> List[str]:
+        """Các tỉnh gần giống location (sai chính tả, thiếu dấu, tên một phần), tốt nhất trước"""
+        return self._fuzzy_index.suggest(location, limit=limit)
+
+    def get_province(self, name: Optional[str]) -> Optional[Dict[str, Dict]]:
+        """Trả về {tên tỉnh: data} cho tên tỉnh hoặc alias, None nếu không có trong KB"""
+        canonical = self.resolve(name)
+        if canonical is None:
+            return None
+        return {canonical: self._knowledge_base[canonical]}
+
+
+_store: Optional[KnowledgeBaseStore] = None
+_store_lock = threading.Lock()
+_next_check = 0.0
+_reloader: Optional[threading.Thread] = None
+
+
+def _reload_interval() -> float:
+    return float(os.getenv("KB_RELOAD_INTERVAL", DEFAULT_RELOAD_INTERVAL))
+
+
+def _retire(store: Optional[KnowledgeBaseStore]) -> None:
+    if store is None or store._snapshot is None:
+        return
+    timer = threading.Timer(RETIRED_STORE_GRACE, store.close)
+    timer.daemon = True
+    timer.start()
+
+
+def _swap_store(store: KnowledgeBaseStore) -> None:
+    global _store, _next_check
+    with _store_lock:
+        old, _store = _store, store
+        _next_check = time.monotonic() + _reload_interval()
+    _retire(old)
+
+
+def _reload_if_changed() -> None:
+    """Chạy trên thread nền: load store mới nếu file đổi, trong lúc đó request dùng store cũ"""
+    try:
+        if _store.is_stale():
+            logger.info("Knowledge base files changed on disk, reloading in the background")
+            _swap_store(KnowledgeBaseStore.load())
+    except Exception:
+        logger.exception("Knowledge base reload failed, keeping the current store")
+
+
+def _start_reload_check(interval: float) -> None:
+    global _next_check, _reloader
+    # Thread khác đang kiểm tra thì dùng tạm store hiện tại, không chờ
+    if not _store_lock.acquire(blocking=False):
+        return
+    try:
+        if time.monotonic() < _next_check or (_reloader is not None and _reloader.is_alive()):
+            return
+        _next_check = time.monotonic() + interval
+        _reloader = threading.Thread(target=_reload_if_changed, name="kb-reloader", daemon=True)
+        _reloader.start()
+    finally:
+        _store_lock.release()
+
+
+def get_store() -> KnowledgeBaseStore:
+    """Trả về store dùng chung của process, load lần đầu khi được gọi và load lại khi file KB đổi"""
+    global _store, _next_check
+    interval = _reload_interval()
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = KnowledgeBaseStore.load()
+                _next_check = time.monotonic() + interval
+    elif interval > 0 and time.monotonic() >= _next_check:
+        _start_reload_check(interval)
+    return _store
+
+
+def reload_store() -> KnowledgeBaseStore:
+    """Load lại KB từ đĩa và thay thế store dùng chung (các action thấy ngay bản mới)"""
+    store = KnowledgeBaseStore.load()
+    _swap_store(store)
+    return store
@@ -0,0 +1,169 @@
+"""
+FILE: metrics.py
+Metrics cho action server: histogram độ trễ từng stage + counter theo nhánh trả lời,
+xuất ra Prometheus text format (không cần thêm thư viện ngoài)
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket (giây): tra KB ở mức micro giây, RAG/LLM ở mức giây
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (số đếm theo bucket (không cộng dồn), sum, count)
+        self._series: Dict[LabelValues, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[label_values] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (bucket_counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    le = _format_labels(self.label_names, labels, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = _format_labels(self.label_names, labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {count}")
+                base = _format_labels(self.label_names, labels)
+                lines.append(f"{self.name}_sum{base} {total}")
+                lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], List[str]]) -> None:
+        """collector() trả về các dòng Prometheus text, được gọi mỗi lần scrape"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception:
+                continue
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "ciesta_action_stage_seconds",
+    "Latency of each action stage in seconds",
+    ("action", "stage"),
+))
+ANSWER_PATH = REGISTRY.register(Counter(
+    "ciesta_action_answers_total",
+    "Number of action runs by the path that produced the answer",
+    ("action", "path"),
+))
+
+# Tên stage dùng chung giữa các action
+ALIAS_DETECTION = "alias_detection"
+LOCATION_NORMALIZATION = "location_normalization"
+KB_LOOKUP = "kb_lookup"
+RESPONSE_FORMATTING = "response_formatting"
+RETRIEVAL = "retrieval"
+LLM_SYNTHESIS = "llm_synthesis"
+TOTAL = "total"
+
+
+@contextmanager
+def stage_timer(action: str, stage: str) -> Iterator[None]:
+    """Đo thời gian một stage và ghi vào histogram (kể cả khi stage raise exception)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, action, stage)
+
+
+def record_path(action: str, path: str) -> None:
+    ANSWER_PATH.inc(action, path)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,201 @@
+"""
+FILE: rendering.py
+Render câu trả lời Markdown từ dữ liệu knowledge base, kèm cache theo (tỉnh, intent)
+"""
+
+import os
+import logging
+from typing import Dict, Mapping, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Các intent có template riêng; intent khác dùng chung bản tổng quan
+RENDER_INTENTS = (
+    "ask_culture",
+    "ask_attractions",
+    "ask_cuisine",
+    "ask_festival",
+    "ask_travel_tips",
+    "ask_new_province",
+    "ask_transportation",
+)
+DEFAULT_RENDER_INTENT = "default"
+
+
+def format_province_response(province_name: str, data: Dict, intent: str) -> str:
+    """Format phản hồi Markdown cho một tỉnh dựa trên intent"""
+    if intent == "ask_culture":
+        response = f"📍 **{province_name}**\n\n"
+        response += f"{data.get('culture_details', 'Không có thông tin văn hóa.')}\n\n"
+        
+        if 'sub_regions' in data and data['sub_regions']:
+            response += "**Các khu vực đặc trưng:**\n"
+            for region in data['sub_regions']:
+                response += f"• {region['name']}: {region['highlights']}\n"
+        
+        return response
+    
+    elif intent == "ask_attractions":
+        response = f"📍 **Địa điểm tham quan tại {province_name}**\n\n"
+        
+        if 'places_to_visit' in data and data['places_to_visit']:
+            for i, place in enumerate(data['places_to_visit'][:6], 1):
+                category = place.get('category', 'du lịch')
+                response += f"{i}. **{place['name']}** ({category})\n"
+                response += f"   {place['details']}\n\n"
+        else:
+            response += "Hiện chưa có thông tin địa điểm tham quan cụ thể.\n"
+            response += f"💡 *Gợi ý: Bạn có thể hỏi về văn hóa, ẩm thực hoặc lễ hội của {province_name}.*\n"
+        
+        return response
+    
+    elif intent == "ask_cuisine":
+        response = f"🍜 **Ẩm thực {province_name}**\n\n"
+        
+        if 'what_to_eat' in data and data['what_to_eat']:
+            for i, food in enumerate(data['what_to_eat'], 1):
+                response += f"{i}. **{food['name']}**\n"
+                response += f"   {food['details']}\n\n"
+        else:
+            response += "Không có thông tin ẩm thực."
+        
+        if 'specialties_as_gifts' in data and data['specialties_as_gifts']:
+            response += "\n**Đặc sản mua về:**\n"
+            for gift in data['specialties_as_gifts']:
+                response += f"• {gift}\n"
+        
+        return response
+    
+    elif intent == "ask_festival":
+        response = f"🎊 **Lễ hội tại {province_name}**\n\n"
+        
+        if 'festivals' in data and data['festivals']:
+            for fest in data['festivals']:
+                response += f"**{fest['name']}**\n"
+                response += f"⏰ Thời gian: {fest['time']}\n"
+                response += f"{fest['details']}\n\n"
+        else:
+            response += "Hiện chưa có thông tin lễ hội cụ thể.\n"
+            response += f"💡 *Gợi ý: Bạn có thể hỏi về văn hóa, địa điểm tham quan hoặc ẩm thực của {province_name}.*\n"
+        
+        return response
+    
+    elif intent == "ask_travel_tips":
+        response = f"💡 **Mẹo du lịch {province_name}**\n\n"
+        
+        # Ưu tiên travel_tips, không phải best_time_to_visit
+        if 'travel_tips' in data and data['travel_tips']:
+            response += f"**Lưu ý và mẹo:**\n{data['travel_tips']}\n\n"
+            # Vẫn hiển thị best_time_to_visit nếu có, nhưng ở cuối
+            if 'best_time_to_visit' in data and data['best_time_to_visit']:
+                response += f"**Thời điểm đẹp nhất:**\n{data['best_time_to_visit']}\n"
+        elif 'best_time_to_visit' in data and data['best_time_to_visit']:
+            # Chỉ hiển thị best_time_to_visit nếu không có travel_tips
+            response += f"**Thời điểm đẹp nhất:**\n{data['best_time_to_visit']}\n\n"
+            response += "💡 *Lưu ý: Để biết thêm mẹo du lịch cụ thể, vui lòng hỏi về địa điểm, ẩm thực hoặc phương tiện di chuyển.*\n"
+        else:
+            response += "Không có thông tin mẹo du lịch cụ thể.\n"
+            response += f"💡 *Gợi ý: Bạn có thể hỏi về địa điểm tham quan, ẩm thực hoặc phương tiện di chuyển của {province_name}.*\n"
+        
+        return response
+    
+    elif intent == "ask_new_province":
+        response = f"📋 **Cấu trúc tỉnh {province_name} sau sáp nhập (Nghị quyết 12/6/2025)**\n\n"
+        
+        if 'sub_regions' in data and data['sub_regions']:
+            response += f"**{province_name} mới** bao gồm các khu vực sau:\n\n"
+            for region in data['sub_regions']:
+                # Extract tên tỉnh cũ từ tên khu vực
+                region_name = region['name']
+                if 'cũ' in region_name.lower():
+                    # Khu vực tỉnh cũ
+                    old_province = region_name.replace('Khu vực', '').replace('(cũ)', '').strip()
+                    response += f"• **{old_province}** (tỉnh cũ)\n"
+                else:
+                    # Tỉnh được sáp nhập vào
+                    merged_province = region_name.replace('Khu vực', '').strip()
+                    response += f"• **{merged_province}** (sáp nhập vào {province_name})\n"
+                response += f"  {region['highlights']}\n\n"
+            
+            if data.get('culture_details'):
+                response += f"\n**Tổng quan:**\n{data['culture_details']}"
+        else:
+            response += "Không có thông tin sáp nhập.\n"
+            response += "💡 *Lưu ý: Thông tin sáp nhập dựa trên Nghị quyết 12/6/2025.*\n"
+        
+        return response
+    
+    elif intent == "ask_transportation":
+        response = f"🚗 **Phương tiện di chuyển đến {province_name}**\n\n"
+        
+        if 'transportation' in data:
+            response += data['transportation']
+        else:
+            response += "Không có thông tin phương tiện di chuyển."
+        
+        return response
+    
+    else:
+        # Trả về thông tin tổng quan
+        response = f"📍 **{province_name}**\n\n"
+        response += f"{data.get('culture_details', '')}\n\n"
+        
+        if 'best_time_to_visit' in data:
+            response += f"**Thời điểm đẹp:** {data['best_time_to_visit']}"
+        
+        return response
+
+
+class RenderCache:
+    """
+    Cache câu trả lời đã render cho từng (tỉnh, intent).
+
+    Chế độ lấy từ env KB_RENDER_CACHE:
+    - "lazy" (mặc định): render lần đầu được hỏi rồi giữ lại
+    - "eager": render sẵn toàn bộ 34 tỉnh x 7 intent ngay khi load
+    - "off": không cache, render mỗi lần
+
+    Cache gắn với một KnowledgeBaseStore; khi KB reload thì store mới có cache mới.
+    """
+
+    MODES = ("lazy", "eager", "off")
+
+    def __init__(self, knowledge_base: Mapping[str, Dict], mode: str = None):
+        mode = (mode or os.getenv("KB_RENDER_CACHE", "lazy")).lower()
+        if mode not in self.MODES:
+            logger.warning(f"Unknown KB_RENDER_CACHE '{mode}', using 'lazy'")
+            mode = "lazy"
+        self.mode = mode
+        self._knowledge_base = knowledge_base
+        self._cache: Dict[Tuple[str, str], str] = {}
+        if mode == "eager":
+            self.prerender()
+
+    @staticmethod
+    def _cache_intent(intent: str) -> str:
+        return intent if intent in RENDER_INTENTS else DEFAULT_RENDER_INTENT
+
+    def prerender(self) -> int:
+        """Render trước mọi (tỉnh, intent), trả về số bản đã render"""
+        for province_name, data in self._knowledge_base.items():
+            for intent in RENDER_INTENTS:
+                self._cache[(province_name, intent)] = format_province_response(province_name, data, intent)
+        logger.info(f"Pre-rendered {len(self._cache)} KB answers")
+        return len(self._cache)
+
+    def render(self, province_name: str, intent: str) -> str:
+        intent = self._cache_intent(intent)
+        if self.mode == "off":
+            return format_province_response(province_name, self._knowledge_base[province_name], intent)
+        key = (province_name, intent)
+        response = self._cache.get(key)
+        if response is None:
+            response = format_province_response(province_name, self._knowledge_base[province_name], intent)
+            self._cache[key] = response
+        return response
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
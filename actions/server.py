@@ -0,0 +1,45 @@
+"""
+FILE: server.py
+Chạy action server của rasa_sdk kèm endpoint /metrics (Prometheus text format)
+
+Chạy (thay cho `rasa run actions`):
+    python -m actions.server
+Webhook vẫn ở http://localhost:5055/webhook, metrics ở http://localhost:5055/metrics
+"""
+
+import os
+import logging
+
+from actions.metrics import CONTENT_TYPE, render_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 5055
+
+
+def create_app(action_package_name: str = "actions"):
+    """App Sanic của rasa_sdk (webhook, health, actions) + route /metrics"""
+    from rasa_sdk import endpoint
+    from sanic import response
+
+    app = endpoint.create_app(action_package_name)
+
+    @app.get("/metrics")
+    async def metrics(request):
+        return response.text(render_metrics(), content_type=CONTENT_TYPE)
+
+    return app
+
+
+def main():
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    port = int(os.getenv("ACTION_SERVER_PORT", str(DEFAULT_PORT)))
+    host = os.getenv("SANIC_HOST", "0.0.0.0")
+    app = create_app(os.getenv("ACTION_PACKAGE", "actions"))
+    logger.info(f"Action endpoint + /metrics on http://{host}:{port}")
+    # Một worker: metrics nằm trong bộ nhớ của process, nhiều worker sẽ bị tách số liệu
+    app.run(host=host, port=port, workers=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+FILE: text_normalize.py
+Chuẩn hóa chuỗi tiếng Việt để làm key tra cứu (NFC, casefold, bỏ dấu)
+"""
+
+import unicodedata
+
+
+def fold(text: str) -> str:
+    """NFC + casefold + gộp khoảng trắng, bỏ dấu phẩy/chấm ở cuối"""
+    text = unicodedata.normalize("NFC", text or "")
+    return " ".join(text.casefold().split()).rstrip(" ,.")
+
+
+def strip_accents(text: str) -> str:
+    """Bỏ dấu tiếng Việt: 'Đà Nẵng' -> 'Da Nang' (đ/Đ không tách được bằng NFD nên map riêng)"""
+    decomposed = unicodedata.normalize("NFD", text or "")
+    stripped = "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+    return unicodedata.normalize("NFC", stripped.replace("đ", "d").replace("Đ", "D"))
+
+
+def index_keys(text: str):
+    """Các key dùng cho index: dạng fold có dấu và dạng fold không dấu"""
+    key = fold(text)
+    return key, strip_accents(key)
@@ -0,0 +1,130 @@
+"""
+Cache feature PhoBERT trên đĩa cho PhoBERTFeaturizer.process_training_data.
+
+Địa chỉ theo nội dung: namespace = hash(model identity, max_length, pooling, profile ảnh hưởng
+tới giá trị feature), key = sha256 của text. Mỗi namespace là một thư mục:
+    vectors.f32   các hàng float32 nối tiếp nhau (chỉ append), đọc bằng np.memmap
+    index.json    {"dim", "rows", "keys": {hash text: hàng}, "meta": ...}, ghi file tạm rồi os.replace
+
+index.json được ghi sau vectors.f32 nên nếu process chết giữa chừng thì chỉ mất các hàng chưa
+có trong index (lần append sau cắt bỏ phần thừa). Không hỗ trợ nhiều process cùng ghi một cache.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.json"
+# File weights dùng để nhận biết model local đã bị thay (so kích thước + mtime, không hash 1 GB)
+WEIGHT_FILES = ("pytorch_model.bin", "model.safetensors", "tf_model.h5")
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def model_identity(model_name: str, model_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Tên / đường dẫn model, config của model và (với model local) kích thước + mtime file weights"""
+    identity: Dict[str, Any] = {"model": model_name, "config": model_config}
+    path = Path(model_name)
+    if path.is_dir():
+        identity["weights"] = {
+            name: [(path / name).stat().st_size, int((path / name).stat().st_mtime)]
+            for name in WEIGHT_FILES
+            if (path / name).exists()
+        }
+    return identity
+
+
+def make_namespace(identity: Dict[str, Any], **settings: Any) -> str:
+    payload = json.dumps({"identity": identity, **settings}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+
+class FeatureCache:
+    """Feature cache của một namespace (một model + cấu hình encode)"""
+
+    def __init__(self, cache_dir: str, namespace: str, dim: int, meta: Optional[Dict[str, Any]] = None):
+        self.path = Path(cache_dir) / namespace
+        self.dim = dim
+        self.meta = meta or {}
+        self.keys: Dict[str, int] = {}
+        self.rows = 0
+        self._vectors: Optional[np.memmap] = None
+        self._load()
+
+    def _load(self) -> None:
+        index_path = self.path / INDEX_FILE
+        if not index_path.exists():
+            return
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[FeatureCache] ⚠️  Ignoring unreadable index {index_path}: {e}")
+            return
+        rows = int(index.get("rows", 0))
+        vectors_path = self.path / VECTORS_FILE
+        if index.get("dim") != self.dim or not vectors_path.exists():
+            return
+        if vectors_path.stat().st_size < rows * self.dim * 4:
+            print(f"[FeatureCache] ⚠️  {vectors_path} is shorter than its index, starting over")
+            return
+        self.keys = index.get("keys", {})
+        self.rows = rows
+        self._vectors = self._open(rows)
+
+    def _open(self, rows: int) -> Optional[np.memmap]:
+        if rows == 0:
+            return None
+        return np.memmap(self.path / VECTORS_FILE, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def lookup(self, texts: Sequence[str]) -> Tuple[np.ndarray, List[int]]:
+        """(mảng (n, dim) đã điền các hàng có trong cache, vị trí các text chưa có)"""
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        missing: List[int] = []
+        for position, text in enumerate(texts):
+            row = self.keys.get(text_key(text))
+            if row is None or row >= self.rows:
+                missing.append(position)
+            else:
+                out[position] = self._vectors[row]
+        return out, missing
+
+    def add(self, texts: Sequence[str], vectors: np.ndarray) -> None:
+        """Append các text chưa có (text trùng chỉ lưu một lần) rồi ghi lại index"""
+        new_rows: List[np.ndarray] = []
+        for text, vector in zip(texts, vectors):
+            key = text_key(text)
+            if key in self.keys:
+                continue
+            self.keys[key] = self.rows + len(new_rows)
+            new_rows.append(np.asarray(vector, dtype=np.float32).reshape(self.dim))
+        if not new_rows:
+            return
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        vectors_path = self.path / VECTORS_FILE
+        # Đóng memmap cũ trước khi ghi thêm vào cùng file
+        self._vectors = None
+        with open(vectors_path, "ab") as f:
+            # Bỏ phần đuôi của lần ghi trước bị dừng giữa chừng (có trong file nhưng không có trong index)
+            f.truncate(self.rows * self.dim * 4)
+            f.write(np.stack(new_rows).tobytes())
+        self.rows += len(new_rows)
+        self._write_index()
+        self._vectors = self._open(self.rows)
+
+    def _write_index(self) -> None:
+        tmp_path = self.path / (INDEX_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "rows": self.rows, "meta": self.meta, "keys": self.keys}, f)
+        os.replace(tmp_path, self.path / INDEX_FILE)
@@ -8,9 +8,11 @@ from rasa.shared.nlu.training_data.training_data import TrainingData
 from rasa.shared.nlu.training_data.features import Features
 
 from transformers import AutoTokenizer, AutoModel
+from custom_components.feature_cache import FeatureCache, make_namespace, model_identity
 import numpy as np
 import torch
 import os
+from contextlib import ExitStack
 from pathlib import Path
 
 @DefaultV1Recipe.register(
@@ -42,8 +44,17 @@ class PhoBERTFeaturizer(GraphComponent):
         self.max_length = config.get("max_length", 256)
         self.pooling_strategy = config.get("pooling_strategy", "mean_max")  # "mean", "max", "mean_max"
         self.batch_size = config.get("batch_size", 32)  # Batch size for processing multiple texts
+        # Inference profile: lean = không trả hidden states / attentions của mọi layer + torch.inference_mode
+        self.lean_inference = config.get("lean_inference", True)
+        self.num_threads = config.get("num_threads", None)  # intra-op threads (None = mặc định của torch)
+        self.num_interop_threads = config.get("num_interop_threads", None)  # inter-op threads
+        self.cpu_bf16 = config.get("cpu_bf16", False)  # bf16 autocast khi chạy CPU (cần CPU hỗ trợ AVX512-BF16/AMX)
+        # Cache feature của training data trên đĩa (None = tắt), xem custom_components/feature_cache.py
+        self.feature_cache_dir = config.get("feature_cache_dir", None)
+        self._feature_cache: Optional[FeatureCache] = None
 
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self._configure_threads()
         
         # Log device info for debugging
         if torch.cuda.is_available():
@@ -96,8 +107,10 @@ class PhoBERTFeaturizer(GraphComponent):
         self.model = AutoModel.from_pretrained(
             self.model_name,
             cache_dir=load_cache_dir,
-            output_hidden_states=True,  # Get all hidden states
-            output_attentions=True,     # Get attention weights
+            # Chỉ dùng outputs[0] (last hidden state); bật hai cờ này thì mỗi forward pass
+            # phải giữ hidden states + attention maps của mọi layer
+            output_hidden_states=not self.lean_inference,
+            output_attentions=not self.lean_inference,
             return_dict=True,
             local_files_only=is_local_path  # Use local files only if path exists
         ).to(self.device)
@@ -112,6 +125,49 @@ class PhoBERTFeaturizer(GraphComponent):
             # Single hidden size for mean or max only
             self.hidden_size = base_hidden_size
 
+        self.use_bf16_autocast = bool(self.cpu_bf16) and self.device == "cpu"
+        print(
+            f"[PhoBERTFeaturizer] 🔹 Inference profile: {'lean' if self.lean_inference else 'full outputs'}, "
+            f"threads={torch.get_num_threads()}/{torch.get_num_interop_threads()}, "
+            f"bf16 autocast: {self.use_bf16_autocast}"
+        )
+
+    def _get_feature_cache(self) -> Optional[FeatureCache]:
+        """Cache cho model + cấu hình hiện tại; namespace đổi khi bất kỳ yếu tố nào làm đổi feature"""
+        if not self.feature_cache_dir:
+            return None
+        if self._feature_cache is None:
+            identity = model_identity(self.model_name, self.model.config.to_dict())
+            settings = {
+                "max_length": self.max_length,
+                "pooling_strategy": self.pooling_strategy,
+                "bf16": self.use_bf16_autocast,
+            }
+            namespace = make_namespace(identity, **settings)
+            self._feature_cache = FeatureCache(
+                self.feature_cache_dir, namespace, self.hidden_size, meta={"model": self.model_name, **settings}
+            )
+            print(f"[PhoBERTFeaturizer] 🔹 Feature cache: {self._feature_cache.path} ({len(self._feature_cache)} entries)")
+        return self._feature_cache
+
+    def _configure_threads(self) -> None:
+        """Số thread của torch là thiết lập toàn process, đặt trước khi chạy forward pass đầu tiên"""
+        if self.num_threads:
+            torch.set_num_threads(int(self.num_threads))
+        if self.num_interop_threads:
+            try:
+                torch.set_num_interop_threads(int(self.num_interop_threads))
+            except RuntimeError as e:
+                # Chỉ đặt được một lần, trước khi có việc song song nào chạy
+                print(f"[PhoBERTFeaturizer] ⚠️  Could not set inter-op threads: {e}")
+
+    def _inference_context(self) -> ExitStack:
+        stack = ExitStack()
+        stack.enter_context(torch.inference_mode() if self.lean_inference else torch.no_grad())
+        if self.use_bf16_autocast:
+            stack.enter_context(torch.autocast(device_type="cpu", dtype=torch.bfloat16))
+        return stack
+
     # Rasa sẽ gọi hàm create() khi load pipeline
     @classmethod
     def create(
@@ -159,7 +215,7 @@ class PhoBERTFeaturizer(GraphComponent):
             return_token_type_ids=True
         ).to(self.device)
 
-        with torch.no_grad():
+        with self._inference_context():
             outputs = self.model(**inputs)
             
             # Get attention mask
@@ -193,8 +249,8 @@ class PhoBERTFeaturizer(GraphComponent):
                 # Concatenate mean and max pooling
                 pooled = torch.cat([mean_pooled, max_pooled], dim=-1)
             
-            # Convert to numpy
-            valid_embeddings = pooled.cpu().numpy()
+            # Convert to numpy (float() vì numpy không có bf16)
+            valid_embeddings = pooled.float().cpu().numpy()
         
         # Create output array for all texts (including empty ones)
         if len(valid_texts) == len(texts):
@@ -206,15 +262,8 @@ class PhoBERTFeaturizer(GraphComponent):
                 embeddings[valid_idx] = valid_embeddings[idx]
             return embeddings
 
-    def process(self, messages: List[Message]) -> List[Message]:
-        """Process messages in batches for better performance."""
-        if not messages:
-            return messages
-        
-        # Extract all texts
-        texts = [message.get("text") or "" for message in messages]
-        
-        # Process in batches to avoid memory issues
+    def _embed_texts(self, texts: List[Text]) -> np.ndarray:
+        """Embed texts in batches to avoid memory issues."""
         all_embeddings = []
         for i in range(0, len(texts), self.batch_size):
             batch_texts = texts[i:i + self.batch_size]
@@ -223,10 +272,20 @@ class PhoBERTFeaturizer(GraphComponent):
         
         # Concatenate all batches
         if all_embeddings:
-            embeddings = np.vstack(all_embeddings)
-        else:
-            embeddings = np.zeros((len(messages), self.hidden_size))
+            return np.vstack(all_embeddings)
+        return np.zeros((len(texts), self.hidden_size))
+
+    def process(self, messages: List[Message]) -> List[Message]:
+        """Process messages in batches for better performance."""
+        if not messages:
+            return messages
         
+        # Extract all texts
+        texts = [message.get("text") or "" for message in messages]
+        self._add_features(messages, self._embed_texts(texts))
+        return messages
+
+    def _add_features(self, messages: List[Message], embeddings: np.ndarray) -> None:
         # Add features to messages
         for message, emb in zip(messages, embeddings):
             # Reshape to (1, hidden_size) for Rasa
@@ -238,9 +297,26 @@ class PhoBERTFeaturizer(GraphComponent):
                     origin=self.__class__.__name__,
                 )
             )
-        
-        return messages
 
     def process_training_data(self, training_data: TrainingData) -> TrainingData:
-        self.process(training_data.training_examples)
+        messages = training_data.training_examples
+        cache = self._get_feature_cache()
+        if cache is None or not messages:
+            self.process(messages)
+            return training_data
+
+        # Chỉ embed các câu chưa có trong cache (câu mới hoặc đã sửa)
+        texts = [message.get("text") or "" for message in messages]
+        embeddings, missing = cache.lookup(texts)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            computed = self._embed_texts(missing_texts)
+            embeddings[missing] = computed
+            # Câu rỗng luôn là vector 0, không cần lưu
+            cache.add(
+                [text for text in missing_texts if text.strip()],
+                [vector for text, vector in zip(missing_texts, computed) if text.strip()],
+            )
+        print(f"[PhoBERTFeaturizer] 🔹 Feature cache: {len(texts) - len(missing)} hits, {len(missing)} embedded")
+        self._add_features(messages, embeddings)
         return training_data
\ No newline at end of file
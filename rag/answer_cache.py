@@ -0,0 +1,251 @@
+"""
+FILE: answer_cache.py
+Semantic cache cho câu trả lời LLM: câu hỏi mới có vector đủ gần một câu hỏi đã trả lời,
+cùng tỉnh và cùng tập chunk top-k thì dùng lại câu trả lời cũ, không gọi provider.
+Giữ trong bộ nhớ, đồng thời ghi xuống SQLite để còn sau khi restart. Lần tra trúng không ghi
+đĩa: last_used / entry hết hạn được giữ trong bộ nhớ và ghi gộp một transaction ở lần put sau
+(hoặc khi process thoát).
+"""
+
+import atexit
+import os
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from actions.metrics import REGISTRY
+from rag.query_cache import cache_metrics_collector
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ANSWER_CACHE_PATH = os.path.join("data", "rag_index", "answer_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_MAX_AGE = 7 * 24 * 3600.0
+DEFAULT_MAX_DISTANCE = 0.05
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    province TEXT NOT NULL,
+    chunk_key TEXT NOT NULL,
+    query TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    answer TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+# (encoder fingerprint, tỉnh, id các chunk top-k đã sort)
+BucketKey = Tuple[str, str, str]
+
+
+def chunk_key(chunk_ids: Iterable[str]) -> str:
+    return "|".join(sorted(chunk_ids))
+
+
+class SemanticAnswerCache:
+    """
+    Entry được gom theo bucket (fingerprint, tỉnh, tập chunk) nên mỗi lần tra chỉ so cosine
+    với vài vector. Bỏ entry cũ hơn max_age giây, quá max_entries thì bỏ entry dùng lâu nhất.
+    path="" để chỉ dùng bộ nhớ.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: Optional[int] = None,
+        max_age: Optional[float] = None,
+        max_distance: Optional[float] = None,
+    ):
+        self.path = os.getenv("RAG_ANSWER_CACHE_PATH", DEFAULT_ANSWER_CACHE_PATH) if path is None else path
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.getenv("RAG_ANSWER_CACHE_SIZE", DEFAULT_MAX_ENTRIES)
+        )
+        self.max_age = max_age if max_age is not None else float(
+            os.getenv("RAG_ANSWER_CACHE_TTL", DEFAULT_MAX_AGE)
+        )
+        # Khoảng cách cosine = 1 - cosine similarity (vector đã chuẩn hóa)
+        self.max_distance = max_distance if max_distance is not None else float(
+            os.getenv("RAG_ANSWER_CACHE_MAX_DISTANCE", DEFAULT_MAX_DISTANCE)
+        )
+        # id -> (bucket, vector, answer, created_at); thứ tự = dùng gần nhất ở cuối
+        self._entries: "OrderedDict[int, Tuple[BucketKey, np.ndarray, str, float]]" = OrderedDict()
+        self._buckets: Dict[BucketKey, set] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._next_id = 1
+        # Thay đổi chưa ghi xuống SQLite: id -> last_used, và id các entry hết hạn cần xóa
+        self._pending_last_used: Dict[int, float] = {}
+        self._pending_deletes: set = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if self.enabled:
+            self._open()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _open(self) -> None:
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Dùng từ nhiều thread của LLM pool, mọi truy cập đều nằm trong self._lock
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL + synchronous=NORMAL: commit không fsync mỗi lần, mất tối đa vài entry cuối khi mất điện
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(_SCHEMA)
+            self._db.execute("DELETE FROM answers WHERE created_at < ?", (time.time() - self.max_age,))
+            rows = self._db.execute(
+                "SELECT id, fingerprint, province, chunk_key, vector, answer, created_at "
+                "FROM answers ORDER BY last_used DESC LIMIT ?",
+                (self.max_entries,),
+            ).fetchall()
+            self._db.execute(
+                "DELETE FROM answers WHERE id NOT IN (SELECT id FROM answers ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"[RAG] Answer cache {self.path} unavailable, using memory only: {e}")
+            self._db = None
+            return
+        for entry_id, fingerprint, province, key, blob, answer, created_at in reversed(rows):
+            self._add_entry(entry_id, (fingerprint, province, key), np.frombuffer(blob, dtype=np.float32), answer, created_at)
+            self._next_id = max(self._next_id, entry_id + 1)
+        logger.info(f"[RAG] Loaded {len(rows)} cached answers from {self.path}")
+
+    def _add_entry(self, entry_id: int, bucket: BucketKey, vector: np.ndarray, answer: str, created_at: float) -> None:
+        self._entries[entry_id] = (bucket, vector, answer, created_at)
+        self._buckets.setdefault(bucket, set()).add(entry_id)
+
+    def _drop_entry(self, entry_id: int) -> None:
+        bucket = self._entries.pop(entry_id)[0]
+        ids = self._buckets.get(bucket)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._buckets[bucket]
+
+    def _write(self, statements) -> None:
+        """Ghi các thay đổi đang chờ cùng statements [(sql, params)] trong một transaction"""
+        if self._db is None:
+            return
+        last_used = list(self._pending_last_used.items())
+        deletes = [(entry_id,) for entry_id in self._pending_deletes]
+        self._pending_last_used.clear()
+        self._pending_deletes.clear()
+        try:
+            for sql, params in statements:
+                self._db.execute(sql, params)
+            if last_used:
+                self._db.executemany(
+                    "UPDATE answers SET last_used = ? WHERE id = ?", [(ts, entry_id) for entry_id, ts in last_used]
+                )
+            if deletes:
+                self._db.executemany("DELETE FROM answers WHERE id = ?", deletes)
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"[RAG] Answer cache write failed: {e}")
+
+    def flush(self) -> None:
+        """Ghi last_used / entry hết hạn đang giữ trong bộ nhớ xuống SQLite"""
+        with self._lock:
+            if self._pending_last_used or self._pending_deletes:
+                self._write(())
+
+    def get(self, vector: np.ndarray, bucket: BucketKey) -> Optional[str]:
+        """Câu trả lời của entry gần nhất trong bucket nếu khoảng cách cosine <= max_distance"""
+        if not self.enabled:
+            return None
+        query = np.asarray(vector, dtype=np.float32).reshape(-1)
+        now = time.time()
+        with self._lock:
+            best_id, best_similarity = None, 1.0 - self.max_distance
+            for entry_id in list(self._buckets.get(bucket, ())):
+                _, cached, _, created_at = self._entries[entry_id]
+                if now - created_at > self.max_age:
+                    self._drop_entry(entry_id)
+                    self._pending_last_used.pop(entry_id, None)
+                    self._pending_deletes.add(entry_id)
+                    self.expirations += 1
+                    continue
+                similarity = float(cached @ query)
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            if self._db is not None:
+                self._pending_last_used[best_id] = now
+            return self._entries[best_id][2]
+
+    def put(self, query: str, vector: np.ndarray, bucket: BucketKey, answer: str) -> None:
+        if not self.enabled:
+            return
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1).copy()
+        now = time.time()
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._add_entry(entry_id, bucket, vector, answer, now)
+            statements = [(
+                "INSERT INTO answers (id, fingerprint, province, chunk_key, query, vector, answer, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry_id, *bucket, query, vector.tobytes(), answer, now, now),
+            )]
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._drop_entry(oldest_id)
+                self._pending_last_used.pop(oldest_id, None)
+                statements.append(("DELETE FROM answers WHERE id = ?", (oldest_id,)))
+                self.evictions += 1
+            self._write(statements)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._pending_last_used.clear()
+            self._pending_deletes.clear()
+            self._write([("DELETE FROM answers", ())])
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_answer_cache: Optional[SemanticAnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Một cache (một connection SQLite) cho cả process"""
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = SemanticAnswerCache()
+                atexit.register(_answer_cache.flush)
+                REGISTRY.register_collector(cache_metrics_collector("rag_answer_cache", _answer_cache))
+    return _answer_cache
@@ -0,0 +1,164 @@
+"""
+FILE: batching.py
+Micro-batching cho encoder: các lời gọi encode đồng thời (từ nhiều thread / nhiều request HTTP)
+được gom lại trong tối đa max_wait_ms hoặc tới khi đủ max_batch_size câu, chạy một forward pass
+có padding rồi trả lại đúng phần vector của từng người gọi
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, NamedTuple, Optional
+
+import numpy as np
+
+from actions.metrics import REGISTRY, Histogram
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE = 16
+DEFAULT_MAX_WAIT_MS = 5.0
+
+BATCH_SIZE = REGISTRY.register(Histogram(
+    "ciesta_embedding_batch_size",
+    "Texts per encoder forward pass issued by a micro-batcher",
+    ("batcher",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+))
+QUEUE_WAIT = REGISTRY.register(Histogram(
+    "ciesta_embedding_queue_wait_seconds",
+    "Time an encode request waited in the micro-batch queue before its forward pass started",
+    ("batcher",),
+))
+
+
+class _Request(NamedTuple):
+    texts: List[str]
+    future: Future
+    enqueued_at: float
+    # Việc khác cần chạy trên worker (vd đếm token), không gộp vào batch
+    call: Optional[Callable[[], Any]] = None
+
+
+class MicroBatcher:
+    """
+    Một worker thread sở hữu encoder (encode_fn không cần thread-safe). Request lớn hơn
+    max_batch_size vẫn được chạy nguyên khối (encode_fn tự chia batch bên trong).
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+        name: str = "encoder",
+    ):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.name = name
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name=f"ciesta-batcher-{name}", daemon=True)
+        self._worker.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        future: Future = Future()
+        if self._closed:
+            future.set_exception(RuntimeError(f"MicroBatcher {self.name} is closed"))
+        else:
+            self._queue.put(_Request(list(texts), future, time.perf_counter()))
+        return future
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Chặn tới khi batch chứa texts chạy xong; cùng kết quả với encode_fn(texts)"""
+        return self.submit(texts).result()
+
+    def call(self, func: Callable[[], Any]) -> Any:
+        """Chạy func trên worker (xen giữa các batch), cho các việc dùng chung encoder như tokenizer"""
+        future: Future = Future()
+        if self._closed:
+            raise RuntimeError(f"MicroBatcher {self.name} is closed")
+        self._queue.put(_Request([], future, time.perf_counter(), func))
+        return future.result()
+
+    def close(self) -> None:
+        self._closed = True
+        self._queue.put(None)
+
+    @staticmethod
+    def _execute(request: _Request) -> None:
+        try:
+            request.future.set_result(request.call())
+        except Exception as e:
+            request.future.set_exception(e)
+
+    def _collect(self, first: _Request, deferred: List[_Request]) -> List[_Request]:
+        batch, size = [first], len(first.texts)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # close(): xử lý nốt batch hiện tại rồi dừng
+                self._queue.put(None)
+                break
+            if request.call is not None:
+                deferred.append(request)
+                continue
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            if first.call is not None:
+                self._execute(first)
+                continue
+            deferred: List[_Request] = []
+            batch = self._collect(first, deferred)
+            started = time.perf_counter()
+            for request in batch:
+                QUEUE_WAIT.observe(started - request.enqueued_at, self.name)
+            texts = [text for request in batch for text in request.texts]
+            BATCH_SIZE.observe(len(texts), self.name)
+            try:
+                vectors = self.encode_fn(texts)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+            else:
+                offset = 0
+                for request in batch:
+                    request.future.set_result(vectors[offset:offset + len(request.texts)])
+                    offset += len(request.texts)
+            for request in deferred:
+                self._execute(request)
+
+
+class BatchingEncoder:
+    """
+    Bọc một encoder (TextEncoder / EmbeddingClient): encode đi qua MicroBatcher, các thuộc tính
+    khác (dim, fingerprint, count_tokens, ...) lấy từ encoder gốc
+    """
+
+    def __init__(self, encoder, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS, name: str = "query"):
+        self.encoder = encoder
+        self.batcher = MicroBatcher(encoder.encode, max_batch_size, max_wait_ms, name=name)
+
+    def __getattr__(self, name):
+        return getattr(self.encoder, name)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.batcher.encode(texts)
@@ -0,0 +1,171 @@
+"""
+FILE: bm25.py
+BM25 cho chunk RAG: token là âm tiết + cặp âm tiết liền nhau (bigram), mỗi token có thêm
+dạng bỏ dấu để câu hỏi gõ không dấu ("bun bo hue") vẫn khớp. Inverted index lưu dạng CSR
+(indptr / indices / data của numpy), trọng số BM25 tính sẵn lúc build nên chấm điểm
+một câu hỏi chỉ là cộng các đoạn data theo token.
+"""
+
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from actions.text_normalize import fold, strip_accents
+
+_SYLLABLE = re.compile(r"\w+", re.UNICODE)
+
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Âm tiết + bigram âm tiết, dạng có dấu và (nếu khác) dạng không dấu"""
+    syllables = _SYLLABLE.findall(fold(text))
+    tokens = syllables + [f"{a} {b}" for a, b in zip(syllables, syllables[1:])]
+    stripped = [strip_accents(token) for token in tokens]
+    return tokens + [s for token, s in zip(tokens, stripped) if s != token]
+
+
+def top_rows(scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """k hàng điểm cao nhất (chỉ lấy điểm > 0) dạng (hàng, điểm), giảm dần"""
+    k = min(k, int(np.count_nonzero(scores)))
+    if k <= 0:
+        return []
+    rows = np.argpartition(-scores, k - 1)[:k]
+    rows = rows[np.argsort(-scores[rows])]
+    return [(int(row), float(scores[row])) for row in rows]
+
+
+class BM25Index:
+    """
+    Inverted index CSR theo token: các doc chứa token t nằm ở indices[indptr[t]:indptr[t+1]],
+    data cùng vị trí là trọng số BM25 của t trong doc đó. doc_ids là id FAISS của từng hàng.
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        data: np.ndarray,
+        max_weights: np.ndarray,
+        doc_ids: np.ndarray,
+        corpus_key: str = "",
+    ):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        # Trọng số lớn nhất có thể của từng token (idf * (k1 + 1)), dùng để đưa điểm về [0, 1]
+        self.max_weights = max_weights
+        self.doc_ids = doc_ids
+        self.corpus_key = corpus_key
+
+    @classmethod
+    def build(
+        cls,
+        texts: Sequence[str],
+        doc_ids: Sequence[int],
+        corpus_key: str = "",
+        k1: float = DEFAULT_K1,
+        b: float = DEFAULT_B,
+    ) -> "BM25Index":
+        doc_tokens = [Counter(tokenize(text)) for text in texts]
+        lengths = np.array([sum(tf.values()) for tf in doc_tokens], dtype=np.float32)
+        avg_length = float(lengths.mean()) if len(lengths) else 1.0
+        n_docs = len(doc_tokens)
+
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for row, tf in enumerate(doc_tokens):
+            for token, count in tf.items():
+                postings.setdefault(token, []).append((row, count))
+
+        vocab: Dict[str, int] = {}
+        indptr = [0]
+        indices: List[int] = []
+        data: List[float] = []
+        max_weights: List[float] = []
+        for token in sorted(postings):
+            docs = postings[token]
+            idf = math.log(1.0 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            vocab[token] = len(vocab)
+            for row, count in docs:
+                norm = k1 * (1.0 - b + b * lengths[row] / avg_length)
+                indices.append(row)
+                data.append(idf * count * (k1 + 1.0) / (count + norm))
+            indptr.append(len(indices))
+            max_weights.append(idf * (k1 + 1.0))
+
+        return cls(
+            vocab,
+            np.array(indptr, dtype=np.int64),
+            np.array(indices, dtype=np.int32),
+            np.array(data, dtype=np.float32),
+            np.array(max_weights, dtype=np.float32),
+            np.asarray(doc_ids, dtype=np.int64),
+            corpus_key,
+        )
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def scores(self, query: str) -> np.ndarray:
+        """
+        Điểm BM25 của mọi doc (theo thứ tự hàng), chia cho điểm tối đa có thể của các token
+        trong câu hỏi để nằm trong [0, 1] và so sánh được giữa các câu hỏi.
+        """
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        upper_bound = 0.0
+        for token, count in Counter(tokenize(query)).items():
+            column = self.vocab.get(token)
+            if column is None:
+                continue
+            start, end = self.indptr[column], self.indptr[column + 1]
+            scores[self.indices[start:end]] += count * self.data[start:end]
+            upper_bound += count * float(self.max_weights[column])
+        if upper_bound > 0:
+            scores /= upper_bound
+        return scores
+
+    def token_weight(self, token: str) -> float:
+        """Trọng số tối đa của token (tỉ lệ với idf), 0 nếu token không có trong corpus"""
+        column = self.vocab.get(token)
+        return float(self.max_weights[column]) if column is not None else 0.0
+
+    def top(self, query: str, k: int) -> List[Tuple[int, float]]:
+        return top_rows(self.scores(query), k)
+
+    def save(self, path: str) -> None:
+        """Ghi .npz (file tạm rồi os.replace)"""
+        tokens = np.array(sorted(self.vocab, key=self.vocab.get), dtype=str)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                tokens=tokens,
+                indptr=self.indptr,
+                indices=self.indices,
+                data=self.data,
+                max_weights=self.max_weights,
+                doc_ids=self.doc_ids,
+                corpus_key=np.array(self.corpus_key),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as arrays:
+            vocab = {str(token): column for column, token in enumerate(arrays["tokens"])}
+            return cls(
+                vocab,
+                arrays["indptr"],
+                arrays["indices"],
+                arrays["data"],
+                arrays["max_weights"],
+                arrays["doc_ids"],
+                str(arrays["corpus_key"]),
+            )
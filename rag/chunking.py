@@ -0,0 +1,114 @@
+"""
+FILE: chunking.py
+Cắt dữ liệu tỉnh thành (JSON knowledge base) thành các chunk văn bản cho RAG
+"""
+
+import os
+import logging
+import re
+from typing import Dict, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tên hiển thị của từng trường KB (dùng làm tiền tố cho chunk để embedding có ngữ cảnh)
+FIELD_LABELS = {
+    "culture_details": "Văn hóa",
+    "sub_regions": "Khu vực",
+    "places_to_visit": "Địa điểm tham quan",
+    "what_to_eat": "Ẩm thực",
+    "festivals": "Lễ hội",
+    "specialties_as_gifts": "Đặc sản làm quà",
+    "best_time_to_visit": "Thời điểm đẹp nhất",
+    "travel_tips": "Mẹo du lịch",
+    "transportation": "Phương tiện di chuyển",
+}
+
+DEFAULT_CHUNK_CHARS = 600
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?…])\s+")
+
+
+def load_province_records(kb_dir: str, map_path: Optional[str] = None) -> Mapping[str, Dict]:
+    """Dữ liệu các tỉnh: ưu tiên snapshot nhị phân (decode lazy), ngược lại đọc JSON"""
+    # Import tại chỗ để rag không phụ thuộc vào package actions khi chỉ dùng chunk_province
+    from actions.kb_snapshot import open_snapshot
+    from actions.knowledge_base import LOCATION_MAP_PATH, load_provinces
+
+    snapshot = open_snapshot(kb_dir, map_path or LOCATION_MAP_PATH)
+    if snapshot is not None:
+        return snapshot.provinces()
+    return load_provinces(kb_dir)
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text or "") if s.strip()]
+
+
+def _windows(text: str, max_chars: int) -> List[str]:
+    """Gom các câu liên tiếp thành đoạn không quá max_chars (một câu dài vẫn giữ nguyên)"""
+    windows, current = [], ""
+    for sentence in split_sentences(text):
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            windows.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        windows.append(current)
+    return windows
+
+
+def _item_text(field: str, item) -> str:
+    if isinstance(item, str):
+        return item
+    name = item.get("name", "")
+    if field == "festivals":
+        return f"{name} ({item.get('time', '')}): {item.get('details', '')}"
+    if field == "sub_regions":
+        return f"{name}: {item.get('highlights', '')}"
+    category = item.get("category")
+    suffix = f" ({category})" if category else ""
+    return f"{name}{suffix}: {item.get('details', '')}"
+
+
+def chunk_province(province: str, data: Dict, max_chars: int = DEFAULT_CHUNK_CHARS) -> List[Dict]:
+    """
+    Chunk của một tỉnh. Mỗi chunk là dict JSON-serializable:
+    {"id", "province", "field", "order", "text"}; id ổn định giữa các lần build
+    (province/field/order) để có thể so sánh khi KB thay đổi.
+    """
+    chunks = []
+    for field, value in data.items():
+        if not value:
+            continue
+        label = FIELD_LABELS.get(field, field)
+        if isinstance(value, str):
+            pieces = _windows(value, max_chars)
+        elif field == "specialties_as_gifts":
+            pieces = [", ".join(str(v) for v in value)]
+        elif isinstance(value, list):
+            pieces = [_item_text(field, item) for item in value]
+        else:
+            continue
+        for order, piece in enumerate(pieces):
+            chunks.append({
+                "id": f"{province}/{field}/{order}",
+                "province": province,
+                "field": field,
+                "order": order,
+                "text": f"{province} - {label}: {piece}",
+            })
+    return chunks
+
+
+def chunk_body(chunk: Dict) -> str:
+    """Phần nội dung sau tiền tố "<tỉnh> - <trường>: " mà chunk_province thêm vào"""
+    return chunk["text"].split(": ", 1)[-1]
+
+
+def chunk_knowledge_base(knowledge_base: Mapping[str, Dict], max_chars: int = DEFAULT_CHUNK_CHARS) -> List[Dict]:
+    chunks = []
+    for province in knowledge_base:
+        chunks.extend(chunk_province(province, knowledge_base[province], max_chars))
+    logger.info(f"[RAG] {len(chunks)} chunks from {len(knowledge_base)} provinces")
+    return chunks
@@ -0,0 +1,129 @@
+"""
+FILE: context_packing.py
+Đóng gói ngữ cảnh trước khi gửi LLM: bỏ chunk gần như trùng nhau, gộp các chunk liền kề
+cùng tỉnh + cùng trường, rồi lấy theo thứ tự điểm cho tới khi hết ngân sách token
+"""
+
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+from actions.text_normalize import fold
+from rag.chunking import chunk_body, split_sentences
+
+SearchResult = Tuple[float, Dict]
+
+DEFAULT_TOKEN_BUDGET = 600
+DEFAULT_DEDUP_THRESHOLD = 0.85
+
+
+def heuristic_token_count(text: str) -> int:
+    """Ước lượng khi không có tokenizer: BPE của PhoBERT tách trung bình ~1.3 token mỗi âm tiết"""
+    return int(len((text or "").split()) * 1.3) + 1
+
+
+def _word_set(text: str) -> frozenset:
+    return frozenset(fold(text).split())
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def deduplicate(results: List[SearchResult], threshold: float) -> List[SearchResult]:
+    """Giữ chunk điểm cao hơn trong mỗi cặp có Jaccard (theo âm tiết) >= threshold"""
+    kept: List[SearchResult] = []
+    kept_words: List[frozenset] = []
+    for score, chunk in sorted(results, key=lambda r: r[0], reverse=True):
+        words = _word_set(chunk_body(chunk))
+        if any(_jaccard(words, other) >= threshold for other in kept_words):
+            continue
+        kept.append((score, chunk))
+        kept_words.append(words)
+    return kept
+
+
+def merge_adjacent(results: List[SearchResult]) -> List[SearchResult]:
+    """
+    Gộp các chunk cùng (tỉnh, trường) có order liên tiếp thành một chunk; điểm của chunk gộp
+    là điểm cao nhất trong nhóm. Chunk gộp có thêm "ids" là id của các chunk gốc.
+    """
+    groups: Dict[Tuple[str, str], List[SearchResult]] = {}
+    for result in results:
+        chunk = result[1]
+        groups.setdefault((chunk.get("province"), chunk.get("field")), []).append(result)
+
+    merged: List[SearchResult] = []
+    for members in groups.values():
+        members.sort(key=lambda r: r[1].get("order", 0))
+        run = [members[0]]
+        for result in members[1:]:
+            if result[1].get("order", 0) == run[-1][1].get("order", 0) + 1:
+                run.append(result)
+            else:
+                merged.append(_merge_run(run))
+                run = [result]
+        merged.append(_merge_run(run))
+    merged.sort(key=lambda r: r[0], reverse=True)
+    return merged
+
+
+def _merge_run(run: List[SearchResult]) -> SearchResult:
+    if len(run) == 1:
+        return run[0]
+    first = run[0][1]
+    chunk = dict(first)
+    chunk["ids"] = [c.get("id") for _, c in run]
+    chunk["text"] = " ".join([first["text"]] + [chunk_body(c) for _, c in run[1:]])
+    return max(score for score, _ in run), chunk
+
+
+def _truncate(chunk: Dict, budget: int, count_tokens: Callable[[str], int]) -> Optional[Dict]:
+    """Cắt chunk theo câu cho vừa budget; None nếu câu đầu tiên đã vượt"""
+    sentences = split_sentences(chunk["text"])
+    text = ""
+    for sentence in sentences:
+        candidate = f"{text} {sentence}".strip()
+        if count_tokens(candidate) > budget:
+            break
+        text = candidate
+    if not text:
+        return None
+    return dict(chunk, text=text)
+
+
+def pack_context(
+    results: List[SearchResult],
+    token_budget: Optional[int] = None,
+    count_tokens: Optional[Callable[[str], int]] = None,
+    dedup_threshold: Optional[float] = None,
+) -> List[SearchResult]:
+    """
+    Ngữ cảnh cho prompt, theo thứ tự điểm giảm dần. Chunk không vừa phần budget còn lại bị bỏ qua
+    (chunk nhỏ hơn phía sau vẫn được xét); khi chưa lấy được chunk nào thì chunk quá dài được cắt theo câu.
+    token_budget <= 0 nghĩa là không giới hạn.
+    """
+    if token_budget is None:
+        token_budget = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+    if dedup_threshold is None:
+        dedup_threshold = float(os.getenv("RAG_CONTEXT_DEDUP_THRESHOLD", DEFAULT_DEDUP_THRESHOLD))
+    count_tokens = count_tokens or heuristic_token_count
+
+    candidates = merge_adjacent(deduplicate(results, dedup_threshold))
+    if token_budget <= 0:
+        return candidates
+
+    packed: List[SearchResult] = []
+    remaining = token_budget
+    for score, chunk in candidates:
+        tokens = count_tokens(chunk["text"])
+        if tokens <= remaining:
+            packed.append((score, chunk))
+            remaining -= tokens
+        elif not packed:
+            truncated = _truncate(chunk, remaining, count_tokens)
+            if truncated is not None:
+                packed.append((score, truncated))
+                remaining -= count_tokens(truncated["text"])
+    return packed
@@ -0,0 +1,140 @@
+"""
+FILE: embedder.py
+Encoder PhoBERT cho RAG: text -> vector float32 đã chuẩn hóa L2 (inner product = cosine)
+"""
+
+import os
+import hashlib
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCAL_MODEL = "models/phobert-large"
+DEFAULT_HUB_MODEL = "vinai/phobert-base"
+
+
+def default_model_name() -> str:
+    """RAG_EMBED_MODEL nếu có, ngược lại model local (giống config.yml) hoặc phobert-base trên hub"""
+    configured = os.getenv("RAG_EMBED_MODEL")
+    if configured:
+        return configured
+    if Path(DEFAULT_LOCAL_MODEL).exists():
+        return DEFAULT_LOCAL_MODEL
+    return DEFAULT_HUB_MODEL
+
+
+class TextEncoder:
+    """Load model transformers một lần, encode theo batch với mean / max / mean_max pooling"""
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        max_length: int = 256,
+        pooling_strategy: str = "mean_max",
+        batch_size: int = 16,
+        device: Optional[str] = None,
+    ):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        self.model_name = model_name or default_model_name()
+        self.max_length = max_length
+        self.pooling_strategy = pooling_strategy
+        self.batch_size = batch_size
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+
+        is_local = Path(self.model_name).exists()
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, use_fast=True, local_files_only=is_local)
+        self.model = AutoModel.from_pretrained(self.model_name, local_files_only=is_local).to(self.device)
+        self.model.eval()
+
+        base_hidden_size = getattr(self.model.config, "hidden_size", 768)
+        self.dim = 2 * base_hidden_size if pooling_strategy == "mean_max" else base_hidden_size
+        self._fingerprint: Optional[str] = None
+        # Fast tokenizer (Rust) không an toàn khi nhiều thread gọi cùng lúc ("Already borrowed"):
+        # count_tokens chạy trên LLM pool trong khi encode chạy trên retrieval pool / batcher
+        self._tokenizer_lock = threading.Lock()
+        logger.info(f"[RAG] Encoder {self.model_name} on {self.device}, dim={self.dim}")
+
+    @property
+    def fingerprint(self) -> str:
+        """Định danh model + cấu hình encode; đổi fingerprint nghĩa là vector cũ không còn dùng được"""
+        if self._fingerprint is not None:
+            return self._fingerprint
+        payload = {
+            "model": self.model_name,
+            "config": self.model.config.to_dict(),
+            "max_length": self.max_length,
+            "pooling": self.pooling_strategy,
+        }
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        self._fingerprint = digest[:16]
+        return self._fingerprint
+
+    def count_tokens(self, text: str) -> int:
+        with self._tokenizer_lock:
+            return len(self.tokenizer.tokenize(text or ""))
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        import torch
+
+        with self._tokenizer_lock:
+            inputs = self.tokenizer(
+                texts,
+                return_tensors="pt",
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+            )
+        inputs = inputs.to(self.device)
+        with torch.no_grad():
+            last_hidden = self.model(**inputs)[0]
+            mask = inputs["attention_mask"].unsqueeze(-1).to(last_hidden.dtype)
+            masked = last_hidden * mask
+            mean = masked.sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            if self.pooling_strategy == "mean":
+                pooled = mean
+            else:
+                # Vị trí padding nhận -inf để không ảnh hưởng max pooling
+                maxed = last_hidden.masked_fill(mask == 0, float("-inf")).max(dim=1)[0]
+                pooled = maxed if self.pooling_strategy == "max" else torch.cat([mean, maxed], dim=-1)
+        return pooled.float().cpu().numpy()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode list text -> mảng (n, dim) float32, mỗi hàng có norm 1"""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        batches = [
+            self._encode_batch(texts[i:i + self.batch_size])
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        vectors = np.vstack(batches).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-12, None)
+
+
+def load_encoder(model_name: Optional[str] = None):
+    """
+    Encoder cho retriever / script: client của embedding service nếu có RAG_EMBEDDING_SERVICE_URL
+    (không load model trong process), ngược lại TextEncoder. Service không kết nối được thì
+    load model tại chỗ để RAG vẫn chạy.
+    """
+    url = os.getenv("RAG_EMBEDDING_SERVICE_URL")
+    if url:
+        from rag.embedding_client import EmbeddingClient, EmbeddingServiceError
+
+        try:
+            client = EmbeddingClient(url)
+        except EmbeddingServiceError as e:
+            logger.warning(f"[RAG] {e}; loading the model in-process")
+        else:
+            if model_name and model_name != client.model_name:
+                logger.warning(f"[RAG] Embedding service serves {client.model_name}, not {model_name}")
+            return client
+    return TextEncoder(model_name)
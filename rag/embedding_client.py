@@ -0,0 +1,68 @@
+"""
+FILE: embedding_client.py
+Client cho rag/embedding_service.py, cùng interface với TextEncoder (dim, fingerprint,
+encode, count_tokens) nên retriever và script dùng thay thế được mà không load model
+"""
+
+import logging
+import os
+from typing import List, Optional
+
+import numpy as np
+import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30.0
+
+
+class EmbeddingServiceError(RuntimeError):
+    pass
+
+
+class EmbeddingClient:
+    """Fingerprint lấy từ service nên index build qua service hay trong process đều dùng chung được"""
+
+    def __init__(self, url: str, timeout: Optional[float] = None):
+        self.url = url.rstrip("/")
+        self.timeout = timeout if timeout is not None else float(os.getenv("RAG_EMBEDDING_TIMEOUT", DEFAULT_TIMEOUT))
+        self._session = requests.Session()
+        info = self._get("/info")
+        self.model_name = info["model"]
+        self.fingerprint = info["fingerprint"]
+        self.dim = int(info["dim"])
+        self.max_length = info.get("max_length")
+        self.pooling_strategy = info.get("pooling")
+        self.max_texts = int(info.get("max_texts", 256))
+        logger.info(f"[RAG] Using embedding service {self.url} ({self.model_name}, dim={self.dim})")
+
+    def _get(self, path: str):
+        try:
+            response = self._session.get(self.url + path, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise EmbeddingServiceError(f"Embedding service {self.url}{path} failed: {e}") from e
+        return response.json()
+
+    def _post(self, path: str, texts: List[str]) -> requests.Response:
+        try:
+            response = self._session.post(self.url + path, json={"texts": texts}, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise EmbeddingServiceError(f"Embedding service {self.url}{path} failed: {e}") from e
+        return response
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """(n, dim) float32 đã chuẩn hóa L2, giống TextEncoder.encode"""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        parts = []
+        for start in range(0, len(texts), self.max_texts):
+            response = self._post("/embed", texts[start:start + self.max_texts])
+            if response.headers.get("X-Embedding-Fingerprint", self.fingerprint) != self.fingerprint:
+                raise EmbeddingServiceError("Embedding service was restarted with a different model")
+            parts.append(np.frombuffer(response.content, dtype="<f4").reshape(-1, self.dim))
+        return np.vstack(parts).astype(np.float32, copy=False)
+
+    def count_tokens(self, text: str) -> int:
+        return int(self._post("/tokens", [text or ""]).json()["counts"][0])
@@ -0,0 +1,165 @@
+"""
+FILE: embedding_service.py
+Service embedding chạy trên localhost: load PhoBERT một lần cho cả node, các request đồng thời
+được micro-batch (rag/batching.py) thành một forward pass. Retriever và script dùng qua
+rag/embedding_client.py (env RAG_EMBEDDING_SERVICE_URL).
+
+API (HTTP, chỉ bind 127.0.0.1 mặc định):
+    GET  /health    {"status": "ok"}
+    GET  /info      {"model", "fingerprint", "dim", "max_length", "pooling", "max_texts"}
+    POST /embed     body {"texts": [...]} -> float32 little-endian (n, dim) dạng octet-stream,
+                    header X-Embedding-Dim / X-Embedding-Fingerprint
+    POST /tokens    body {"texts": [...]} -> {"counts": [...]} (số token theo tokenizer của model)
+
+Chạy: python -m rag.embedding_service [--port 8765] [--max-batch-size 16] [--max-wait-ms 5]
+"""
+
+import argparse
+import json
+import logging
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+import numpy as np
+
+from rag.batching import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS, MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Giới hạn số câu mỗi request để một client không giữ worker quá lâu
+DEFAULT_MAX_TEXTS = 256
+
+
+class EmbeddingService:
+    """Encoder + micro-batcher dùng chung cho mọi request của server"""
+
+    def __init__(self, encoder, max_batch_size: int, max_wait_ms: float, max_texts: int = DEFAULT_MAX_TEXTS):
+        self.encoder = encoder
+        self.max_texts = max_texts
+        self.batcher = MicroBatcher(encoder.encode, max_batch_size, max_wait_ms, name="service")
+
+    def info(self) -> Dict:
+        return {
+            "model": self.encoder.model_name,
+            "fingerprint": self.encoder.fingerprint,
+            "dim": self.encoder.dim,
+            "max_length": self.encoder.max_length,
+            "pooling": self.encoder.pooling_strategy,
+            "max_texts": self.max_texts,
+        }
+
+    def embed(self, texts) -> np.ndarray:
+        return self.batcher.encode(texts)
+
+    def count_tokens(self, texts) -> list:
+        # Chạy trên worker của batcher: tokenizer của encoder không an toàn khi handler thread
+        # gọi song song với forward pass của /embed
+        return self.batcher.call(lambda: [self.encoder.count_tokens(text) for text in texts])
+
+
+def make_handler(service: EmbeddingService):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            logger.debug("[Embedding] " + format, *args)
+
+        def _send(self, status: int, body: bytes, content_type: str, headers: Dict[str, str] = None) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status: int, payload) -> None:
+            self._send(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json")
+
+        def _read_texts(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            texts = payload.get("texts")
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                raise ValueError("'texts' must be a list of strings")
+            if len(texts) > service.max_texts:
+                raise ValueError(f"at most {service.max_texts} texts per request")
+            return texts
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            elif self.path == "/info":
+                self._send_json(200, service.info())
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path not in ("/embed", "/tokens"):
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                texts = self._read_texts()
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            try:
+                if self.path == "/tokens":
+                    self._send_json(200, {"counts": service.count_tokens(texts)})
+                    return
+                vectors = service.embed(texts) if texts else np.zeros((0, service.encoder.dim), np.float32)
+            except Exception as e:
+                logger.exception("[Embedding] Encode failed")
+                self._send_json(500, {"error": str(e)})
+                return
+            self._send(
+                200,
+                np.ascontiguousarray(vectors, dtype="<f4").tobytes(),
+                "application/octet-stream",
+                {"X-Embedding-Dim": str(service.encoder.dim), "X-Embedding-Fingerprint": service.encoder.fingerprint},
+            )
+
+    return Handler
+
+
+def serve(service: EmbeddingService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Tạo server (chưa chạy); gọi serve_forever() để phục vụ"""
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local batched PhoBERT embedding service")
+    parser.add_argument("--host", default=os.getenv("RAG_EMBEDDING_SERVICE_HOST", DEFAULT_HOST))
+    parser.add_argument("--port", type=int, default=int(os.getenv("RAG_EMBEDDING_SERVICE_PORT", DEFAULT_PORT)))
+    parser.add_argument("--model", default=None, help="mặc định như retriever (RAG_EMBED_MODEL / models/phobert-large)")
+    parser.add_argument("--max-batch-size", type=int,
+                        default=int(os.getenv("RAG_EMBED_MAX_BATCH_SIZE", DEFAULT_MAX_BATCH_SIZE)))
+    parser.add_argument("--max-wait-ms", type=float,
+                        default=float(os.getenv("RAG_EMBED_MAX_WAIT_MS", DEFAULT_MAX_WAIT_MS)))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from rag.embedder import TextEncoder
+
+    service = EmbeddingService(TextEncoder(args.model), args.max_batch_size, args.max_wait_ms)
+    server = serve(service, args.host, args.port)
+    logger.info(
+        f"[Embedding] Serving {service.encoder.model_name} on http://{args.host}:{args.port} "
+        f"(max batch {args.max_batch_size}, max wait {args.max_wait_ms} ms)"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.batcher.close()
+
+
+if __name__ == "__main__":
+    main()
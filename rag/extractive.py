@@ -0,0 +1,100 @@
+"""
+FILE: extractive.py
+Tổng hợp câu trả lời không cần LLM: chọn các câu liên quan nhất trong các chunk top-k
+(điểm retrieval của chunk + độ trùng từ với câu hỏi), rồi trình bày giống _format_response
+"""
+
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+from rag.bm25 import tokenize
+from rag.chunking import FIELD_LABELS, chunk_body, split_sentences
+
+SearchResult = Tuple[float, Dict]
+
+DEFAULT_MAX_SENTENCES = 4
+# Trọng số của điểm retrieval (embedding / hybrid) so với độ trùng từ
+DEFAULT_ALPHA = 0.5
+
+# Biểu tượng đầu mục giống actions/rendering.py
+FIELD_ICONS = {
+    "culture_details": "📍",
+    "sub_regions": "📍",
+    "places_to_visit": "📍",
+    "what_to_eat": "🍜",
+    "specialties_as_gifts": "🍜",
+    "festivals": "🎊",
+    "travel_tips": "💡",
+    "best_time_to_visit": "💡",
+    "transportation": "🚗",
+}
+
+
+def lexical_overlap(query_tokens: Dict[str, float], sentence: str) -> float:
+    """Tổng trọng số các token của câu hỏi có trong câu / tổng trọng số token câu hỏi"""
+    total = sum(query_tokens.values())
+    if total <= 0:
+        return 0.0
+    sentence_tokens = set(tokenize(sentence))
+    return sum(weight for token, weight in query_tokens.items() if token in sentence_tokens) / total
+
+
+def select_sentences(
+    query: str,
+    results: List[SearchResult],
+    token_weight: Optional[Callable[[str], float]] = None,
+    max_sentences: Optional[int] = None,
+    alpha: Optional[float] = None,
+) -> List[Tuple[int, int, Dict, str]]:
+    """
+    Các câu được chọn dạng (hạng chunk, vị trí câu trong chunk, chunk, câu), đã sắp theo
+    thứ tự trình bày: chunk điểm cao trước, trong một chunk giữ thứ tự câu gốc.
+    token_weight (vd idf từ BM25) cho token hiếm nặng hơn; không có thì mọi token như nhau.
+    """
+    if max_sentences is None:
+        max_sentences = int(os.getenv("RAG_EXTRACTIVE_SENTENCES", DEFAULT_MAX_SENTENCES))
+    if alpha is None:
+        alpha = float(os.getenv("RAG_EXTRACTIVE_ALPHA", DEFAULT_ALPHA))
+    weight = token_weight or (lambda token: 1.0)
+    query_tokens = {token: weight(token) for token in set(tokenize(query))}
+
+    scored = []
+    for rank, (score, chunk) in enumerate(results):
+        for position, sentence in enumerate(split_sentences(chunk_body(chunk))):
+            overlap = lexical_overlap(query_tokens, sentence)
+            # Câu mở đầu chunk thường là tên món / địa điểm, ưu tiên nhẹ khi điểm bằng nhau
+            scored.append((alpha * score + (1 - alpha) * overlap, -position, rank, position, chunk, sentence))
+    scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    selected = [(rank, position, chunk, sentence) for _, _, rank, position, chunk, sentence in scored[:max_sentences]]
+    selected.sort(key=lambda item: (item[0], item[1]))
+    return selected
+
+
+def format_extract(selected: List[Tuple[int, int, Dict, str]]) -> str:
+    """Nhóm câu theo (tỉnh, trường), mỗi nhóm một tiêu đề đậm + gạch đầu dòng như _format_response"""
+    sections: Dict[Tuple[str, str], List[str]] = {}
+    for _, _, chunk, sentence in selected:
+        key = (chunk.get("province", ""), chunk.get("field", ""))
+        if sentence not in sections.setdefault(key, []):
+            sections[key].append(sentence)
+
+    parts = []
+    for (province, field), sentences in sections.items():
+        icon = FIELD_ICONS.get(field, "📍")
+        label = FIELD_LABELS.get(field, field)
+        lines = [f"{icon} **{label} - {province}**" if province else f"{icon} **{label}**"]
+        lines.extend(f"• {sentence}" for sentence in sentences)
+        parts.append("\n".join(lines))
+    return "\n\n".join(parts)
+
+
+def extractive_answer(
+    query: str,
+    results: List[SearchResult],
+    token_weight: Optional[Callable[[str], float]] = None,
+    max_sentences: Optional[int] = None,
+) -> str:
+    """Câu trả lời trích xuất; chuỗi rỗng nếu không có kết quả"""
+    if not results:
+        return ""
+    return format_extract(select_sentences(query, results, token_weight, max_sentences))
@@ -0,0 +1,52 @@
+"""
+FILE: fusion.py
+Kết hợp điểm dense (cosine) và sparse (BM25 đã chuẩn hóa) thành một điểm trong [0, 1] để xếp hạng.
+Ngưỡng RAG_CONFIDENCE_THRESHOLD vẫn xét trên cosine (retriever.dense_score), vì điểm weighted
+của chunk chỉ khớp ngữ nghĩa có thể thấp hơn 0.55 dù cosine cao.
+
+RAG_FUSION:
+    weighted  alpha * dense + (1 - alpha) * bm25     (mặc định, alpha = RAG_FUSION_ALPHA)
+    rrf       reciprocal rank fusion, chia cho điểm tối đa 2 / (k + 1) (k = RAG_RRF_K)
+    dense     chỉ dùng FAISS như trước
+"""
+
+import os
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+FUSION_MODES = ("weighted", "rrf", "dense")
+DEFAULT_FUSION = "weighted"
+DEFAULT_ALPHA = 0.6
+DEFAULT_RRF_K = 60
+
+
+def fusion_mode() -> str:
+    mode = os.getenv("RAG_FUSION", DEFAULT_FUSION).strip().lower()
+    if mode not in FUSION_MODES:
+        logger.warning(f"[RAG] Unknown RAG_FUSION '{mode}', using '{DEFAULT_FUSION}'")
+        return DEFAULT_FUSION
+    return mode
+
+
+def weighted_fusion(dense: Dict[int, float], sparse: Dict[int, float], alpha: float = None) -> Dict[int, float]:
+    if alpha is None:
+        alpha = float(os.getenv("RAG_FUSION_ALPHA", DEFAULT_ALPHA))
+    return {
+        doc_id: alpha * dense.get(doc_id, 0.0) + (1.0 - alpha) * sparse.get(doc_id, 0.0)
+        for doc_id in dense.keys() | sparse.keys()
+    }
+
+
+def rrf_fusion(dense: Dict[int, float], sparse: Dict[int, float], k: int = None) -> Dict[int, float]:
+    """Chỉ dùng thứ hạng; doc có điểm BM25 bằng 0 không được tính hạng sparse"""
+    if k is None:
+        k = int(os.getenv("RAG_RRF_K", DEFAULT_RRF_K))
+    fused: Dict[int, float] = {}
+    for scores in (dense, {doc_id: s for doc_id, s in sparse.items() if s > 0}):
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        for rank, doc_id in enumerate(ranked, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    best = 2.0 / (k + 1)
+    return {doc_id: score / best for doc_id, score in fused.items()}
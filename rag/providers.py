@@ -0,0 +1,354 @@
+"""
+FILE: providers.py
+Lớp gọi LLM cho RAG: provider chọn qua env LLM_PROVIDER (xem docs/LLM_SETUP.md)
+
+- Một requests.Session dùng chung cho mọi provider (giữ kết nối keep-alive, pool giới hạn)
+- Mỗi provider có BoundedSemaphore riêng giới hạn số request đồng thời
+- Retry với backoff có jitter khi lỗi mạng / 429 / 5xx
+- Deadline cứng cho cả lời gọi (kể cả thời gian chờ semaphore, các lần retry và việc đọc body:
+  mỗi lần recv chỉ được chờ phần thời gian còn lại, nên server nhả từng byte cũng không kéo dài quá)
+- Provider "stub" chạy trong process, có độ trễ cấu hình được, để load test RAG không cần mạng
+
+Env:
+    LLM_TIMEOUT                 deadline (giây) cho một lời gọi, mặc định 30
+    LLM_MAX_RETRIES             số lần thử lại, mặc định 2
+    LLM_RETRY_BACKOFF           backoff cơ sở (giây), mặc định 0.5
+    LLM_MAX_CONCURRENCY         số request đồng thời mỗi provider, mặc định 4
+    LLM_MAX_CONCURRENCY_<NAME>  ghi đè cho một provider, vd LLM_MAX_CONCURRENCY_GROQ=8
+    LLM_HTTP_POOL_SIZE          số kết nối giữ lại mỗi host, mặc định 16
+    LLM_STUB_LATENCY_MS         độ trễ provider stub, mặc định 200
+    LLM_STUB_JITTER_MS          dao động ngẫu nhiên thêm vào độ trễ stub, mặc định 0
+    LLM_STUB_ERROR_RATE         tỉ lệ lỗi giả lập của stub (0..1), mặc định 0
+"""
+
+import abc
+import json
+import os
+import logging
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Thứ tự thử khi LLM_PROVIDER=auto (stub không nằm trong danh sách, phải chọn tường minh)
+AUTO_ORDER = ["groq", "openai", "huggingface", "together", "gemini", "ollama"]
+
+DEFAULT_PROVIDER = "openai"
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BACKOFF = 0.5
+DEFAULT_CONCURRENCY = 4
+DEFAULT_HTTP_POOL_SIZE = 16
+CONNECT_TIMEOUT = 3.05
+READ_CHUNK_SIZE = 64 * 1024
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(RuntimeError):
+    """Provider chưa được cấu hình (thiếu API key / base URL) hoặc không tồn tại"""
+
+
+class ProviderError(RuntimeError):
+    """Provider đã được gọi nhưng thất bại (hết retry, quá deadline, lỗi 4xx, ...)"""
+
+
+class ProvidersFailed(ProviderError):
+    """LLM_PROVIDER=auto: mọi provider đã cấu hình đều được thử và đều lỗi (khác với chưa cấu hình gì)"""
+
+
+class _RetryableError(ProviderError):
+    pass
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Session HTTP dùng chung của process (thread-safe cho việc gửi request)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = int(os.getenv("LLM_HTTP_POOL_SIZE", DEFAULT_HTTP_POOL_SIZE))
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _model(model_env: str, default: str) -> str:
+    """<PROVIDER>_MODEL, rồi LLM_MODEL (docs/FREE_LLM_API_GUIDE.md), rồi default"""
+    return os.getenv(model_env) or os.getenv("LLM_MODEL") or default
+
+
+class Provider(abc.ABC):
+    """Một provider: kiểm tra cấu hình, giới hạn đồng thời, retry, deadline; lớp con chỉ cần _call"""
+
+    name = ""
+    credential_env: Optional[str] = None
+
+    def __init__(self):
+        concurrency = int(os.getenv(
+            f"LLM_MAX_CONCURRENCY_{self.name.upper()}",
+            os.getenv("LLM_MAX_CONCURRENCY", DEFAULT_CONCURRENCY),
+        ))
+        self.semaphore = threading.BoundedSemaphore(max(1, concurrency))
+
+    def configured(self) -> bool:
+        return not self.credential_env or bool(os.getenv(self.credential_env))
+
+    @abc.abstractmethod
+    def _call(self, prompt: str, system: str, timeout: float) -> str:
+        """Một lần gọi provider, xong trong timeout giây; lỗi tạm thời raise _RetryableError"""
+
+    def complete(self, prompt: str, system: str, timeout: Optional[float] = None) -> str:
+        if not self.configured():
+            raise LLMUnavailable(f"{self.credential_env} not set")
+        timeout = float(os.getenv("LLM_TIMEOUT", DEFAULT_TIMEOUT)) if timeout is None else timeout
+        max_retries = int(os.getenv("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+        backoff = float(os.getenv("LLM_RETRY_BACKOFF", DEFAULT_BACKOFF))
+        deadline = time.monotonic() + timeout
+
+        if not self.semaphore.acquire(timeout=timeout):
+            raise ProviderError(f"{self.name}: no free slot within {timeout:.1f}s")
+        try:
+            attempt = 0
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ProviderError(f"{self.name}: deadline of {timeout:.2f}s exceeded")
+                try:
+                    return self._call(prompt, system, remaining)
+                except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+                    # Body không phải JSON (vd trang HTML lỗi) hoặc sai schema: coi là lỗi provider
+                    # để LLM_PROVIDER=auto thử provider tiếp theo
+                    raise ProviderError(f"{self.name}: malformed response: {e!r}")
+                except _RetryableError as e:
+                    if attempt >= max_retries:
+                        raise ProviderError(f"{self.name}: giving up after {attempt + 1} attempts: {e}")
+                    # Full jitter: ngủ ngẫu nhiên trong [0, backoff * 2^attempt], không vượt deadline
+                    delay = min(random.uniform(0, backoff * (2 ** attempt)), deadline - time.monotonic())
+                    if delay <= 0:
+                        raise ProviderError(f"{self.name}: deadline of {timeout:.2f}s exceeded: {e}")
+                    logger.warning(f"[RAG] {self.name} attempt {attempt + 1} failed ({e}), retrying in {delay:.2f}s")
+                    time.sleep(delay)
+                    attempt += 1
+        finally:
+            self.semaphore.release()
+
+    def _post(self, url: str, timeout: float, **kwargs) -> Dict:
+        """POST qua session dùng chung; lỗi mạng / 429 / 5xx được đánh dấu để retry"""
+        deadline = time.monotonic() + timeout
+        try:
+            response = get_session().post(
+                url, timeout=(min(CONNECT_TIMEOUT, timeout), timeout), stream=True, **kwargs
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _RetryableError(str(e))
+        if response.status_code in RETRYABLE_STATUS:
+            response.close()
+            raise _RetryableError(f"HTTP {response.status_code}")
+        body = self._read_body(response, deadline)
+        if response.status_code >= 400:
+            raise ProviderError(f"{self.name}: HTTP {response.status_code}: {body[:200].decode('utf-8', 'replace')}")
+        return json.loads(body)
+
+    def _read_body(self, response: requests.Response, deadline: float) -> bytes:
+        """
+        Đọc body trước deadline. Timeout của requests chỉ chặn từng lần đọc socket, nên trước mỗi
+        lần đọc đặt lại timeout của socket bằng thời gian còn lại và đọc tối đa một lần recv (read1)
+        """
+        raw = response.raw
+        sock = getattr(getattr(raw, "connection", None), "sock", None)
+        # urllib3 < 2 không có read1: read(n) có thể gom nhiều lần recv nên deadline chỉ được xét giữa các khối
+        read = getattr(raw, "read1", raw.read)
+        parts: List[bytes] = []
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise _RetryableError("response body not received before the deadline")
+                if sock is not None:
+                    sock.settimeout(remaining)
+                chunk = read(READ_CHUNK_SIZE, decode_content=True)
+                if not chunk:
+                    break
+                parts.append(chunk)
+        except (urllib3.exceptions.HTTPError, OSError) as e:
+            # Bỏ dở body: đóng kết nối thay vì trả về pool
+            response.close()
+            raise _RetryableError(f"reading response failed: {e}")
+        except _RetryableError:
+            response.close()
+            raise
+        # Đọc hết body: trả kết nối về pool để dùng lại (keep-alive)
+        raw.release_conn()
+        return b"".join(parts)
+
+
+class OpenAICompatibleProvider(Provider):
+    """Chat completions kiểu OpenAI (OpenAI, Groq, Together dùng chung định dạng)"""
+
+    def __init__(self, name: str, base_url: str, credential_env: str, model_env: str, default_model: str):
+        self.name = name
+        self.base_url = base_url
+        self.credential_env = credential_env
+        self.model_env = model_env
+        self.default_model = default_model
+        super().__init__()
+
+    def _call(self, prompt: str, system: str, timeout: float) -> str:
+        data = self._post(
+            f"{self.base_url}/chat/completions",
+            timeout,
+            headers={"Authorization": f"Bearer {os.getenv(self.credential_env)}"},
+            json={
+                "model": _model(self.model_env, self.default_model),
+                "messages": [{"role": "system", "content": system}, {"role": "user", "content": prompt}],
+                "temperature": 0.3,
+            },
+        )
+        return data["choices"][0]["message"]["content"]
+
+
+class HuggingFaceProvider(Provider):
+    name = "huggingface"
+    credential_env = "HUGGINGFACE_API_KEY"
+
+    def _call(self, prompt: str, system: str, timeout: float) -> str:
+        model = _model("HUGGINGFACE_MODEL", "mistralai/Mistral-7B-Instruct-v0.2")
+        data = self._post(
+            f"https://api-inference.huggingface.co/models/{model}",
+            timeout,
+            headers={"Authorization": f"Bearer {os.getenv(self.credential_env)}"},
+            json={"inputs": f"{system}\n\n{prompt}", "parameters": {"max_new_tokens": 512, "return_full_text": False}},
+        )
+        if isinstance(data, list) and data:
+            return data[0].get("generated_text", "")
+        return data.get("generated_text", "")
+
+
+class GeminiProvider(Provider):
+    name = "gemini"
+    credential_env = "GOOGLE_API_KEY"
+
+    def _call(self, prompt: str, system: str, timeout: float) -> str:
+        model = _model("GEMINI_MODEL", "gemini-pro")
+        data = self._post(
+            f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent",
+            timeout,
+            params={"key": os.getenv(self.credential_env)},
+            json={"contents": [{"parts": [{"text": f"{system}\n\n{prompt}"}]}]},
+        )
+        parts = data["candidates"][0]["content"]["parts"]
+        return "".join(part.get("text", "") for part in parts)
+
+
+class OllamaProvider(Provider):
+    name = "ollama"
+    credential_env = "OLLAMA_BASE_URL"
+
+    def _call(self, prompt: str, system: str, timeout: float) -> str:
+        data = self._post(
+            f"{os.getenv(self.credential_env).rstrip('/')}/api/generate",
+            timeout,
+            json={"model": _model("OLLAMA_MODEL", "llama3.2"), "system": system, "prompt": prompt, "stream": False},
+        )
+        return data.get("response", "")
+
+
+class StubProvider(Provider):
+    """
+    Provider giả trong process: ngủ LLM_STUB_LATENCY_MS (+ jitter) rồi trả lời bằng các dòng
+    ngữ cảnh đầu tiên của prompt. Đi qua cùng semaphore / retry / deadline như provider thật.
+    """
+
+    name = "stub"
+
+    def _call(self, prompt: str, system: str, timeout: float) -> str:
+        latency = float(os.getenv("LLM_STUB_LATENCY_MS", "200")) / 1000.0
+        latency += random.uniform(0, float(os.getenv("LLM_STUB_JITTER_MS", "0")) / 1000.0)
+        if latency > timeout:
+            time.sleep(timeout)
+            raise _RetryableError("stub timed out")
+        time.sleep(latency)
+        if random.random() < float(os.getenv("LLM_STUB_ERROR_RATE", "0")):
+            raise _RetryableError("stub simulated HTTP 503")
+        context = [line[2:] for line in prompt.splitlines() if line.startswith("- ")][:2]
+        return "[stub] " + (" ".join(context) if context else "Chưa có thông tin.")
+
+
+PROVIDERS: Dict[str, Provider] = {
+    "groq": OpenAICompatibleProvider(
+        "groq", "https://api.groq.com/openai/v1", "GROQ_API_KEY", "GROQ_MODEL", "llama-3.1-70b-versatile"
+    ),
+    "openai": OpenAICompatibleProvider(
+        "openai", "https://api.openai.com/v1", "OPENAI_API_KEY", "OPENAI_MODEL", "gpt-4o-mini"
+    ),
+    "together": OpenAICompatibleProvider(
+        "together", "https://api.together.xyz/v1", "TOGETHER_API_KEY", "TOGETHER_MODEL", "meta-llama/Llama-3-8b-chat-hf"
+    ),
+    "huggingface": HuggingFaceProvider(),
+    "gemini": GeminiProvider(),
+    "ollama": OllamaProvider(),
+    "stub": StubProvider(),
+}
+
+
+def provider_name() -> str:
+    return os.getenv("LLM_PROVIDER", DEFAULT_PROVIDER).strip().lower()
+
+
+def provider_status() -> str:
+    """Mô tả ngắn cho log: provider đang chọn và provider nào đã có cấu hình"""
+    configured: List[str] = [name for name, provider in PROVIDERS.items() if name != "stub" and provider.configured()]
+    return f"{provider_name()} (configured: {', '.join(configured) or 'none'})"
+
+
+def selected_provider_configured() -> bool:
+    """True nếu LLM_PROVIDER hiện tại có thể gọi được (auto: ít nhất một provider đã cấu hình)"""
+    name = provider_name()
+    if name == "auto":
+        return any(PROVIDERS[candidate].configured() for candidate in AUTO_ORDER)
+    return name in PROVIDERS and PROVIDERS[name].configured()
+
+
+def generate(prompt: str, system: str, provider: Optional[str] = None, timeout: Optional[float] = None) -> str:
+    """
+    Gọi provider đã cấu hình. Raise LLMUnavailable nếu không có provider nào được cấu hình
+    (hoặc tên provider không tồn tại), ProviderError nếu provider lỗi sau khi đã retry / quá
+    deadline (auto: ProvidersFailed khi mọi provider đã cấu hình đều lỗi).
+    """
+    name = (provider or provider_name()).lower()
+    if name == "auto":
+        # Các provider thử lần lượt chia nhau cùng một deadline
+        timeout = float(os.getenv("LLM_TIMEOUT", DEFAULT_TIMEOUT)) if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        configured = [candidate for candidate in AUTO_ORDER if PROVIDERS[candidate].configured()]
+        if not configured:
+            raise LLMUnavailable("No LLM provider configured (LLM_PROVIDER=auto)")
+        failures: List[str] = []
+        for candidate in configured:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                failures.append(f"{candidate}: deadline of {timeout:.2f}s exceeded")
+                break
+            try:
+                return PROVIDERS[candidate].complete(prompt, system, remaining)
+            except ProviderError as e:
+                logger.warning(f"[RAG] Provider {candidate} failed: {e}")
+                failures.append(str(e))
+        raise ProvidersFailed(f"All configured LLM providers failed: {'; '.join(failures)}")
+    if name not in PROVIDERS:
+        raise LLMUnavailable(f"Unknown LLM_PROVIDER '{name}'")
+    return PROVIDERS[name].complete(prompt, system, timeout)
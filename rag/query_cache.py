@@ -0,0 +1,162 @@
+"""
+FILE: query_cache.py
+LRU cache có TTL cho vector câu hỏi: câu hỏi lặp lại (sau normalize_location_in_text)
+không phải chạy lại transformer forward pass
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+from actions.metrics import REGISTRY
+
+DEFAULT_QUERY_CACHE_SIZE = 1024
+DEFAULT_QUERY_CACHE_TTL = 3600.0
+
+
+class TTLLRUCache:
+    """OrderedDict theo thứ tự dùng gần nhất; entry quá ttl giây coi như không có"""
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if self._clock() - stored_at <= self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def peek(self, key: Hashable):
+        """Như get nhưng không tính vào hits / misses và không đổi thứ tự LRU"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self._clock() - entry[1] <= self.ttl:
+                return entry[0]
+            return None
+
+    def put(self, key: Hashable, value) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, self._clock())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hit_rate,
+        }
+
+
+def cache_metrics_collector(name: str, cache) -> Callable[[], List[str]]:
+    """
+    Collector cho actions.metrics.REGISTRY: ciesta_<name>_* (requests theo hit/miss, size, ...).
+    cache là bất kỳ object nào có stats() cùng dạng với TTLLRUCache.stats()
+    """
+    prefix = f"ciesta_{name}"
+
+    def collect() -> List[str]:
+        stats = cache.stats()
+        return [
+            f"# HELP {prefix}_requests_total Cache lookups by result",
+            f"# TYPE {prefix}_requests_total counter",
+            f'{prefix}_requests_total{{result="hit"}} {stats["hits"]}',
+            f'{prefix}_requests_total{{result="miss"}} {stats["misses"]}',
+            f"# HELP {prefix}_evictions_total Entries dropped because the cache was full",
+            f"# TYPE {prefix}_evictions_total counter",
+            f"{prefix}_evictions_total {stats['evictions']}",
+            f"# HELP {prefix}_expirations_total Entries dropped because they were older than the TTL",
+            f"# TYPE {prefix}_expirations_total counter",
+            f"{prefix}_expirations_total {stats['expirations']}",
+            f"# HELP {prefix}_entries Current number of entries",
+            f"# TYPE {prefix}_entries gauge",
+            f"{prefix}_entries {stats['size']}",
+            f"# HELP {prefix}_hit_ratio Hits / lookups since start",
+            f"# TYPE {prefix}_hit_ratio gauge",
+            f"{prefix}_hit_ratio {stats['hit_rate']}",
+        ]
+
+    return collect
+
+
+def query_key(query: str, encoder_fingerprint: str) -> tuple:
+    """
+    Key = đúng chuỗi được encode + encoder tạo ra vector. Không fold: PhoBERT phân biệt hoa / thường
+    nên hai câu chỉ khác chữ hoa cho ra vector khác nhau
+    """
+    return encoder_fingerprint, query
+
+
+class QueryEmbeddingCache:
+    """Cache vector câu hỏi dùng chung trong process (mọi RAGRetriever)"""
+
+    def __init__(self, maxsize: Optional[int] = None, ttl: Optional[float] = None):
+        if maxsize is None:
+            maxsize = int(os.getenv("RAG_QUERY_CACHE_SIZE", DEFAULT_QUERY_CACHE_SIZE))
+        if ttl is None:
+            ttl = float(os.getenv("RAG_QUERY_CACHE_TTL", DEFAULT_QUERY_CACHE_TTL))
+        self.cache = TTLLRUCache(maxsize, ttl)
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache.maxsize > 0
+
+    def get_or_encode(self, query: str, encoder, record: bool = True) -> np.ndarray:
+        """
+        Vector (1, dim) của câu hỏi; chỉ gọi encoder.encode khi cache miss.
+        record=False cho lần tra thứ hai của cùng một request (vd synthesize sau search) để không
+        đếm thêm một hit vào hit ratio
+        """
+        if not self.enabled:
+            return encoder.encode([query])
+        key = query_key(query, encoder.fingerprint)
+        vector = self.cache.get(key) if record else self.cache.peek(key)
+        if vector is None:
+            vector = encoder.encode([query])
+            # Vector dùng chung giữa các request nên khóa ghi
+            vector.setflags(write=False)
+            self.cache.put(key, vector)
+        return vector
+
+
+QUERY_CACHE = QueryEmbeddingCache()
+REGISTRY.register_collector(cache_metrics_collector("rag_query_embedding_cache", QUERY_CACHE.cache))
@@ -0,0 +1,513 @@
+"""
+FILE: retriever.py
+RAG retriever: chunk knowledge base -> PhoBERT embedding -> FAISS (inner product trên vector
+đã chuẩn hóa = cosine). Index + manifest được lưu ra đĩa; khi KB thay đổi chỉ embed lại
+các chunk có nội dung mới, chỉ embed lại toàn bộ khi model / cấu hình encoder đổi.
+
+Thư mục index (env RAG_INDEX_DIR, mặc định data/rag_index):
+    index.faiss     IndexIDMap2 (id FAISS ổn định giữa các lần build)
+    manifest.json   fingerprint encoder + danh sách chunk (metadata, hash nội dung, id FAISS)
+    bm25.npz        inverted index BM25 (CSR) cho hybrid search, xem rag/bm25.py
+    vectors.npy     vector float32 gốc theo id tăng dần, chỉ có khi index nén (RAG_INDEX_TYPE
+                    sq8 / ivfpq, xem rag/vector_index.py), dùng để chấm lại ứng viên
+
+Chunk được chia phân vùng theo (tỉnh, trường KB); search có province / field thì chỉ chấm
+điểm các chunk trong phân vùng đó (IDSelector của FAISS), không có bộ lọc mới tìm toàn cục.
+"""
+
+import os
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import faiss
+import numpy as np
+
+from actions.text_normalize import fold
+from rag import fusion, providers, vector_index
+from rag.answer_cache import chunk_key, get_answer_cache
+from rag.batching import BatchingEncoder
+from rag.bm25 import BM25Index, top_rows
+from rag.chunking import DEFAULT_CHUNK_CHARS, chunk_knowledge_base, load_province_records
+from rag.context_packing import heuristic_token_count, pack_context
+from rag.embedder import TextEncoder, load_encoder
+from rag.extractive import extractive_answer
+from rag.query_cache import QUERY_CACHE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = os.path.join("data", "rag_index")
+INDEX_FILE = "index.faiss"
+MANIFEST_FILE = "manifest.json"
+BM25_FILE = "bm25.npz"
+VECTORS_FILE = "vectors.npy"
+# File của định dạng cũ (một fingerprint cho cả corpus), xóa khi ghi manifest
+LEGACY_FILES = ("chunks.json", "meta.json")
+INDEX_FORMAT_VERSION = 2
+
+# Micro-batching vector câu hỏi: các search đồng thời chờ tối đa bấy nhiêu ms để chung một forward pass
+DEFAULT_QUERY_BATCH_SIZE = 16
+DEFAULT_QUERY_BATCH_WAIT_MS = 2.0
+
+# Số ứng viên mỗi nhánh (dense / BM25) lấy ra trước khi fusion: max(top_k * factor, min)
+CANDIDATE_FACTOR = 4
+MIN_CANDIDATES = 20
+
+SYSTEM_PROMPT = (
+    "Bạn là trợ lý du lịch và văn hóa Việt Nam. Chỉ trả lời dựa trên thông tin được cung cấp, "
+    "bằng tiếng Việt, ngắn gọn và thân thiện. Nếu thông tin không đủ, hãy nói rõ là chưa có dữ liệu."
+)
+
+# debug_rag.py dựa vào câu này để biết LLM không được dùng
+FALLBACK_PREFIX = "Tôi chưa có câu trả lời trực tiếp"
+
+SYNTHESIS_MODES = ("auto", "llm", "extractive")
+DEFAULT_SYNTHESIS_MODE = "auto"
+# Số giây không gọi LLM sau khi provider lỗi / chậm quá budget
+DEFAULT_LLM_COOLDOWN = 30.0
+
+SearchResult = Tuple[float, Dict]
+
+
+def dense_score(result: SearchResult) -> float:
+    """
+    Cosine của chunk với câu hỏi. Điểm hybrid bị kéo xuống bởi BM25 nên ngưỡng
+    RAG_CONFIDENCE_THRESHOLD (chỉnh cho cosine) so với điểm này, không so với điểm fused
+    """
+    return result[1].get("dense_score", result[0])
+
+
+def synthesis_mode() -> str:
+    mode = os.getenv("RAG_SYNTHESIS_MODE", DEFAULT_SYNTHESIS_MODE).strip().lower()
+    if mode not in SYNTHESIS_MODES:
+        logger.warning(f"[RAG] Unknown RAG_SYNTHESIS_MODE '{mode}', using '{DEFAULT_SYNTHESIS_MODE}'")
+        return DEFAULT_SYNTHESIS_MODE
+    return mode
+
+
+def chunk_hash(chunk: Dict) -> str:
+    """Hash nội dung được embed (text đã gồm tên tỉnh + trường), không phụ thuộc vị trí chunk"""
+    return hashlib.sha256(chunk["text"].encode("utf-8")).hexdigest()
+
+
+class RAGRetriever:
+    """search(query, top_k) -> [(score, chunk)], synthesize(query, results) -> câu trả lời"""
+
+    def __init__(
+        self,
+        kb_dir: str,
+        index_dir: Optional[str] = None,
+        model_name: Optional[str] = None,
+        chunk_chars: int = DEFAULT_CHUNK_CHARS,
+        encoder: Optional[TextEncoder] = None,
+    ):
+        self.kb_dir = kb_dir
+        self.index_dir = index_dir or os.getenv("RAG_INDEX_DIR", DEFAULT_INDEX_DIR)
+        self.chunk_chars = chunk_chars
+        self.encoder = encoder or load_encoder(model_name)
+        self.query_encoder = self._make_query_encoder()
+        self.index_config = vector_index.index_config()
+        self.index = None
+        # Vector gốc (mmap) theo thứ tự _vector_ids khi index nén; None với index flat
+        self._vectors: Optional[np.ndarray] = None
+        self._vector_ids = np.empty(0, dtype=np.int64)
+        # id FAISS -> chunk (metadata + "hash")
+        self.chunks: Dict[int, Dict] = {}
+        self._next_id = 0
+        self.bm25: Optional[BM25Index] = None
+        self._bm25_rows: Dict[int, int] = {}
+        # tỉnh (đã fold) -> trường -> id FAISS đã sắp xếp
+        self._partitions: Dict[str, Dict[str, np.ndarray]] = {}
+        self._llm_cooldown_until = 0.0
+        self.sync_index()
+
+    def _make_query_encoder(self):
+        """RAG_QUERY_BATCH_SIZE <= 1 thì mỗi search tự encode như trước (không qua hàng đợi)"""
+        max_batch_size = int(os.getenv("RAG_QUERY_BATCH_SIZE", DEFAULT_QUERY_BATCH_SIZE))
+        if max_batch_size <= 1:
+            return self.encoder
+        max_wait_ms = float(os.getenv("RAG_QUERY_BATCH_WAIT_MS", DEFAULT_QUERY_BATCH_WAIT_MS))
+        return BatchingEncoder(self.encoder, max_batch_size, max_wait_ms)
+
+    def _count_tokens(self, text: str) -> int:
+        """Đếm token bằng tokenizer của encoder (LLM chạy từ xa nên không có tokenizer của nó)"""
+        try:
+            return self.encoder.count_tokens(text)
+        except Exception:
+            return heuristic_token_count(text)
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.index_dir, filename)
+
+    def _model_fingerprint(self) -> Dict:
+        return {
+            "format": INDEX_FORMAT_VERSION,
+            "encoder": self.encoder.fingerprint,
+            "dim": self.encoder.dim,
+            "index": self.index_config,
+        }
+
+    def _new_index(self, train_vectors: Optional[np.ndarray] = None):
+        return vector_index.new_index(self.encoder.dim, self.index_config, train_vectors)
+
+    def _load_vectors(self, expected_rows: int) -> bool:
+        """mmap vectors.npy của index nén; False nếu thiếu file hoặc số hàng / số chiều lệch"""
+        path = self._path(VECTORS_FILE)
+        if not os.path.exists(path):
+            return False
+        vectors = np.load(path, mmap_mode="r")
+        if vectors.shape != (expected_rows, self.encoder.dim):
+            return False
+        self._vectors = vectors
+        return True
+
+    def _load(self, fingerprint: Dict) -> bool:
+        """Đọc index + manifest đã lưu; False nếu thiếu file, model khác hoặc hai file lệch nhau"""
+        if not all(os.path.exists(self._path(name)) for name in (INDEX_FILE, MANIFEST_FILE)):
+            return False
+        start = time.perf_counter()
+        try:
+            with open(self._path(MANIFEST_FILE), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("fingerprint") != fingerprint:
+                logger.info("[RAG] Embedding model/config changed, re-embedding the whole KB")
+                return False
+            index = faiss.read_index(self._path(INDEX_FILE))
+        except Exception as e:
+            logger.warning(f"[RAG] Could not load index from {self.index_dir}: {e}")
+            return False
+        entries = manifest.get("chunks", [])
+        in_sync = (
+            index.d == self.encoder.dim
+            and vector_index.stored_ids(index) == {entry["faiss_id"] for entry in entries}
+            and (vector_index.is_exact(self.index_config) or self._load_vectors(len(entries)))
+        )
+        if not in_sync:
+            logger.warning("[RAG] Index and manifest are out of sync, re-embedding the whole KB")
+            return False
+        self.index = index
+        self.chunks = {entry["faiss_id"]: entry["chunk"] for entry in entries}
+        self._vector_ids = np.array(sorted(self.chunks), dtype=np.int64)
+        self._next_id = manifest.get("next_id", max(self.chunks, default=-1) + 1)
+        logger.info(
+            f"[RAG] Loaded {index.ntotal} vectors from {self.index_dir} "
+            f"in {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+        return True
+
+    def sync_index(self) -> Dict[str, int]:
+        """
+        Đồng bộ index với KB hiện tại: chunk có hash đã có thì giữ vector cũ (chỉ cập nhật
+        metadata), vector của nội dung không còn thì xóa, nội dung mới thì embed và thêm vào.
+        Trả về số chunk kept / added / removed.
+        """
+        chunks = chunk_knowledge_base(load_province_records(self.kb_dir), self.chunk_chars)
+        fingerprint = self._model_fingerprint()
+        if self.index is None and not self._load(fingerprint):
+            # Index tạo sau khi embed xong vì ivfpq cần train trên chính các vector đó
+            self.index, self.chunks, self._next_id = None, {}, 0
+            self._vectors, self._vector_ids = None, np.empty(0, dtype=np.int64)
+
+        # hash -> các id FAISS hiện có (nhiều chunk có thể trùng nội dung)
+        available: Dict[str, List[int]] = {}
+        for faiss_id, chunk in self.chunks.items():
+            available.setdefault(chunk["hash"], []).append(faiss_id)
+
+        kept: Dict[int, Dict] = {}
+        pending: List[Dict] = []
+        for chunk in chunks:
+            chunk = dict(chunk, hash=chunk_hash(chunk))
+            ids = available.get(chunk["hash"])
+            if ids:
+                kept[ids.pop()] = chunk
+            else:
+                pending.append(chunk)
+        stale = [faiss_id for ids in available.values() for faiss_id in ids]
+
+        if stale:
+            self.index.remove_ids(np.array(stale, dtype=np.int64))
+        if pending:
+            start = time.perf_counter()
+            vectors = self.encoder.encode([chunk["text"] for chunk in pending])
+            new_ids = np.arange(self._next_id, self._next_id + len(pending), dtype=np.int64)
+            if self.index is None:
+                self.index = self._new_index(vectors)
+            self.index.add_with_ids(vectors, new_ids)
+            self._next_id += len(pending)
+            kept.update(zip(new_ids.tolist(), pending))
+            logger.info(f"[RAG] Embedded {len(pending)} chunks in {time.perf_counter() - start:.1f} s")
+        else:
+            vectors, new_ids = np.empty((0, self.encoder.dim), dtype=np.float32), np.empty(0, dtype=np.int64)
+        if self.index is None:
+            self.index = self._new_index()
+        if not vector_index.is_exact(self.index_config) and (pending or stale or self._vectors is None):
+            self._update_vectors(sorted(kept), new_ids, vectors)
+
+        previous, self.chunks = self.chunks, kept
+        stats = {"kept": len(kept) - len(pending), "added": len(pending), "removed": len(stale)}
+        logger.info(f"[RAG] Index sync: {stats}")
+        if pending or stale or not os.path.exists(self._path(MANIFEST_FILE)):
+            self._save(fingerprint)
+        elif previous != kept:
+            # Nội dung giữ nguyên nhưng metadata (id/order) đổi: chỉ cần ghi lại manifest
+            self._save(fingerprint, manifest_only=True)
+        self._sync_bm25()
+        self._build_partitions()
+        return stats
+
+    def _update_vectors(self, doc_ids: List[int], new_ids: np.ndarray, new_vectors: np.ndarray) -> None:
+        """Ma trận vector gốc mới theo doc_ids: lấy lại hàng cũ cho chunk được giữ, thêm hàng vừa embed"""
+        new_rows = {doc_id: row for row, doc_id in enumerate(new_ids.tolist())}
+        vectors = np.empty((len(doc_ids), self.encoder.dim), dtype=np.float32)
+        for row, doc_id in enumerate(doc_ids):
+            if doc_id in new_rows:
+                vectors[row] = new_vectors[new_rows[doc_id]]
+            else:
+                vectors[row] = self._vectors[np.searchsorted(self._vector_ids, doc_id)]
+        self._vectors = vectors
+        self._vector_ids = np.array(doc_ids, dtype=np.int64)
+
+    def _build_partitions(self) -> None:
+        partitions: Dict[str, Dict[str, List[int]]] = {}
+        for faiss_id, chunk in self.chunks.items():
+            fields = partitions.setdefault(fold(chunk.get("province", "")), {})
+            fields.setdefault(chunk.get("field", ""), []).append(faiss_id)
+        self._partitions = {
+            province: {field: np.array(sorted(ids), dtype=np.int64) for field, ids in fields.items()}
+            for province, fields in partitions.items()
+        }
+
+    def _collect_ids(self, province: Optional[str], fields: Sequence[str]) -> np.ndarray:
+        if province is not None:
+            groups = [self._partitions.get(province, {})]
+        else:
+            groups = list(self._partitions.values())
+        arrays = [ids for group in groups for field, ids in group.items() if not fields or field in fields]
+        if not arrays:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(arrays))
+
+    def partition_ids(
+        self, province: Optional[str] = None, field: Union[str, Sequence[str], None] = None
+    ) -> Optional[np.ndarray]:
+        """
+        id FAISS trong phân vùng (tỉnh, trường); None nghĩa là tìm toàn cục. Phân vùng rỗng thì
+        nới dần bộ lọc: bỏ trường, rồi bỏ tỉnh (tỉnh chưa có trong KB), rồi toàn cục.
+        """
+        fields = (field,) if isinstance(field, str) else tuple(field or ())
+        province_key = fold(province) if province else None
+        attempts = [(province_key, fields), (province_key, ()), (None, fields)]
+        for province_filter, field_filter in attempts:
+            if province_filter is None and not field_filter:
+                continue
+            ids = self._collect_ids(province_filter, field_filter)
+            if len(ids):
+                return ids
+        if province_key or fields:
+            logger.info(f"[RAG] No chunks for province={province!r} field={field!r}, searching globally")
+        return None
+
+    def _sync_bm25(self) -> None:
+        """BM25 build lại toàn bộ (idf phụ thuộc cả corpus, build chỉ mất vài chục ms) khi chunk đổi"""
+        doc_ids = sorted(self.chunks)
+        corpus_key = hashlib.sha256(
+            "\n".join(f"{doc_id}:{self.chunks[doc_id]['hash']}" for doc_id in doc_ids).encode("utf-8")
+        ).hexdigest()
+        path = self._path(BM25_FILE)
+        bm25 = self.bm25
+        if (bm25 is None or bm25.corpus_key != corpus_key) and os.path.exists(path):
+            try:
+                bm25 = BM25Index.load(path)
+            except Exception as e:
+                logger.warning(f"[RAG] Could not load BM25 index {path}: {e}")
+        if bm25 is None or bm25.corpus_key != corpus_key:
+            bm25 = BM25Index.build([self.chunks[doc_id]["text"] for doc_id in doc_ids], doc_ids, corpus_key)
+            try:
+                os.makedirs(self.index_dir, exist_ok=True)
+                bm25.save(path)
+            except OSError as e:
+                logger.warning(f"[RAG] Could not persist BM25 index to {path}: {e}")
+        self.bm25 = bm25
+        self._bm25_rows = {int(doc_id): row for row, doc_id in enumerate(bm25.doc_ids)}
+
+    def _write_json(self, filename: str, payload) -> None:
+        tmp_path = self._path(filename) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(filename))
+
+    def _save_manifest(self, fingerprint: Dict) -> None:
+        self._write_json(MANIFEST_FILE, {
+            "fingerprint": fingerprint,
+            "built_at": int(time.time()),
+            "next_id": self._next_id,
+            "chunks": [{"faiss_id": faiss_id, "chunk": chunk} for faiss_id, chunk in self.chunks.items()],
+        })
+
+    def _save(self, fingerprint: Dict, manifest_only: bool = False) -> None:
+        """Ghi file tạm rồi os.replace: index và vectors trước, manifest sau; lệch nhau thì _load sẽ build lại"""
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            if not manifest_only:
+                faiss.write_index(self.index, self._path(INDEX_FILE) + ".tmp")
+                os.replace(self._path(INDEX_FILE) + ".tmp", self._path(INDEX_FILE))
+                if self._vectors is not None:
+                    with open(self._path(VECTORS_FILE) + ".tmp", "wb") as f:
+                        np.save(f, np.ascontiguousarray(self._vectors))
+                    os.replace(self._path(VECTORS_FILE) + ".tmp", self._path(VECTORS_FILE))
+                    # Đọc lại bằng mmap để bản trong RAM được giải phóng
+                    self._load_vectors(len(self._vector_ids))
+            self._save_manifest(fingerprint)
+            for filename in LEGACY_FILES:
+                if os.path.exists(self._path(filename)):
+                    os.remove(self._path(filename))
+        except OSError as e:
+            # Không lưu được thì vẫn dùng index trong bộ nhớ, lần sau sẽ embed lại
+            logger.warning(f"[RAG] Could not persist index to {self.index_dir}: {e}")
+
+    def _dense_hits(self, vector: np.ndarray, k: int, ids: Optional[np.ndarray] = None) -> Dict[int, float]:
+        """
+        Top-k theo cosine, giảm dần. ids giới hạn trong một phân vùng (chỉ tính điểm cho các id đó).
+        Index nén: lấy k * RAG_RERANK_FACTOR ứng viên rồi chấm lại bằng vector gốc.
+        """
+        exact = self._vectors is None
+        n_candidates = k if exact else k * vector_index.rerank_factor()
+        n_candidates = min(n_candidates, self.index.ntotal if ids is None else len(ids))
+        params = vector_index.search_parameters(self.index, ids)
+        scores, found = self.index.search(vector, n_candidates, params=params)
+        hits = {int(idx): float(score) for score, idx in zip(scores[0], found[0]) if idx >= 0}
+        if exact:
+            return hits
+        rescored = self._dense_scores(vector, list(hits))
+        return {doc_id: rescored[doc_id] for doc_id in sorted(rescored, key=rescored.get, reverse=True)[:k]}
+
+    def _dense_scores(self, vector: np.ndarray, doc_ids: List[int]) -> Dict[int, float]:
+        """Cosine chính xác của các doc cho trước: từ vectors.npy nếu index nén, không thì từ index"""
+        if self._vectors is None:
+            return {doc_id: float(self.index.reconstruct(doc_id) @ vector[0]) for doc_id in doc_ids}
+        if not doc_ids:
+            return {}
+        rows = np.searchsorted(self._vector_ids, np.asarray(doc_ids, dtype=np.int64))
+        scores = np.asarray(self._vectors[rows]) @ vector[0]
+        return dict(zip(doc_ids, scores.astype(float).tolist()))
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        province: Optional[str] = None,
+        field: Union[str, Sequence[str], None] = None,
+    ) -> List[SearchResult]:
+        """
+        Top-k chunk, score giảm dần. Mặc định là hybrid: ứng viên từ FAISS và BM25 được
+        chấm cả hai điểm rồi kết hợp theo RAG_FUSION (xem rag/fusion.py).
+        province / field (một trường hoặc danh sách trường) giới hạn tìm kiếm trong phân vùng tương ứng.
+        """
+        if not query or self.index is None or self.index.ntotal == 0:
+            return []
+        vector = QUERY_CACHE.get_or_encode(query, self.query_encoder)
+        ids = self.partition_ids(province, field) if province or field else None
+        mode = fusion.fusion_mode()
+        if mode == "dense" or self.bm25 is None:
+            hits = self._dense_hits(vector, top_k, ids)
+            return [(score, self.chunks[doc_id]) for doc_id, score in hits.items()]
+
+        n_candidates = max(top_k * CANDIDATE_FACTOR, MIN_CANDIDATES)
+        dense = self._dense_hits(vector, n_candidates, ids)
+        bm25_scores = self.bm25.scores(query)
+        if ids is not None:
+            rows = [self._bm25_rows[doc_id] for doc_id in ids.tolist() if doc_id in self._bm25_rows]
+            in_partition = np.zeros_like(bm25_scores)
+            in_partition[rows] = bm25_scores[rows]
+            bm25_scores = in_partition
+        sparse = {int(self.bm25.doc_ids[row]): score for row, score in top_rows(bm25_scores, n_candidates)}
+
+        # Bổ sung điểm còn thiếu để mọi ứng viên có đủ cả hai điểm
+        dense.update(self._dense_scores(vector, [doc_id for doc_id in sparse if doc_id not in dense]))
+        for doc_id in dense:
+            if doc_id not in sparse and doc_id in self._bm25_rows:
+                sparse[doc_id] = float(bm25_scores[self._bm25_rows[doc_id]])
+
+        if mode == "rrf":
+            fused = fusion.rrf_fusion(dense, sparse)
+        else:
+            fused = fusion.weighted_fusion(dense, sparse)
+        ranked = sorted(fused, key=fused.get, reverse=True)[:top_k]
+        # Bản sao chunk mang theo cosine để caller xét ngưỡng tin cậy (xem dense_score)
+        return [(fused[doc_id], {**self.chunks[doc_id], "dense_score": dense[doc_id]}) for doc_id in ranked]
+
+    @staticmethod
+    def build_prompt(query: str, results: List[SearchResult]) -> str:
+        if results:
+            context = "\n".join(f"- {chunk['text']}" for _, chunk in results)
+        else:
+            context = "(Không có thông tin liên quan)"
+        return f"Thông tin tham khảo:\n{context}\n\nCâu hỏi: {query}\nTrả lời:"
+
+    def _extractive(self, query: str, results: List[SearchResult], degraded: bool) -> str:
+        """
+        Câu trả lời trích xuất (rag/extractive.py). degraded=True khi đây là đường lui vì LLM
+        không dùng được: câu mở đầu FALLBACK_PREFIX báo cho người dùng (và debug_rag.py) biết.
+        """
+        token_weight = self.bm25.token_weight if self.bm25 is not None else None
+        # Chỉ bỏ trùng + gộp chunk, không giới hạn token (không gửi đi đâu)
+        answer = extractive_answer(query, pack_context(results, token_budget=0), token_weight)
+        if not degraded:
+            return answer or "Xin lỗi, tôi chưa có dữ liệu phù hợp để trả lời."
+        if not answer:
+            return f"{FALLBACK_PREFIX} cho câu hỏi này."
+        return f"{FALLBACK_PREFIX}, nhưng đây là thông tin liên quan:\n\n{answer}"
+
+    def synthesize(self, query: str, results: List[SearchResult], province: Optional[str] = None) -> str:
+        """
+        Tổng hợp câu trả lời theo RAG_SYNTHESIS_MODE:
+            auto        LLM nếu provider đã cấu hình, ngược lại trích xuất (mặc định)
+            llm         luôn thử LLM, lỗi thì lui về trích xuất
+            extractive  chỉ trích xuất, không gọi mạng
+        LLM lỗi / quá RAG_LLM_BUDGET_MS thì trả câu trả lời trích xuất và tạm ngừng gọi LLM trong
+        RAG_LLM_COOLDOWN giây. Câu trả lời LLM được lưu vào semantic cache theo (tỉnh, tập chunk top-k)
+        để các câu hỏi diễn đạt khác nhưng cùng ý dùng lại, không gọi provider lần nữa.
+        """
+        mode = synthesis_mode()
+        if mode == "extractive" or (mode == "auto" and not providers.selected_provider_configured()):
+            return self._extractive(query, results, degraded=False)
+        if time.monotonic() < self._llm_cooldown_until:
+            logger.info("[RAG] LLM cooling down after a failure, answering extractively")
+            return self._extractive(query, results, degraded=True)
+
+        answer_cache = get_answer_cache()
+        bucket = (self.encoder.fingerprint, province or "", chunk_key(chunk["id"] for _, chunk in results))
+        vector = None
+        if answer_cache.enabled and results:
+            # search() vừa encode cùng câu hỏi: tra lại không tính vào thống kê cache
+            vector = QUERY_CACHE.get_or_encode(query, self.query_encoder, record=False)
+            cached = answer_cache.get(vector, bucket)
+            if cached is not None:
+                logger.info("[RAG] Answer cache hit")
+                return cached
+        # Bỏ chunk trùng, gộp chunk liền kề, giới hạn token trước khi dựng prompt
+        context = pack_context(results, count_tokens=self._count_tokens)
+        logger.debug(f"[RAG] Context packed: {len(results)} results -> {len(context)} chunks")
+        budget_ms = os.getenv("RAG_LLM_BUDGET_MS")
+        try:
+            answer = providers.generate(
+                self.build_prompt(query, context),
+                SYSTEM_PROMPT,
+                timeout=float(budget_ms) / 1000.0 if budget_ms else None,
+            )
+            if answer and answer.strip():
+                if vector is not None:
+                    answer_cache.put(query, vector, bucket, answer.strip())
+                return answer.strip()
+            logger.warning("[RAG] LLM returned an empty answer")
+        except providers.LLMUnavailable as e:
+            # Chưa cấu hình / sai tên provider: không có gì để chờ hồi phục nên không cooldown.
+            # Provider đã cấu hình mà lỗi (kể cả ProvidersFailed của auto) rơi vào nhánh dưới.
+            logger.warning(f"[RAG] LLM unavailable: {e}")
+        except Exception as e:
+            logger.warning(f"[RAG] LLM call failed, answering extractively: {e}")
+            self._llm_cooldown_until = time.monotonic() + float(os.getenv("RAG_LLM_COOLDOWN", DEFAULT_LLM_COOLDOWN))
+        # Câu trả lời trích xuất không được cache để provider hoạt động lại là dùng ngay
+        return self._extractive(query, results, degraded=True)
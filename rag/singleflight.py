@@ -0,0 +1,51 @@
+"""
+FILE: singleflight.py
+Gộp các request giống nhau đang chạy đồng thời: request đầu tiên (leader) làm việc thật,
+các request cùng key đến trong lúc đó (follower) chỉ chờ kết quả của leader
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from actions.metrics import REGISTRY, Counter
+
+T = TypeVar("T")
+
+SINGLE_FLIGHT_CALLS = REGISTRY.register(Counter(
+    "ciesta_rag_singleflight_calls_total",
+    "RAG requests by single-flight role (leader did the work, follower reused its result)",
+    ("role",),
+))
+
+
+class AsyncSingleFlight:
+    """
+    Dùng trong một event loop (action server chạy một worker). Việc của leader chạy trong task
+    riêng, leader và follower cùng chờ task qua asyncio.shield: request nào bị hủy (client ngắt,
+    timeout) cũng chỉ bỏ chờ, không hủy kết quả của những request còn lại.
+    Key bị xóa ngay khi task xong, nên kết quả không được cache: request đến sau đó sẽ chạy lại từ đầu.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def _done(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mọi request đã bỏ chờ thì tránh cảnh báo "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is not None:
+            SINGLE_FLIGHT_CALLS.inc("follower")
+        else:
+            SINGLE_FLIGHT_CALLS.inc("leader")
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        return await asyncio.shield(task)
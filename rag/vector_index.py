@@ -0,0 +1,132 @@
+"""
+FILE: vector_index.py
+Chọn loại FAISS index cho RAG (env RAG_INDEX_TYPE):
+    flat    IndexFlatIP, chính xác, 4 byte mỗi chiều (PhoBERT-large mean_max: 8 KB / vector)
+    sq8     scalar quantizer 8 bit, 1 byte mỗi chiều
+    ivfpq   IVF + product quantizer, RAG_PQ_M byte mỗi vector, chỉ quét RAG_IVF_NPROBE cụm
+Với sq8 / ivfpq, retriever lấy nhiều ứng viên hơn từ index nén rồi chấm lại bằng vector
+float32 gốc (vectors.npy, đọc bằng mmap nên không chiếm RAM của từng replica).
+"""
+
+import logging
+import math
+import os
+from typing import Dict, Optional, Set
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "sq8", "ivfpq")
+DEFAULT_INDEX_TYPE = "flat"
+DEFAULT_PQ_M = 64
+DEFAULT_PQ_NBITS = 8
+DEFAULT_IVF_NPROBE = 8
+# Mỗi cụm IVF cần khoảng 39 điểm train để k-means ổn định (ngưỡng cảnh báo của FAISS)
+MIN_POINTS_PER_LIST = 39
+# Số ứng viên lấy từ index nén = k * factor, sau đó chấm lại bằng vector gốc
+DEFAULT_RERANK_FACTOR = 4
+
+
+def index_type() -> str:
+    value = os.getenv("RAG_INDEX_TYPE", DEFAULT_INDEX_TYPE).strip().lower()
+    if value not in INDEX_TYPES:
+        logger.warning(f"[RAG] Unknown RAG_INDEX_TYPE={value!r}, using {DEFAULT_INDEX_TYPE}")
+        return DEFAULT_INDEX_TYPE
+    return value
+
+
+def index_config() -> Dict:
+    """Cấu hình index hiện tại; nằm trong fingerprint của manifest nên đổi cấu hình thì build lại"""
+    kind = index_type()
+    config: Dict = {"type": kind}
+    if kind == "ivfpq":
+        config["nlist"] = int(os.getenv("RAG_IVF_NLIST", 0))  # 0 = tự chọn theo số vector
+        config["m"] = int(os.getenv("RAG_PQ_M", DEFAULT_PQ_M))
+        config["nbits"] = int(os.getenv("RAG_PQ_NBITS", DEFAULT_PQ_NBITS))
+    return config
+
+
+def is_exact(config: Dict) -> bool:
+    return config.get("type", DEFAULT_INDEX_TYPE) == "flat"
+
+
+def rerank_factor() -> int:
+    return max(1, int(os.getenv("RAG_RERANK_FACTOR", DEFAULT_RERANK_FACTOR)))
+
+
+def nprobe() -> int:
+    return max(1, int(os.getenv("RAG_IVF_NPROBE", DEFAULT_IVF_NPROBE)))
+
+
+def _auto_nlist(n: int) -> int:
+    # 4 * sqrt(n) là điểm xuất phát quen thuộc, giới hạn bởi số điểm train của mỗi cụm
+    return max(1, min(int(4 * math.sqrt(n)), n // MIN_POINTS_PER_LIST))
+
+
+def new_index(dim: int, config: Dict, train_vectors: Optional[np.ndarray] = None):
+    """
+    Index rỗng đã train, hỗ trợ add_with_ids / remove_ids. Vector thêm sau này dùng lại
+    codebook / khoảng lượng tử đã train (cấu hình đổi thì build lại từ đầu).
+    ivfpq cần ít nhất 2**nbits vector để train codebook; không đủ thì dùng sq8 và ghi log.
+    """
+    kind = config.get("type", DEFAULT_INDEX_TYPE)
+    if kind == "ivfpq":
+        n = 0 if train_vectors is None else len(train_vectors)
+        m, nbits = config["m"], config["nbits"]
+        if dim % m != 0:
+            logger.warning(f"[RAG] RAG_PQ_M={m} does not divide dim {dim}, using sq8")
+            kind = "sq8"
+        elif n < 2 ** nbits:
+            logger.warning(f"[RAG] {n} vectors are too few to train PQ with {nbits} bits, using sq8")
+            kind = "sq8"
+        else:
+            nlist = config.get("nlist") or _auto_nlist(n)
+            quantizer = faiss.IndexFlatIP(dim)
+            # IVF tự giữ id nên không bọc IndexIDMap2 (IDMap giả định index con dồn hàng khi xóa)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, nbits, faiss.METRIC_INNER_PRODUCT)
+            index.train(train_vectors)
+            index.nprobe = nprobe()
+            return index
+    if kind == "sq8":
+        index = faiss.IndexIDMap2(
+            faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        )
+        # Khoảng lượng tử học từ dữ liệu; chưa có dữ liệu thì dùng [-1, 1] (vector đã chuẩn hóa L2)
+        if train_vectors is None or not len(train_vectors):
+            train_vectors = np.stack([np.full(dim, -1.0), np.full(dim, 1.0)]).astype(np.float32)
+        index.train(train_vectors)
+        return index
+    return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+
+def stored_ids(index) -> Optional[Set[int]]:
+    """Tập id đang có trong index; None nếu không đọc được"""
+    if hasattr(index, "id_map"):
+        return set(faiss.vector_to_array(index.id_map).tolist())
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        return None
+    ids: Set[int] = set()
+    for list_no in range(ivf.nlist):
+        size = ivf.invlists.list_size(list_no)
+        if size:
+            ids.update(faiss.rev_swig_ptr(ivf.invlists.get_ids(list_no), size).tolist())
+    return ids
+
+
+def search_parameters(index, ids: Optional[np.ndarray] = None):
+    """SearchParameters cho index.search: nprobe với IVF, IDSelectorBatch khi chỉ tìm trong ids"""
+    kwargs = {}
+    if ids is not None:
+        # Truyền qua constructor để wrapper Python giữ tham chiếu tới selector
+        kwargs["sel"] = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+    if faiss.try_extract_index_ivf(index) is not None:
+        return faiss.SearchParametersIVF(nprobe=nprobe(), **kwargs)
+    return faiss.SearchParameters(**kwargs) if kwargs else None
+
+
+def memory_bytes(index) -> int:
+    """Kích thước index khi serialize (xấp xỉ RAM index chiếm sau khi load)"""
+    return int(faiss.serialize_index(index).nbytes)
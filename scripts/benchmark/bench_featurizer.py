@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Benchmark PhoBERTFeaturizer theo inference profile: full (output_hidden_states + output_attentions,
+torch.no_grad như trước), lean (chỉ last hidden state, torch.inference_mode), lean_bf16 (thêm bf16
+autocast trên CPU). Mỗi profile chạy trong một process riêng để số đo bộ nhớ không lẫn nhau.
+
+Báo cáo mỗi batch: latency p50/p95, bộ nhớ đỉnh tăng thêm khi forward (RSS trên CPU, allocator
+trên GPU), dung lượng output model trả về, và cosine của feature so với profile full.
+Chạy: python scripts/benchmark/bench_featurizer.py [--batch-size 16] [--batches 20] [--out bench.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Cho phép import custom_components khi chạy script từ thư mục gốc project
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from nlu_examples import DEFAULT_NLU_PATH, load_examples
+
+PROFILES = {
+    "full": {"lean_inference": False},
+    "lean": {"lean_inference": True},
+    "lean_bf16": {"lean_inference": True, "cpu_bf16": True},
+}
+
+
+def _status_kb(field: str) -> int:
+    """VmRSS / VmHWM (KB) trong /proc/self/status; 0 nếu không phải Linux"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _reset_peak_rss() -> None:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _output_bytes(outputs) -> int:
+    """Tổng dung lượng các tensor model trả về (kể cả tuple hidden states / attentions)"""
+    import torch
+
+    total = 0
+    stack = list(outputs.values()) if hasattr(outputs, "values") else list(outputs)
+    while stack:
+        item = stack.pop()
+        if isinstance(item, torch.Tensor):
+            total += item.element_size() * item.nelement()
+        elif isinstance(item, (tuple, list)):
+            stack.extend(item)
+    return total
+
+
+def run_profile(profile: str, args) -> dict:
+    """Chạy trong process con: load featurizer với profile, đo từng batch"""
+    import torch
+
+    from custom_components.phobert_featurizer import PhoBERTFeaturizer
+
+    config = {
+        "model_name": args.model,
+        "max_length": args.max_length,
+        "pooling_strategy": args.pooling,
+        "batch_size": args.batch_size,
+        "num_threads": args.num_threads,
+        "num_interop_threads": args.num_interop_threads,
+        **PROFILES[profile],
+    }
+    featurizer = PhoBERTFeaturizer(config, "PhoBERTFeaturizer", None, None, None)
+    texts = [example.text for example in load_examples(args.nlu)]
+    batches = [texts[i * args.batch_size:(i + 1) * args.batch_size] for i in range(args.batches)]
+
+    # Warm-up: khởi tạo thread pool / kernel của torch
+    featurizer._get_batch_embeddings(batches[0])
+
+    # Đo output model trả về trên một batch (cùng context với featurizer)
+    inputs = featurizer.tokenizer(
+        batches[0], return_tensors="pt", padding=True, truncation=True, max_length=args.max_length
+    ).to(featurizer.device)
+    with featurizer._inference_context():
+        output_bytes = _output_bytes(featurizer.model(**inputs))
+    del inputs
+
+    cuda = featurizer.device == "cuda"
+    rss_before = _status_kb("VmRSS")
+    _reset_peak_rss()
+    if cuda:
+        torch.cuda.reset_peak_memory_stats()
+        allocated_before = torch.cuda.memory_allocated()
+
+    latencies, embeddings = [], []
+    for batch in batches:
+        start = time.perf_counter()
+        embeddings.append(featurizer._get_batch_embeddings(batch))
+        if cuda:
+            torch.cuda.synchronize()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    if cuda:
+        peak_extra = torch.cuda.max_memory_allocated() - allocated_before
+    else:
+        peak_extra = max(0, _status_kb("VmHWM") - rss_before) * 1024
+    np.save(args.embeddings_out, np.vstack(embeddings).astype(np.float32))
+    return {
+        "profile": profile,
+        "device": featurizer.device,
+        "threads": [torch.get_num_threads(), torch.get_num_interop_threads()],
+        "batch_size": args.batch_size,
+        "batches": len(batches),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        "peak_extra_mb": round(peak_extra / 2 ** 20, 1),
+        "model_output_mb": round(output_bytes / 2 ** 20, 2),
+    }
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> float:
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return float(np.min(np.sum(a * b, axis=1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PhoBERTFeaturizer inference profiles")
+    parser.add_argument("--model", default="models/phobert-large")
+    parser.add_argument("--max-length", type=int, default=256)
+    parser.add_argument("--pooling", default="mean_max")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--num-threads", type=int, default=None)
+    parser.add_argument("--num-interop-threads", type=int, default=None)
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="danh sách profile cần chạy")
+    parser.add_argument("--nlu", default=DEFAULT_NLU_PATH)
+    parser.add_argument("--out", help="ghi kết quả JSON ra file")
+    # Dùng nội bộ: process con chạy một profile
+    parser.add_argument("--run-profile", choices=tuple(PROFILES), help=argparse.SUPPRESS)
+    parser.add_argument("--embeddings-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_profile:
+        print(json.dumps(run_profile(args.run_profile, args)))
+        return
+
+    results, embeddings = [], {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in [name.strip() for name in args.profiles.split(",") if name.strip()]:
+            path = os.path.join(tmp, f"{profile}.npy")
+            child = [sys.executable, os.path.abspath(__file__), "--run-profile", profile, "--embeddings-out", path]
+            child += sys.argv[1:]
+            completed = subprocess.run(child, capture_output=True, text=True, cwd=ROOT)
+            if completed.returncode != 0:
+                print(f"❌ {profile} failed:\n{completed.stderr[-2000:]}")
+                continue
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+            embeddings[profile] = np.load(path)
+
+    reference = embeddings.get("full")
+    for row in results:
+        if reference is not None and row["profile"] != "full":
+            row["min_cosine_vs_full"] = round(cosine_rows(embeddings[row["profile"]], reference), 6)
+
+    print(f"{'profile':<12}{'p50 ms':>10}{'p95 ms':>10}{'peak MB':>10}{'output MB':>11}{'min cos':>10}")
+    for row in results:
+        print(
+            f"{row['profile']:<12}{row['latency_ms_p50']:>10.1f}{row['latency_ms_p95']:>10.1f}"
+            f"{row['peak_extra_mb']:>10.1f}{row['model_output_mb']:>11.2f}{row.get('min_cosine_vs_full', 1.0):>10.4f}"
+        )
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"✅ Saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
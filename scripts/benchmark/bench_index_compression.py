@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark các loại index của RAG (RAG_INDEX_TYPE flat / sq8 / ivfpq) trên vector thật của KB:
+recall@k so với tìm kiếm chính xác (có và không chấm lại bằng vector gốc), bộ nhớ index,
+thời gian build và độ trễ mỗi truy vấn. Câu hỏi lấy từ các intent ask_* trong data/nlu.yml.
+
+--scale N nhân corpus lên N vector (vector KB + nhiễu, chuẩn hóa lại) để ước lượng khi KB lớn hơn.
+Chạy: python scripts/benchmark/bench_index_compression.py [--k 5] [--scale 50000] [--out bench.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Cho phép import package actions / rag khi chạy script từ thư mục gốc project
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from actions.knowledge_base import KB_DIR
+from nlu_examples import DEFAULT_NLU_PATH, load_examples
+from rag import vector_index
+
+
+def load_base(kb_dir: str, index_dir: str):
+    """Vector KB từ index flat (build nếu chưa có) và encoder để embed câu hỏi"""
+    os.environ["RAG_INDEX_TYPE"] = "flat"
+    from rag.retriever import RAGRetriever
+
+    retriever = RAGRetriever(kb_dir, index_dir=index_dir)
+    ids = sorted(retriever.chunks)
+    vectors = np.stack([retriever.index.reconstruct(doc_id) for doc_id in ids]).astype(np.float32)
+    return vectors, retriever.encoder
+
+
+def expand(vectors: np.ndarray, size: int, noise: float, rng: np.random.Generator) -> np.ndarray:
+    if size <= len(vectors):
+        return vectors
+    extra = vectors[rng.integers(0, len(vectors), size - len(vectors))]
+    extra = extra + rng.normal(0.0, noise, extra.shape).astype(np.float32)
+    extra /= np.linalg.norm(extra, axis=1, keepdims=True)
+    return np.vstack([vectors, extra]).astype(np.float32)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall(found: list, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(row[:k]) & set(expected)) / k for row, expected in zip(found, truth.tolist())]))
+
+
+def run_config(name: str, config: dict, corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray,
+               k: int, nprobes: list, factor: int) -> list:
+    ids = np.arange(len(corpus), dtype=np.int64)
+    start = time.perf_counter()
+    index = vector_index.new_index(corpus.shape[1], config, corpus)
+    index.add_with_ids(corpus, ids)
+    build_s = time.perf_counter() - start
+    exact = vector_index.is_exact(config)
+    is_ivf = config["type"] == "ivfpq" and index.__class__.__name__ == "IndexIVFPQ"
+
+    rows = []
+    for nprobe in (nprobes if is_ivf else [None]):
+        if nprobe is not None:
+            os.environ["RAG_IVF_NPROBE"] = str(nprobe)
+        params = vector_index.search_parameters(index)
+        raw, reranked, latencies = [], [], []
+        for query in queries:
+            query = query[None, :]
+            start = time.perf_counter()
+            n_candidates = k if exact else k * factor
+            _, found = index.search(query, n_candidates, params=params)
+            candidates = [int(i) for i in found[0] if i >= 0]
+            if not exact:
+                # Giống RAGRetriever._dense_hits: chấm lại ứng viên bằng vector float32 gốc
+                scores = corpus[candidates] @ query[0]
+                top = [candidates[i] for i in np.argsort(-scores)[:k]]
+            else:
+                top = candidates
+            latencies.append((time.perf_counter() - start) * 1000)
+            raw.append(candidates[:k])
+            reranked.append(top)
+        row = {
+            "name": name if nprobe is None else f"{name}/nprobe={nprobe}",
+            "config": dict(config, nprobe=nprobe) if nprobe is not None else config,
+            "index_bytes": vector_index.memory_bytes(index),
+            "rerank_vectors_bytes": 0 if exact else int(corpus.nbytes),
+            "build_s": round(build_s, 3),
+            f"recall@{k}_raw": round(recall(raw, truth), 4),
+            f"recall@{k}": round(recall(reranked, truth), 4),
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+        }
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compressed FAISS index types for RAG")
+    parser.add_argument("--kb-dir", default=KB_DIR)
+    parser.add_argument("--index-dir", default=os.getenv("RAG_INDEX_DIR", os.path.join("data", "rag_index")))
+    parser.add_argument("--nlu", default=DEFAULT_NLU_PATH)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=300, help="số câu hỏi lấy mẫu từ nlu.yml")
+    parser.add_argument("--scale", type=int, default=0, help="số vector corpus sau khi nhân bản (0 = chỉ KB)")
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--pq-m", default="32,64,128", help="danh sách RAG_PQ_M cần thử")
+    parser.add_argument("--nlist", type=int, default=0, help="RAG_IVF_NLIST (0 = tự chọn)")
+    parser.add_argument("--nprobe", default="1,4,8,16", help="danh sách RAG_IVF_NPROBE cần thử")
+    parser.add_argument("--rerank-factor", type=int, default=vector_index.rerank_factor())
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--out", help="ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    base, encoder = load_base(args.kb_dir, args.index_dir)
+    corpus = expand(base, args.scale, args.noise, rng)
+
+    examples = load_examples(args.nlu)
+    picked = rng.choice(len(examples), min(args.queries, len(examples)), replace=False)
+    queries = encoder.encode([examples[i].text for i in sorted(picked)])
+    truth = exact_top_k(corpus, queries, args.k)
+
+    dim = corpus.shape[1]
+    configs = [("flat", {"type": "flat"}), ("sq8", {"type": "sq8"})]
+    for m in (int(value) for value in args.pq_m.split(",") if value.strip()):
+        if dim % m == 0:
+            configs.append((f"ivfpq/m={m}", {"type": "ivfpq", "nlist": args.nlist, "m": m, "nbits": 8}))
+    nprobes = [int(value) for value in args.nprobe.split(",") if value.strip()]
+
+    results = []
+    for name, config in configs:
+        results.extend(run_config(name, config, corpus, queries, truth, args.k, nprobes, args.rerank_factor))
+
+    report = {
+        "corpus": len(corpus),
+        "kb_vectors": len(base),
+        "dim": dim,
+        "queries": len(queries),
+        "k": args.k,
+        "rerank_factor": args.rerank_factor,
+        "results": results,
+    }
+    print(f"{'index':<24}{'MB':>9}{'recall raw':>12}{'recall':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for row in results:
+        print(
+            f"{row['name']:<24}{row['index_bytes'] / 2 ** 20:>9.2f}{row[f'recall@{args.k}_raw']:>12.3f}"
+            f"{row[f'recall@{args.k}']:>9.3f}{row['latency_ms_p50']:>9.3f}{row['latency_ms_p95']:>9.3f}"
+        )
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ Saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
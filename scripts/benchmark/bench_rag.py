@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark chất lượng + độ trễ của RAGRetriever.search trên bộ câu hỏi chuẩn lấy từ data/nlu.yml:
+câu ask_* có entity location, nhãn là tỉnh (resolve qua KnowledgeBaseStore) và trường KB của intent
+(INTENT_KB_FIELDS; intent không có trường như ask_new_province thì chỉ xét tỉnh).
+
+Chunk đúng = cùng tỉnh và thuộc một trong các trường của intent. Kết quả là JSON (recall@k, MRR,
+tỉ lệ top score >= RAG_CONFIDENCE_THRESHOLD, p50/p95/p99 latency) để diff giữa các commit, tính cho
+từng chế độ lọc:
+    none    tìm toàn cục: đo được retrieval đúng tỉnh (lỗi tìm nhầm tỉnh hiện ra ở đây)
+    action  lọc tỉnh / trường như ActionRAGFallback; tỉnh lọc chính là nhãn nên recall theo tỉnh
+            gần như 100% theo cấu trúc, chỉ phản ánh việc chọn đúng trường trong tỉnh
+Chạy: python scripts/benchmark/bench_rag.py [--workers 4] [--batch-size 32] [--out bench_rag.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Cho phép import package actions / rag khi chạy script từ thư mục gốc project
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from actions.intent_keywords import INTENT_KB_FIELDS, detect_kb_fields
+from actions.knowledge_base import KB_DIR, get_store
+from actions.text_normalize import fold
+from nlu_examples import DEFAULT_NLU_PATH, load_examples
+
+
+def build_golden_set(nlu_path: str, limit: int = 0) -> List[Dict]:
+    """Câu hỏi đã chuẩn hóa tên tỉnh như ActionRAGFallback (tên / alias -> tên tỉnh chính thức)"""
+    store = get_store()
+    golden = []
+    for example in load_examples(nlu_path):
+        locations = [value for entity, value in example.entities if entity == "location"]
+        provinces = [store.resolve(value) for value in locations]
+        if not locations or not provinces[0]:
+            continue
+        text = example.text
+        for raw, province in zip(locations, provinces):
+            if province:
+                text = text.replace(raw, province)
+        fields = INTENT_KB_FIELDS.get(example.intent)
+        golden.append({
+            "text": text,
+            "intent": example.intent,
+            "province": provinces[0],
+            "fields": list(fields) if fields else None,
+        })
+    return golden[:limit] if limit else golden
+
+
+def first_relevant_rank(results, item: Dict) -> Optional[int]:
+    province = fold(item["province"])
+    for rank, (_, chunk) in enumerate(results, start=1):
+        if fold(chunk.get("province", "")) != province:
+            continue
+        if item["fields"] is None or chunk.get("field") in item["fields"]:
+            return rank
+    return None
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {f"p{p}": round(float(np.percentile(values, p)), 3) for p in (50, 95, 99)}
+
+
+def summarize(rows: List[Dict], ks: List[int], threshold: float) -> Dict:
+    ranks = [row["rank"] for row in rows]
+    return {
+        "queries": len(rows),
+        **{f"recall@{k}": round(float(np.mean([r is not None and r <= k for r in ranks])), 4) for k in ks},
+        "mrr": round(float(np.mean([1.0 / r if r else 0.0 for r in ranks])), 4),
+        "above_threshold": round(float(np.mean([row["top_score"] >= threshold for row in rows])), 4),
+    }
+
+
+FILTER_MODES = ("none", "action")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RAG retrieval quality and latency")
+    parser.add_argument("--kb-dir", default=KB_DIR)
+    parser.add_argument("--index-dir", default=None)
+    parser.add_argument("--nlu", default=DEFAULT_NLU_PATH)
+    parser.add_argument("--k", default="1,3,5", help="các giá trị k cho recall@k")
+    parser.add_argument("--filters", choices=FILTER_MODES + ("both",), default="both",
+                        help="none: tìm toàn cục; action: lọc tỉnh / trường như ActionRAGFallback; "
+                             "both: báo cáo cả hai cạnh nhau")
+    parser.add_argument("--workers", type=int, default=4, help="số thread gọi search song song")
+    parser.add_argument("--batch-size", type=int, default=32, help="số câu hỏi gửi vào pool mỗi lượt")
+    parser.add_argument("--limit", type=int, default=0, help="chỉ chạy N câu đầu (0 = tất cả)")
+    parser.add_argument("--threshold", type=float,
+                        default=float(os.getenv("RAG_CONFIDENCE_THRESHOLD", "0.55")))
+    parser.add_argument("--out", help="ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    from rag.query_cache import QUERY_CACHE
+    from rag.retriever import RAGRetriever, dense_score
+
+    ks = sorted({int(value) for value in args.k.split(",") if value.strip()})
+    top_k = max(ks)
+    golden = build_golden_set(args.nlu, args.limit)
+    if not golden:
+        sys.exit(f"❌ No ask_* examples with a location entity in {args.nlu}, nothing to benchmark")
+
+    start = time.perf_counter()
+    retriever = RAGRetriever(args.kb_dir, index_dir=args.index_dir)
+    load_s = time.perf_counter() - start
+    # Lần gọi đầu khởi tạo lazy (tokenizer, thread pool của torch), không tính vào latency
+    retriever.search(golden[0]["text"], top_k=top_k)
+
+    def run(item: Dict, filters: str) -> Dict:
+        kwargs = {}
+        if filters == "action":
+            kwargs = {"province": item["province"], "field": detect_kb_fields(item["text"].lower())}
+        started = time.perf_counter()
+        results = retriever.search(item["text"], top_k=top_k, **kwargs)
+        latency_ms = (time.perf_counter() - started) * 1000
+        return {
+            "intent": item["intent"],
+            "rank": first_relevant_rank(results, item),
+            # Cùng điểm ActionRAGFallback so với ngưỡng (cosine, không phải điểm fused)
+            "top_score": max(dense_score(result) for result in results) if results else 0.0,
+            "latency_ms": latency_ms,
+        }
+
+    def run_mode(filters: str) -> Dict:
+        # Mỗi chế độ bắt đầu với cache rỗng để latency không hưởng lợi từ chế độ chạy trước
+        QUERY_CACHE.cache.clear()
+        rows: List[Dict] = []
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            for offset in range(0, len(golden), args.batch_size):
+                batch = golden[offset:offset + args.batch_size]
+                rows.extend(pool.map(lambda item: run(item, filters), batch))
+        wall_s = time.perf_counter() - started
+
+        by_intent: Dict[str, List[Dict]] = defaultdict(list)
+        for row in rows:
+            by_intent[row["intent"]].append(row)
+        return {
+            "overall": summarize(rows, ks, args.threshold),
+            "by_intent": {intent: summarize(items, ks, args.threshold) for intent, items in sorted(by_intent.items())},
+            "latency_ms": percentiles([row["latency_ms"] for row in rows]),
+            "throughput_qps": round(len(rows) / wall_s, 2) if wall_s else 0.0,
+        }
+
+    modes = FILTER_MODES if args.filters == "both" else (args.filters,)
+    report = {
+        "config": {
+            "fusion": os.getenv("RAG_FUSION", "weighted"),
+            "index_type": retriever.index_config["type"],
+            "encoder": retriever.encoder.fingerprint,
+            "chunks": len(retriever.chunks),
+            "workers": args.workers,
+            "batch_size": args.batch_size,
+            "threshold": args.threshold,
+        },
+        "filters": {filters: run_mode(filters) for filters in modes},
+        "index_load_s": round(load_s, 3),
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
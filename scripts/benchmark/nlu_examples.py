@@ -0,0 +1,46 @@
+"""
+Đọc câu ví dụ trong data/nlu.yml (định dạng Rasa 3) cho các script benchmark:
+bỏ markup entity "[Hà Nội](location)" và giữ lại danh sách entity đã gán
+"""
+
+import re
+from typing import Dict, List, NamedTuple
+
+import yaml
+
+DEFAULT_NLU_PATH = "data/nlu.yml"
+
+_ENTITY = re.compile(r"\[([^\]]+)\]\(([^)]+)\)")
+
+
+class NLUExample(NamedTuple):
+    intent: str
+    text: str
+    # (entity, value) theo thứ tự xuất hiện
+    entities: List[tuple]
+
+
+def parse_example(intent: str, line: str) -> NLUExample:
+    entities = [(entity, value) for value, entity in _ENTITY.findall(line)]
+    return NLUExample(intent, _ENTITY.sub(lambda m: m.group(1), line).strip(), entities)
+
+
+def load_examples(path: str = DEFAULT_NLU_PATH, intent_prefix: str = "ask_") -> List[NLUExample]:
+    """Ví dụ của các intent bắt đầu bằng intent_prefix, theo thứ tự trong file, bỏ câu trùng"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    examples: List[NLUExample] = []
+    seen: Dict[str, None] = {}
+    for block in data.get("nlu", []):
+        intent = block.get("intent")
+        if not intent or not intent.startswith(intent_prefix):
+            continue
+        for line in (block.get("examples") or "").splitlines():
+            line = line.strip()
+            if not line.startswith("- "):
+                continue
+            example = parse_example(intent, line[2:])
+            if example.text and example.text not in seen:
+                seen[example.text] = None
+                examples.append(example)
+    return examples
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Script compile knowledge base (data/knowledge_base/provinces/*.json + data/location_map.json)
+thành một file snapshot nhị phân để action server mmap và đọc lazy từng tỉnh
+Chạy: python scripts/build_kb_snapshot.py [--out data/knowledge_base/kb.snapshot]
+"""
+
+import argparse
+import os
+import sys
+
+# Cho phép import package actions khi chạy script từ thư mục gốc project
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from actions.kb_snapshot import DEFAULT_SNAPSHOT_PATH, KBSnapshot, build_snapshot
+from actions.knowledge_base import KB_DIR, LOCATION_MAP_PATH
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build binary KB snapshot")
+    parser.add_argument("--kb-dir", default=KB_DIR)
+    parser.add_argument("--location-map", default=LOCATION_MAP_PATH)
+    parser.add_argument("--out", default=os.getenv("KB_SNAPSHOT_PATH") or DEFAULT_SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    header = build_snapshot(args.kb_dir, args.location_map, args.out)
+    size_kb = os.path.getsize(args.out) / 1024
+
+    # Đọc lại để chắc chắn file hợp lệ
+    snapshot = KBSnapshot(args.out)
+    provinces = snapshot.provinces()
+    for name in provinces:
+        provinces[name]
+    snapshot.close()
+
+    print(f"✅ Snapshot: {args.out} ({size_kb:.1f} KB)")
+    print(f"   Provinces: {len(header['provinces'])}")
+    print(f"   Source files: {len(header['sources'])}")
+
+
+if __name__ == "__main__":
+    main()
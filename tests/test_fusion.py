@@ -0,0 +1,34 @@
+import pytest
+
+from rag.fusion import fusion_mode, rrf_fusion, weighted_fusion
+
+
+def test_weighted_fusion_mixes_scores():
+    fused = weighted_fusion({1: 0.9, 2: 0.5}, {2: 1.0, 3: 0.4}, alpha=0.6)
+    assert fused[1] == pytest.approx(0.54)
+    assert fused[2] == pytest.approx(0.7)
+    # Chỉ có một trong hai điểm: phần còn lại tính là 0
+    assert fused[3] == pytest.approx(0.16)
+
+
+def test_weighted_fusion_alpha_from_env(monkeypatch):
+    monkeypatch.setenv("RAG_FUSION_ALPHA", "1")
+    assert weighted_fusion({1: 0.8}, {1: 1.0, 2: 1.0}) == pytest.approx({1: 0.8, 2: 0.0})
+
+
+def test_rrf_fusion_uses_ranks_only():
+    fused = rrf_fusion({1: 0.9, 2: 0.8}, {2: 12.0, 1: 3.0, 3: 0.0}, k=60)
+    # Đứng đầu cả hai danh sách thì được điểm tối đa 1.0
+    assert rrf_fusion({1: 0.9}, {1: 5.0}, k=60)[1] == pytest.approx(1.0)
+    assert fused[1] == pytest.approx(fused[2])
+    # Điểm BM25 bằng 0 không được tính hạng
+    assert 3 not in fused
+
+
+def test_fusion_mode(monkeypatch):
+    monkeypatch.delenv("RAG_FUSION", raising=False)
+    assert fusion_mode() == "weighted"
+    monkeypatch.setenv("RAG_FUSION", " RRF ")
+    assert fusion_mode() == "rrf"
+    monkeypatch.setenv("RAG_FUSION", "bogus")
+    assert fusion_mode() == "weighted"
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from actions.fuzzy_index import bounded_levenshtein
+from actions.knowledge_base import KnowledgeBaseStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def store():
+    return KnowledgeBaseStore.load(
+        kb_dir=os.path.join(ROOT, "data", "knowledge_base", "provinces"),
+        map_path=os.path.join(ROOT, "data", "location_map.json"),
+        snapshot_path="",
+    )
+
+
+def test_bounded_levenshtein():
+    assert bounded_levenshtein("ha noi", "ha noi", 2) == 0
+    assert bounded_levenshtein("thanh hao", "thanh hoa", 2) == 2
+    assert bounded_levenshtein("hue", "ha noi", 2) is None
+
+
+def test_misspelling(store):
+    assert store.suggest("thanh hao")[0] == "Thanh Hóa"
+    assert store.suggest("Đà Nẳng")[0] == "Đà Nẵng"
+
+
+def test_missing_accents(store):
+    assert store.suggest("Quang Ngai")[0] == "Quảng Ngãi"
+    assert store.suggest("da nang")[0] == "Đà Nẵng"
+
+
+def test_partial_name(store):
+    assert "Bắc Ninh" in store.suggest("ninh")
+
+
+def test_unknown_input(store):
+    assert store.suggest("xyzzy qwerty") == []
+    assert store.suggest("") == []
+
+
+def test_limit(store):
+    assert len(store.suggest("ninh", limit=1)) == 1
+
@@ -0,0 +1,97 @@
+import json
+import os
+import shutil
+import time
+
+import pytest
+
+from actions import knowledge_base
+from actions.kb_snapshot import build_snapshot
+from actions.knowledge_base import get_store
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def kb_copy(tmp_path, monkeypatch):
+    """Bản sao data/ trong thư mục tạm, store dùng chung bắt đầu từ trạng thái chưa load"""
+    shutil.copytree(os.path.join(ROOT, "data", "knowledge_base", "provinces"),
+                    tmp_path / "data" / "knowledge_base" / "provinces")
+    shutil.copy(os.path.join(ROOT, "data", "location_map.json"), tmp_path / "data" / "location_map.json")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("KB_SNAPSHOT_PATH", "")
+    monkeypatch.setenv("KB_RELOAD_INTERVAL", "5")
+    monkeypatch.setattr(knowledge_base, "_store", None)
+    monkeypatch.setattr(knowledge_base, "_reloader", None)
+    return tmp_path / "data" / "knowledge_base" / "provinces" / "an_giang.json"
+
+
+def _edit_food(path, text):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    province = next(iter(data))
+    data[province]["what_to_eat"] = [{"name": text, "category": "đặc sản", "details": text}]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    # mtime_ns có thể trùng nếu ghi quá nhanh sau lần load; đẩy mtime đi để chắc chắn khác
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    return province
+
+
+def _wait_for_reload():
+    """Reload chạy trên thread nền: chờ thread kiểm tra / load lại xong"""
+    knowledge_base._reloader.join(timeout=10)
+    assert not knowledge_base._reloader.is_alive()
+
+
+def test_reload_serves_fresh_renders(kb_copy, monkeypatch):
+    store = get_store()
+    province = next(iter(json.load(open(kb_copy, encoding="utf-8"))))
+    before = store.render_cache.render(province, "ask_cuisine")
+    assert not store.is_stale()
+
+    _edit_food(kb_copy, "Món thử nghiệm reload")
+    # Chưa tới hạn kiểm tra: vẫn là store cũ
+    assert get_store() is store
+
+    monkeypatch.setattr(knowledge_base, "_next_check", 0.0)
+    # Lần gọi tới hạn chỉ khởi động reload nền, vẫn trả ngay store cũ
+    assert get_store() is store
+    _wait_for_reload()
+    fresh = get_store()
+    assert fresh is not store
+    after = fresh.render_cache.render(province, "ask_cuisine")
+    assert after != before
+    assert "Món thử nghiệm reload" in after
+
+
+def test_no_reload_when_disabled(kb_copy, monkeypatch):
+    monkeypatch.setenv("KB_RELOAD_INTERVAL", "0")
+    store = get_store()
+    _edit_food(kb_copy, "Món thử nghiệm reload")
+    monkeypatch.setattr(knowledge_base, "_next_check", 0.0)
+    assert get_store() is store
+    assert store.is_stale()
+
+
+def test_reload_closes_replaced_snapshot(kb_copy, monkeypatch):
+    data_dir = kb_copy.parent.parent
+    build_snapshot(str(data_dir / "provinces"), os.path.join("data", "location_map.json"),
+                   str(data_dir / "kb.snapshot"))
+    monkeypatch.setenv("KB_SNAPSHOT_PATH", str(data_dir / "kb.snapshot"))
+    monkeypatch.setattr(knowledge_base, "RETIRED_STORE_GRACE", 0.0)
+    store = get_store()
+    snapshot = store._snapshot
+    assert snapshot is not None
+
+    _edit_food(kb_copy, "Món thử nghiệm reload")
+    monkeypatch.setattr(knowledge_base, "_next_check", 0.0)
+    get_store()
+    _wait_for_reload()
+    assert get_store() is not store
+    deadline = time.monotonic() + 5
+    while store._snapshot is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store._snapshot is None
+    assert snapshot._mm.closed
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import shutil
+
+import faiss
+import numpy as np
+import pytest
+
+from actions.text_normalize import fold
+from rag import providers, retriever as retriever_module
+from rag.answer_cache import SemanticAnswerCache
+from rag.retriever import FALLBACK_PREFIX, RAGRetriever
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROVINCES = ("hue.json", "da_nang.json", "ha_noi.json", "can_tho.json")
+
+
+class FakeEncoder:
+    """Bag-of-words băm vào 64 chiều: tất định, không cần model, câu chung từ thì cosine cao"""
+
+    dim = 64
+    fingerprint = "fake-bow-64"
+
+    def __init__(self):
+        self.encoded = 0
+
+    def encode(self, texts):
+        self.encoded += len(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in fold(text).split():
+                vectors[row, int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-12, None)
+
+    def count_tokens(self, text):
+        return len(text.split())
+
+
+@pytest.fixture
+def kb_dir(tmp_path, monkeypatch):
+    kb = tmp_path / "provinces"
+    kb.mkdir()
+    for name in PROVINCES:
+        shutil.copy(os.path.join(ROOT, "data", "knowledge_base", "provinces", name), kb / name)
+    monkeypatch.setenv("KB_SNAPSHOT_PATH", "")
+    monkeypatch.setenv("RAG_QUERY_BATCH_SIZE", "1")
+    monkeypatch.setenv("RAG_INDEX_TYPE", "flat")
+    monkeypatch.delenv("RAG_FUSION", raising=False)
+    return kb
+
+
+def make_retriever(kb_dir, tmp_path, encoder=None):
+    return RAGRetriever(str(kb_dir), index_dir=str(tmp_path / "index"), encoder=encoder or FakeEncoder())
+
+
+def _edit_province(path, field, value):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    province = next(iter(data))
+    data[province][field] = value
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    return province
+
+
+@pytest.mark.parametrize("index_type", ["flat", "sq8", "ivfpq"])
+def test_sync_index_reembeds_only_changed_chunks(kb_dir, tmp_path, monkeypatch, index_type):
+    monkeypatch.setenv("RAG_INDEX_TYPE", index_type)
+    # PQ 8 x 4 bit: đủ ít để train trên vài trăm chunk của 4 tỉnh
+    monkeypatch.setenv("RAG_PQ_M", "8")
+    monkeypatch.setenv("RAG_PQ_NBITS", "4")
+    encoder = FakeEncoder()
+    retriever = make_retriever(kb_dir, tmp_path, encoder)
+    total = len(retriever.chunks)
+    assert encoder.encoded == total
+    if index_type == "ivfpq":
+        assert faiss.try_extract_index_ivf(retriever.index) is not None
+
+    # Mở lại từ đĩa, KB không đổi: không embed gì
+    encoder = FakeEncoder()
+    retriever = make_retriever(kb_dir, tmp_path, encoder)
+    assert encoder.encoded == 0
+    assert len(retriever.chunks) == total
+
+    province = _edit_province(kb_dir / "hue.json", "travel_tips", "Mang theo áo mưa khi đi Huế vào tháng mười.")
+    stats = retriever.sync_index()
+    assert stats["added"] == 1
+    assert stats["removed"] >= 1
+    assert encoder.encoded == 1
+    assert retriever.index.ntotal == len(retriever.chunks)
+
+    results = retriever.search("áo mưa tháng mười", top_k=1, province=province, field="travel_tips")
+    assert "áo mưa" in results[0][1]["text"]
+
+
+def test_search_province_and_field_filters(kb_dir, tmp_path):
+    retriever = make_retriever(kb_dir, tmp_path)
+    query = "món ăn đặc sản nổi tiếng"
+
+    results = retriever.search(query, top_k=5, province="Đà Nẵng")
+    assert results
+    assert {chunk["province"] for _, chunk in results} == {"Đà Nẵng"}
+
+    results = retriever.search(query, top_k=5, province="Huế", field="what_to_eat")
+    assert results
+    assert {(chunk["province"], chunk["field"]) for _, chunk in results} == {("Huế", "what_to_eat")}
+
+    results = retriever.search(query, top_k=5, province="Huế", field=["festivals", "what_to_eat"])
+    assert {chunk["field"] for _, chunk in results} <= {"festivals", "what_to_eat"}
+
+    scores = [score for score, _ in retriever.search(query, top_k=8)]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_dense_mode_scores_are_cosine(kb_dir, tmp_path, monkeypatch):
+    monkeypatch.setenv("RAG_FUSION", "dense")
+    retriever = make_retriever(kb_dir, tmp_path)
+    results = retriever.search("lễ hội Huế", top_k=3)
+    vector = FakeEncoder().encode(["lễ hội Huế"])[0]
+    for score, chunk in results:
+        expected = float(FakeEncoder().encode([chunk["text"]])[0] @ vector)
+        assert score == pytest.approx(expected, abs=1e-5)
+        assert retriever_module.dense_score((score, chunk)) == score
+
+
+def test_hybrid_results_carry_dense_score(kb_dir, tmp_path):
+    retriever = make_retriever(kb_dir, tmp_path)
+    results = retriever.search("lễ hội Huế", top_k=3)
+    assert all("dense_score" in chunk for _, chunk in results)
+    # Chunk gốc của retriever không bị sửa
+    assert all("dense_score" not in chunk for chunk in retriever.chunks.values())
+
+
+@pytest.fixture
+def synth(kb_dir, tmp_path, monkeypatch):
+    """Retriever + provider giả đếm số lần gọi; answer cache chỉ trong bộ nhớ"""
+    monkeypatch.setattr(retriever_module, "get_answer_cache", lambda: SemanticAnswerCache(path="", max_entries=0))
+    monkeypatch.setenv("RAG_SYNTHESIS_MODE", "llm")
+    monkeypatch.setenv("RAG_LLM_COOLDOWN", "30")
+    retriever = make_retriever(kb_dir, tmp_path)
+    calls = []
+
+    def use(behaviour):
+        def generate(prompt, system, provider=None, timeout=None):
+            calls.append(prompt)
+            if isinstance(behaviour, Exception):
+                raise behaviour
+            return behaviour
+        monkeypatch.setattr(providers, "generate", generate)
+
+    query = "ẩm thực Huế"
+    return retriever, query, retriever.search(query, top_k=3, province="Huế"), calls, use
+
+
+def test_synthesize_uses_llm_answer(synth):
+    retriever, query, results, calls, use = synth
+    use("Bún bò Huế.")
+    assert retriever.synthesize(query, results, province="Huế") == "Bún bò Huế."
+    assert len(calls) == 1
+
+
+def test_synthesize_extractive_mode_skips_llm(synth, monkeypatch):
+    retriever, query, results, calls, use = synth
+    use("không được gọi")
+    monkeypatch.setenv("RAG_SYNTHESIS_MODE", "extractive")
+    answer = retriever.synthesize(query, results)
+    assert answer and not answer.startswith(FALLBACK_PREFIX)
+    assert calls == []
+
+
+def test_synthesize_falls_back_and_cools_down(synth):
+    retriever, query, results, calls, use = synth
+    use(providers.ProviderError("openai: HTTP 503"))
+    assert retriever.synthesize(query, results).startswith(FALLBACK_PREFIX)
+    assert len(calls) == 1
+
+    # Trong thời gian cooldown không gọi provider nữa, kể cả khi nó đã hoạt động lại
+    use("Bún bò Huế.")
+    assert retriever.synthesize(query, results).startswith(FALLBACK_PREFIX)
+    assert len(calls) == 1
+
+    retriever._llm_cooldown_until = 0.0
+    assert retriever.synthesize(query, results) == "Bún bò Huế."
+    assert len(calls) == 2
+
+
+def test_synthesize_unconfigured_provider_has_no_cooldown(synth):
+    retriever, query, results, calls, use = synth
+    use(providers.LLMUnavailable("OPENAI_API_KEY not set"))
+    assert retriever.synthesize(query, results).startswith(FALLBACK_PREFIX)
+    assert retriever.synthesize(query, results).startswith(FALLBACK_PREFIX)
+    assert len(calls) == 2
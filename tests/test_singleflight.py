@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from rag.singleflight import AsyncSingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    flight = AsyncSingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        results = await asyncio.gather(*[flight.do("q", work) for _ in range(5)], flight.do("other", work))
+        assert results == ["answer"] * 6
+        assert len(flight) == 0
+        # Key đã xóa khi xong: request sau chạy lại từ đầu
+        await flight.do("q", work)
+
+    asyncio.run(main())
+    assert len(runs) == 3
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight = AsyncSingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("q", work))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flight.do("q", work)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await asyncio.gather(*followers) == ["answer"] * 3
+        assert leader.cancelled()
+        assert len(flight) == 0
+
+    asyncio.run(main())
+    assert len(runs) == 1
+
+
+def test_exception_reaches_every_caller():
+    flight = AsyncSingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        results = await asyncio.gather(flight.do("q", fail), flight.do("q", fail), return_exceptions=True)
+        assert [type(result) for result in results] == [ValueError, ValueError]
+        assert len(flight) == 0
+        with pytest.raises(ValueError):
+            await flight.do("q", fail)
+
+    asyncio.run(main())